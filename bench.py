@@ -0,0 +1,733 @@
+"""
+Benchmarks for the ground station ingest path.
+
+Usage:
+    python bench.py parser [--size-mb 8]
+    python bench.py crc [--frames 20000]
+    python bench.py decode [--frames 20000]
+    python bench.py bulk [--size-mb 8]
+    python bench.py writer [--frames 500] [--latency 0.05]
+    python bench.py api [--clients 100] [--requests 10] [--latency 0.02]
+    python bench.py columns [--points 10000]
+    python bench.py sensor [--lines 100000]
+    python bench.py startup [--runs 5]
+    python bench.py flight [--hours 3] [--rate 1] [--clients 20] [--latency 0.01] [--failure-rate 0.01]
+    python bench.py payloads [--frames 20000]
+    python bench.py traffic [--frames 20000] [--noise 0.2] [--corruption 0.05] [--rate 1] [--speedup 100]
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import ngham
+import sensor_schema
+from capture import CaptureWriter, ReplaySerial
+from fake_firebase import FakeDatabase
+from firebase_writer import BatchedFirebaseWriter
+from pipeline import IngestPipeline
+from rollups import Rollups
+from traffic import TrafficGenerator
+
+
+def make_rx_frame(sensor_line: bytes) -> bytes:
+    """Builds an NGHam-SPP RX frame carrying a sensor data line"""
+    return ngham.encode_ngham_spp_packet(0x00, ngham.encode_ngham_spp_packet_rx(sensor_line, 10000, -105, -80))
+
+
+def make_capture(size: int, garbage_ratio: float = 0.05, seed: int = 0) -> tuple:
+    """
+        Builds a synthetic capture of roughly `size` bytes
+        Output: (capture bytes, number of frames in capture)
+    """
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    frames = 0
+    while total < size:
+        if rng.random() < garbage_ratio:
+            # Line noise, including stray start bytes
+            part = bytes(rng.choice(b"\x55\xaa\xff$") for _ in range(rng.randint(1, 32)))
+        else:
+            line = f"LA9ORB;{frames * 1000};1013.2;23.5;-12.1;0.4;30;{frames};on;off".encode()
+            part = make_rx_frame(line)
+            frames += 1
+        parts.append(part)
+        total += len(part)
+    return b"".join(parts), frames
+
+
+def bench_parser(size_mb: float):
+    capture, expected = make_capture(int(size_mb * 1024 * 1024))
+    rng = random.Random(1)
+
+    # Chunk sizes as returned by ser.read(ser.in_waiting)
+    chunks = []
+    pos = 0
+    while pos < len(capture):
+        n = rng.randint(1, 512)
+        chunks.append(memoryview(capture)[pos:pos + n])
+        pos += n
+
+    parser = ngham.NGHamSPPFrameParser()
+    frames = 0
+    start = time.perf_counter()
+    for chunk in chunks:
+        for _ in parser.feed(chunk):
+            frames += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"parser: {len(capture) / 1e6:.1f} MB in {len(chunks)} chunks, {elapsed:.3f} s")
+    print(f"  {len(capture) / elapsed / 1e6:.1f} MB/s, {frames / elapsed:,.0f} frames/s")
+    print(f"  frames {frames} (generated {expected}), dropped bytes {parser.dropped_bytes}, "
+          f"resyncs {parser.resyncs}, crc errors {parser.crc_errors}")
+
+
+def bench_crc(n_frames: int):
+    capture, _ = make_capture(n_frames * 60, garbage_ratio=0)
+    frames = [bytes(f) for f in ngham.NGHamSPPFrameParser(check_crc=False).feed(capture)]
+
+    start = time.perf_counter()
+    ok = sum(ngham.check_ngham_spp_crc(f[:ngham.SPP_HEADER_LEN], f[ngham.SPP_HEADER_LEN:]) for f in frames)
+    elapsed = time.perf_counter() - start
+    print(f"crc: {len(frames)} frames, {ok} valid")
+    print(f"  table-driven: {elapsed / len(frames) * 1e6:.2f} us/frame")
+
+    try:
+        import numpy as np
+    except ImportError:
+        print("  batch: numpy not installed, skipped")
+        return
+
+    width = max(len(f) for f in frames)
+    array = np.zeros((len(frames), width), dtype=np.uint8)
+    for i, f in enumerate(frames):
+        array[i, :len(f)] = np.frombuffer(f, dtype=np.uint8)
+
+    start = time.perf_counter()
+    ok = int(ngham.check_ngham_spp_crc_batch(array).sum())
+    elapsed = time.perf_counter() - start
+    print(f"  batch (numpy): {elapsed / len(frames) * 1e6:.2f} us/frame, {ok} valid")
+
+
+def decode_rx_text_by_slicing(packet: list) -> dict:
+    """
+        The decoder of RX text frames before the struct layouts: list slicing and byte shifts
+        Input: whole packet (list of bytes)
+        Output: same dict as ngham.decode_ngham_spp_packet, None if the start byte or CRC is invalid
+    """
+    header = packet[0:5]
+    payload = packet[5:5 + header[4]]
+    if header[0] != ngham.START_BYTE or not ngham.check_ngham_spp_crc(header, payload):
+        return None
+
+    toh_us = int.from_bytes(payload[0:4], byteorder="little")
+    seconds_in_hour, microseconds_in_hour = divmod(toh_us, 1_000_000)
+    rx = {
+        "timestamp_toh_us": f"{seconds_in_hour // 60:02}:{seconds_in_hour % 60:02}.{microseconds_in_hour:06d}",
+        "noise dBm": payload[4] - 200,
+        "rssi dBm": payload[5] - 200,
+        "errors": payload[6],
+        "ngham_flags": hex(payload[7]),
+    }
+    text = "".join(chr(c) for c in payload[8:])
+    fields = text.strip().split(";")
+    rx["rx_payloads"] = {"type": "text", "len": len(payload) - 8, "data": text, "msg": fields[0],
+                         "sensor_data": fields[1:]}
+    return {
+        "header": {"start_byte": hex(header[0]), "crc": hex(int.from_bytes(header[1:3], byteorder="big")),
+                   "pl_type": header[3], "pl_len": header[4]},
+        "spp_payload": {"type": "RX", "data": rx},
+    }
+
+
+def bench_decode(n_frames: int):
+    capture, _ = make_capture(n_frames * 60, garbage_ratio=0)
+    frames = list(ngham.NGHamSPPFrameParser().feed(capture))
+    assert decode_rx_text_by_slicing(list(frames[0])) == ngham.decode_ngham_spp_packet(frames[0])
+
+    # list input is how gs.py used to call the decoders, memoryview is the zero-copy path
+    for name, decode, convert in (("list slicing, list", decode_rx_text_by_slicing, list),
+                                  ("struct, list", ngham.decode_ngham_spp_packet, list),
+                                  ("struct, memoryview", ngham.decode_ngham_spp_packet, lambda f: f)):
+        inputs = [convert(f) for f in frames]
+        start = time.perf_counter()
+        for packet in inputs:
+            decode(packet)
+        elapsed = time.perf_counter() - start
+        print(f"decode ({name}): {len(inputs) / elapsed:,.0f} frames/s")
+
+
+def bench_bulk(size_mb: float):
+    capture, _ = make_capture(int(size_mb * 1024 * 1024))
+
+    start = time.perf_counter()
+    frames = 0
+    for frame in ngham.NGHamSPPFrameParser().feed(capture):
+        ngham.decode_ngham_spp_packet(frame)
+        frames += 1
+    elapsed = time.perf_counter() - start
+    print(f"per-frame decode: {frames} frames in {elapsed:.3f} s")
+
+    start = time.perf_counter()
+    columns = ngham.decode_ngham_spp_capture(capture)
+    elapsed = time.perf_counter() - start
+    print(f"bulk decode: {len(columns['rx'])} frames in {elapsed:.3f} s")
+
+
+def bench_writer(n_frames: int, latency: float):
+    entries = [{"timestamp": i * 1000, "pressure": 1013.2, "height": float(i)} for i in range(n_frames)]
+
+    # One blocking set() per path, as gs.py used to do (owldata, sensordata and latest)
+    database = FakeDatabase(latency)
+    ref = database.reference("/")
+    start = time.perf_counter()
+    for entry in entries:
+        ref.child("owldata").child(str(entry["timestamp"])).set(entry)
+        ref.child("sensordata").child(str(entry["timestamp"])).set(entry)
+        ref.child("latest").set(entry)
+    elapsed = time.perf_counter() - start
+    print(f"blocking set: {n_frames / elapsed:,.0f} frames/s, {database.calls} calls")
+
+    database = FakeDatabase(latency)
+    writer = BatchedFirebaseWriter(database.reference("/"), flush_interval=0.2).start()
+    start = time.perf_counter()
+    for entry in entries:
+        writer.set(f"owldata/{entry['timestamp']}", entry)
+        writer.set(f"sensordata/{entry['timestamp']}", entry)
+        writer.set("latest", entry)
+    enqueue_elapsed = time.perf_counter() - start
+    writer.stop()
+    elapsed = time.perf_counter() - start
+    print(f"batched writer: {n_frames / enqueue_elapsed:,.0f} frames/s on the serial side, "
+          f"{n_frames / elapsed:,.0f} frames/s end to end, {database.calls} calls")
+    print(f"  {writer.stats()}")
+    assert len(database.data["sensordata"]) == n_frames
+
+
+def setup_dashboard(database):
+    """Serves database over REST and points the Django dashboard at it, returns the views module"""
+    server = database.serve()
+    os.environ["databaseURL"] = f"http://127.0.0.1:{server.server_port}/?ns=bench"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "satellite_dashboard.settings")
+    # The clients below run on one event loop per run, as under the ASGI server
+    os.environ.setdefault("DASHBOARD_SERVER", "asgi")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "satellite_dashboard"))
+
+    import django
+    from django.test.utils import setup_test_environment
+    django.setup()
+    setup_test_environment()
+
+    from groundstation import views
+    return views
+
+
+def percentiles(latencies):
+    q = statistics.quantiles(latencies, n=100)
+    return f"p50 {q[49] * 1000:.1f} ms, p95 {q[94] * 1000:.1f} ms, p99 {q[98] * 1000:.1f} ms"
+
+
+def bench_api(n_clients: int, n_requests: int, latency: float):
+    database = FakeDatabase(latency)
+    database.reference("/").set({
+        "sensordata": {str(1_700_000_000_000 + i * 1000): {"timestamp": i * 1000, "pressure": 1013.2 - i / 100}
+                       for i in range(2000)},
+        "latest": {"timestamp": 1999000, "pressure": 993.2},
+    })
+    views = setup_dashboard(database)
+    from django.test import AsyncClient
+
+    async def dashboard_client(latencies):
+        client = AsyncClient()
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            response = await client.get("/api/latest-data/")
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+
+    async def run():
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*(dashboard_client(latencies) for _ in range(n_clients)))
+        return latencies, time.perf_counter() - start
+
+    service = views.firebase_service
+    rest = service.rest
+    cache_ttl = views.LATEST_DATA_TTL
+    for name, rest_client, ttl in (("firebase_admin in threads", False, 0),
+                                   ("async REST client", rest, 0),
+                                   ("async REST client + response cache", rest, cache_ttl)):
+        service._rest = rest_client
+        views.LATEST_DATA_TTL = ttl  # 0 only coalesces concurrent requests
+        latencies, elapsed = asyncio.run(run())
+        print(f"{name}: {n_clients} clients, {len(latencies) / elapsed:,.0f} requests/s, {percentiles(latencies)}")
+    print(f"  {views.response_cache.stats()}")
+
+
+def bench_columns(n_points: int, repeat: int = 5):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "satellite_dashboard"))
+    from groundstation.services.columnar import decode_columns, encode_columns
+
+    rng = random.Random(0)
+    data = {
+        "timestamps": [1_700_000_000_000 + i * 1000 for i in range(n_points)],
+        "inside_temperature": [round(20 + rng.random(), 2) for _ in range(n_points)],
+        "outside_temperature": [round(-40 + 10 * rng.random(), 2) for _ in range(n_points)],
+        "pressure": [round(1013.25 - i / 100, 2) for i in range(n_points)],
+        "uv": [round(rng.random(), 3) for _ in range(n_points)],
+        "ozone": [round(30 * rng.random(), 3) for _ in range(n_points)],
+        "gyro": {axis: [None] * n_points for axis in "xyz"},
+        "height": [float(i) for i in range(n_points)],
+    }
+    assert decode_columns(encode_columns(data))["timestamps"] == data["timestamps"]
+
+    for name, encode in (("json", lambda d: json.dumps(d).encode()), ("columns", encode_columns)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            body = encode(data)
+        encode_ms = (time.perf_counter() - start) / repeat * 1000
+        start = time.perf_counter()
+        compressed = gzip.compress(body, compresslevel=6)
+        gzip_ms = (time.perf_counter() - start) * 1000
+        print(f"{name:8s}: {n_points} points, encode {encode_ms:.1f} ms, {len(body):,} bytes, "
+              f"gzip {gzip_ms:.1f} ms -> {len(compressed):,} bytes")
+
+
+def bench_sensor(n_lines: int):
+    rng = random.Random(0)
+    lines = [f"LA9ORB;{i * 100};{1013.25 - i / 1000:.2f};{20 + rng.random():.2f};{-40 + rng.random():.2f};"
+             f"{rng.random():.3f};{rng.random() * 30:.3f};{i / 10:.1f};on;off".encode() for i in range(n_lines)]
+
+    def split_and_convert(line):
+        # What gs.py did before the schemas: text, split, convert field by field into a dict
+        fields = line.decode('latin-1').strip().split(';')[1:]
+        return {'timestamp': int(fields[0]), 'pressure': float(fields[1]), 'insideTemp': float(fields[2]),
+                'outsideTemp': float(fields[3]), 'uv': float(fields[4]), 'ozone': float(fields[5]),
+                'height': float(fields[6]), 'rwstate': str(fields[7]), 'rwmanual': str(fields[8])}
+
+    for name, parse in (("split + convert", split_and_convert), ("compiled schema", sensor_schema.parse_sensor_line)):
+        start = time.perf_counter()
+        for line in lines:
+            parse(line)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {n_lines / elapsed:,.0f} lines/s ({elapsed / n_lines * 1e6:.2f} us/line)")
+
+    start = time.perf_counter()
+    columns, rejected = sensor_schema.parse_sensor_lines(lines)
+    elapsed = time.perf_counter() - start
+    print(f"batch to columns: {n_lines / elapsed:,.0f} lines/s ({elapsed / n_lines * 1e6:.2f} us/line)")
+    assert len(columns[2]["timestamp"]) == n_lines and not rejected
+
+
+def import_times(stderr: str) -> dict:
+    """Cumulative import time in seconds of every top-level import, from the output of python -X importtime"""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.startswith("  "):
+            continue  # imported by another module, counted in its parent
+        times[name.strip()] = times.get(name.strip(), 0) + int(cumulative) / 1e6
+    return times
+
+
+def bench_startup(runs: int):
+    repo = os.path.dirname(os.path.abspath(__file__))
+    dashboard = os.path.join(repo, "satellite_dashboard")
+    spool_dir = tempfile.mkdtemp()
+    # An emulator URL needs no credentials, nothing listens on port 9 so nothing is read either
+    env = dict(os.environ, databaseURL="http://127.0.0.1:9/?ns=bench", DJANGO_SETTINGS_MODULE="satellite_dashboard.settings",
+               SPOOL_FILE=os.path.join(spool_dir, "spool.sqlite3"))
+    worker = ("from satellite_dashboard.asgi import application; "
+              "from django.urls import get_resolver; get_resolver().url_patterns")
+    targets = (
+        ("manage.py check", [sys.executable, "-X", "importtime", "manage.py", "check"], dashboard),
+        ("dashboard worker spawn", [sys.executable, "-X", "importtime", "-c", worker], dashboard),
+        ("gs.py", [sys.executable, "-X", "importtime", "-c", "import gs"], repo),
+        # Exits when it fails to open the serial port, after all imports and the startup work
+        ("groundstation.py", [sys.executable, "-X", "importtime", "groundstation.py"], repo),
+    )
+
+    for name, command, cwd in targets:
+        walls = []
+        imports = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True)
+            walls.append(time.perf_counter() - start)
+            times = import_times(result.stderr)
+            imports.append(sum(times.values()))
+        heaviest = sorted(times.items(), key=lambda item: -item[1])[:3]
+        print(f"{name}: {statistics.median(walls) * 1000:.0f} ms wall, {statistics.median(imports) * 1000:.0f} ms imports "
+              f"(heaviest: {', '.join(f'{module} {seconds * 1000:.0f} ms' for module, seconds in heaviest)})")
+
+
+def make_flight(path: str, hours: float, rate: float, seed: int = 0) -> int:
+    """
+        Writes the capture of a synthetic balloon flight that ended now: one RX
+        frame per reading at rate Hz for hours, climbing to about 30 km
+        Output: number of frames
+    """
+    rng = random.Random(seed)
+    n_frames = int(hours * 3600 * rate)
+    period_ms = 1000 / rate
+    end_ms = int(time.time() * 1000)
+    recorder = CaptureWriter(path)
+    for i in range(n_frames):
+        timestamp = end_ms - int((n_frames - i) * period_ms)
+        height = 30000 * i / n_frames
+        pressure = 1013.25 * (1 - 2.25577e-5 * min(height, 11000)) ** 5.25588 * 0.9999 ** max(height - 11000, 0)
+        line = (f"LA9ORB;{timestamp};{pressure:.2f};{22 - height / 3000 + rng.gauss(0, 0.2):.2f};"
+                f"{15 - height / 150 + rng.gauss(0, 0.5):.2f};{rng.random() * height / 1000:.2f};"
+                f"{30 + rng.gauss(0, 2):.1f};{height:.0f};on;off")
+        recorder.write(make_rx_frame(line.encode()), timestamp * 1_000_000)
+    recorder.close()
+    return n_frames
+
+
+def ingest_capture(path: str, database, n_frames: int, speed: float = 0) -> tuple:
+    """
+        Runs a capture through the IngestPipeline and a BatchedFirebaseWriter into database, as gs.py does
+        Output: (IngestPipeline, writer, seconds until the writer has flushed everything)
+    """
+    import gs
+
+    # Room for the whole flight: a replay at full speed would otherwise measure the writer dropping writes
+    writer = BatchedFirebaseWriter(database.reference("/"), flush_interval=0.2, max_queue=4 * n_frames + 1000).start()
+    rollups = Rollups(writer)
+
+    def upload(receiver, copies, decoded, reading, error):
+        gs.write_frame(writer, decoded, reading, error, False, rollups)
+
+    ingest = IngestPipeline({path: ReplaySerial(path, speed)}, upload)
+    start = time.perf_counter()
+    ingest.run()
+    rollups.flush()
+    writer.stop(timeout=600)
+    return ingest, writer, time.perf_counter() - start
+
+
+def bench_flight(hours: float, rate: float, n_clients: int, n_requests: int, latency: float, failure_rate: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "flight.bin")
+        n_frames = make_flight(path, hours, rate)
+        print(f"Flight of {hours:g} h at {rate:g} Hz: {n_frames} frames, {os.path.getsize(path) / 1e6:.1f} MB capture")
+
+        # Ingest: frames/s from the serial reader until everything is written to Firebase
+        database = FakeDatabase(latency, failure_rate=failure_rate, seed=0)
+        ingest, writer, elapsed = ingest_capture(path, database, n_frames)
+        end_to_end = ingest.stats()["end_to_end"]
+        stats = writer.stats()
+        print(f"ingest: {n_frames / elapsed:,.0f} frames/s end to end, frame latency p50/p99 "
+              f"{end_to_end['p50_ms']:.2f}/{end_to_end['p99_ms']:.2f} ms, {stats['batches']} Firebase updates, "
+              f"{stats['write_errors']} failed ({database.failures} injected), {stats['dropped']} writes dropped")
+        # With failures a batch that still fails when the writer stops is dropped
+        print(f"  {len(database.data.get('sensordata', {}))} of {n_frames} readings in Firebase")
+
+        # API: latency percentiles per endpoint with the flight in the database
+        views = setup_dashboard(database)
+        from django.test import AsyncClient
+        # Requests that hit an injected failure are counted as errors, not logged with their traceback
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+        urls = ("/api/latest-data/", "/api/historical-data/?limit=1000&points=500",
+                "/api/dashboard-data/?limit=200", "/api/rollup-data/?period=24h")
+
+        async def dashboard_client(url, latencies, errors):
+            client = AsyncClient(raise_request_exception=False)
+            for _ in range(n_requests):
+                start = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+        async def run(url):
+            latencies, errors = [], []
+            await asyncio.gather(*(dashboard_client(url, latencies, errors) for _ in range(n_clients)))
+            return latencies, errors
+
+        for url in urls:
+            latencies, errors = asyncio.run(run(url))
+            print(f"{url}: {n_clients} clients, {percentiles(latencies)}, {len(errors)} errors")
+        print(f"  {views.response_cache.stats()}")
+
+        # Memory: Python allocations while the flight is ingested again into an empty database
+        tracemalloc.start()
+        database = FakeDatabase()
+        ingest_capture(path, database, n_frames)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"memory: {peak / 1e6:.1f} MB peak while ingesting, {current / 1e6:.1f} MB held "
+              f"({current / n_frames:,.0f} bytes per frame, mostly the in-memory database)")
+
+
+def bench_payloads(n_frames: int):
+    # Beacons filled up with extensions: SRC, Stat, Position, Time of Hour, then more Stat/Position and Data
+    generator = TrafficGenerator(seed=3)
+    frames = []
+    for i in range(n_frames):
+        payloads = generator.beacon(i, i & 0xFF)
+        payloads += payloads[1:3] * 3 + [(ngham.EXT_DATA, bytes(16))]
+        frames.append(ngham.encode_ngham_spp_packet(0x00, ngham.encode_ngham_spp_packet_rx(payloads, i)))
+    offset = ngham.SPP_HEADER_LEN + 8  # RX header
+    print(f"{n_frames} frames with {len(payloads)} extensions, {len(frames[0])} bytes each")
+
+    def if_elif_chain(payload, offset):
+        # decode_ngham_spp_packet_rx_payloads before the RX_PAYLOAD_TYPES registry
+        payload = memoryview(payload)
+        decoded_payloads = []
+        i = offset
+        end = len(payload)
+        while i < end:
+            packet_type = payload[i]
+            data_start = i + 2
+            data_end = data_start + payload[i + 1]
+            if packet_type == 1:
+                decoded_payloads.append({"type": "SRC", "data": ngham.ngh_ext_decode_callsign(payload, data_start)})
+            elif packet_type == 2:
+                decoded_payloads.append({"type": "Stat", "data": ngham.ngh_ext_decode_stat(payload, data_start)})
+            elif packet_type == 4:
+                decoded_payloads.append({"type": "Position", "data": ngham.ngh_ext_decode_position(payload,
+                                                                                                   data_start)})
+            else:
+                decoded_payloads.append({"type": {0: "Data", 5: "Time of Hour"}.get(packet_type, "Unknown"),
+                                         "data": payload[data_start:data_end].tolist()})
+            i = data_end
+        return decoded_payloads
+
+    def callsign_only(payload, offset):
+        views = ngham.decode_ngham_spp_packet_rx_payloads(payload, offset, lazy=True)
+        return [view.data for view in views if view.packet_type == ngham.EXT_CALLSIGN]
+
+    cases = (
+        ("if/elif chain (before)", if_elif_chain),
+        ("registry, all decoded", ngham.decode_ngham_spp_packet_rx_payloads),
+        ("lazy views, nothing accessed", lambda payload, offset:
+            ngham.decode_ngham_spp_packet_rx_payloads(payload, offset, lazy=True)),
+        ("lazy views, only SRC accessed", callsign_only),
+        ("types={EXT_CALLSIGN}", lambda payload, offset:
+            ngham.decode_ngham_spp_packet_rx_payloads(payload, offset, {ngham.EXT_CALLSIGN})),
+    )
+    expected = if_elif_chain(frames[0], offset)
+    for name, decode in cases:
+        result = decode(frames[0], offset)
+        assert name.startswith(("lazy", "types")) or result == expected, name
+        start = time.perf_counter()
+        for frame in frames:
+            decode(frame, offset)
+        elapsed = time.perf_counter() - start
+        print(f"  {name}: {elapsed / n_frames * 1e6:.2f} us/frame")
+    assert [dict(view) for view in ngham.decode_ngham_spp_packet_rx_payloads(frames[0], offset, lazy=True)] == expected
+
+
+def check_roundtrip(n: int, seed: int = 0) -> int:
+    """
+        Encodes n random values of every packet type and extension and checks that they decode to the same
+        Output: number of mismatches, each one is printed
+    """
+    rng = random.Random(seed)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    mismatches = 0
+
+    def check(name, decoded, expected):
+        nonlocal mismatches
+        if decoded != expected:
+            mismatches += 1
+            print(f"  {name}: decoded {decoded}, expected {expected}")
+
+    for _ in range(n):
+        callsign = "".join(rng.choice(letters) for _ in range(rng.randint(1, 7)))
+        ssid = rng.randint(0, 15)
+        sequence_number = rng.randrange(256)
+        full_callsign = f"{callsign}-{ssid}" if ssid else callsign
+        callsign_data = ngham.ngh_ext_encode_callsign(full_callsign, sequence_number)
+        check("callsign", ngham.ngh_ext_decode_callsign(callsign_data),
+              {"callsign": full_callsign, "sequence_number": sequence_number})
+
+        stat = {"hw_ver": (rng.randrange(1024), rng.randrange(64)), "serial": rng.randrange(65536),
+                "sw_ver": (rng.randrange(16), rng.randrange(256), rng.randrange(16)),
+                "uptime_s": rng.randrange(400_000), "voltage_v": rng.randrange(256) / 10,
+                "temp_c": rng.randrange(256), "signal_dbm": rng.randint(-200, 55), "noise_dbm": rng.randint(-200, 55),
+                "cntr_rx_ok": rng.randrange(65536), "cntr_rx_fix": rng.randrange(65536),
+                "cntr_rx_err": rng.randrange(65536), "cntr_tx": rng.randrange(65536)}
+        stat_data = ngham.ngh_ext_encode_stat(**stat)
+        hours, remainder = divmod(stat["uptime_s"], 3600)
+        check("stat", ngham.ngh_ext_decode_stat(stat_data), {
+            "hw_ver": "{}/{}".format(*stat["hw_ver"]), "serial": stat["serial"],
+            "sw_ver": "{}.{}.{}".format(*stat["sw_ver"]),
+            "uptime H:M:S": f"{hours:02}:{remainder // 60:02}:{remainder % 60:02}",
+            "voltage V": stat["voltage_v"], "temp C": stat["temp_c"], "signal dBm": stat["signal_dbm"],
+            "noise dBm": stat["noise_dbm"], "cntr_rx_ok": stat["cntr_rx_ok"], "cntr_rx_fix": stat["cntr_rx_fix"],
+            "cntr_rx_err": stat["cntr_rx_err"], "cntr_tx": stat["cntr_tx"]})
+
+        position = (rng.randint(-900_000_000, 900_000_000), rng.randint(-1_800_000_000, 1_800_000_000),
+                    rng.randint(-500, 40000), rng.randrange(65536) * 100, rng.randrange(3600) / 10,
+                    rng.randrange(256) / 10)
+        position_data = ngham.ngh_ext_encode_position(*position)
+        check("position", ngham.ngh_ext_decode_position(position_data),
+              dict(zip(("lat", "lon", "alt", "sog m/s", "cog deg", "hdop deg"), position)))
+
+        toh_us = rng.randrange(3_600_000_000)
+        minutes, seconds = divmod(toh_us // 1_000_000, 60)
+        check("time of hour", ngham.decode_time_of_hour(ngham.encode_time_of_hour(toh_us)),
+              f"{minutes:02}:{seconds:02}.{toh_us % 1_000_000:06d}")
+
+        raw = bytes(rng.randrange(256) for _ in range(rng.randint(0, 16)))
+        payloads = [(ngham.EXT_CALLSIGN, callsign_data), (ngham.EXT_STAT, stat_data),
+                    (ngham.EXT_POSITION, position_data), (ngham.EXT_DATA, raw)]
+        expected_payloads = ngham.decode_ngham_spp_packet_rx_payloads(ngham.encode_ngham_spp_packet_rx_payloads(
+            payloads))
+        check("payload types", [payload["type"] for payload in expected_payloads], ["SRC", "Stat", "Position", "Data"])
+        check("raw payload", expected_payloads[3]["data"], list(raw))
+
+        rssi_dbm, noise_dbm, errors = rng.randint(-200, 55), rng.randint(-200, 55), rng.randrange(256)
+        line = ngham.encode_ngham_spp_packet_rx_sensor_data(callsign, [rng.randrange(10**6) for _ in range(9)])
+        for body, flags in ((line, "0x0"), (payloads, "0x1")):
+            frame = ngham.encode_ngham_spp_packet(0x00, ngham.encode_ngham_spp_packet_rx(
+                body, toh_us, noise_dbm, rssi_dbm, errors))
+            decoded = ngham.decode_ngham_spp_packet(frame)
+            rx = decoded["spp_payload"]["data"]
+            check("rx header", (rx["noise dBm"], rx["rssi dBm"], rx["errors"], rx["ngham_flags"]),
+                  (noise_dbm, rssi_dbm, errors, flags))
+            check("rx body", rx["rx_payloads"], ngham.decode_ngham_spp_packet_rx_sensor_data(line)
+                  if flags == "0x0" else expected_payloads)
+
+            tx_payload = ngham.encode_ngham_spp_packet_tx(body)
+            decoded = ngham.decode_ngham_spp_packet(ngham.encode_ngham_spp_packet(0x01, tx_payload))
+            check("tx frame", decoded["spp_payload"], {"type": "TX", "data": list(tx_payload)})
+            check("tx body", ngham.decode_ngham_spp_packet_tx(tx_payload)["tx_payloads"], rx["rx_payloads"])
+    return mismatches
+
+
+def bench_traffic(n_frames: int, noise: float, corruption: float, rate: float, speedup: float):
+    # The noise makes the receivers warn about dropped bytes all the time
+    logging.getLogger().setLevel(logging.ERROR)
+
+    mismatches = check_roundtrip(1000)
+    print(f"round trip: every packet type and extension 1000 times, {mismatches} mismatches")
+
+    # Resync: every undamaged frame must come out of the parser unchanged, whatever the noise around it
+    generator = TrafficGenerator(rate, noise, corruption, tx_every=25, seed=1)
+    sent = []
+    parser = ngham.NGHamSPPFrameParser()
+    parsed = []
+    start = time.perf_counter()
+    for _, chunk in generator.stream(n_frames, sent=sent):
+        parsed.extend(bytes(frame) for frame in parser.feed(chunk))
+    elapsed = time.perf_counter() - start
+    expected = [generated.frame for generated in sent]
+    missed = len(set(expected) - set(parsed))
+    spurious = len(set(parsed) - set(expected))
+    print(f"parser fuzz: {generator.frames} frames, {generator.corrupted} corrupted, {generator.noise_bytes} bytes "
+          f"of noise: {len(parsed)} parsed, {missed} undamaged frames missed, {spurious} spurious, "
+          f"{parser.resyncs} resyncs, {parser.crc_errors} CRC errors, {n_frames / elapsed:,.0f} frames/s")
+
+    # Load: replay in real time at speedup x the link rate and see whether the pipeline keeps up
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "traffic.bin")
+        generator = TrafficGenerator(rate * speedup, noise, corruption, seed=2)
+        n = int(min(n_frames, 30 * rate * speedup))
+        generator.write_capture(path, n)
+        ingest, writer, elapsed = ingest_capture(path, FakeDatabase(), n, speed=1.0)
+        stats = ingest.stats()
+        end_to_end = stats["end_to_end"]
+        print(f"load at {speedup:g}x {rate:g} frames/s: {n} frames in {elapsed:.1f} s "
+              f"(sent over {n / (rate * speedup):.1f} s), frame latency p50/p99 {end_to_end['p50_ms']:.2f}/"
+              f"{end_to_end['p99_ms']:.2f} ms, max decode queue {stats['decode']['max_queue_depth']}, "
+              f"{writer.stats()['dropped']} writes dropped")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = arg_parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("parser", help="streaming NGHam-SPP frame parser throughput")
+    p.add_argument("--size-mb", type=float, default=8)
+
+    p = sub.add_parser("crc", help="CRC-16 cost per frame, single and batch")
+    p.add_argument("--frames", type=int, default=20000)
+
+    p = sub.add_parser("decode", help="full decode of RX frames, list slicing vs struct decoder, list vs buffer input")
+    p.add_argument("--frames", type=int, default=20000)
+
+    p = sub.add_parser("bulk", help="per-frame decode vs columnar bulk decode of a capture")
+    p.add_argument("--size-mb", type=float, default=8)
+
+    p = sub.add_parser("writer", help="blocking Firebase set() vs batched writer against a fake Firebase")
+    p.add_argument("--frames", type=int, default=500)
+    p.add_argument("--latency", type=float, default=0.05, help="seconds per Firebase call")
+
+    p = sub.add_parser("api", help="dashboard API under concurrent clients against a local Firebase stub")
+    p.add_argument("--clients", type=int, default=100)
+    p.add_argument("--requests", type=int, default=10, help="requests per client")
+    p.add_argument("--latency", type=float, default=0.02, help="seconds per Firebase call")
+
+    p = sub.add_parser("columns", help="encode time and size of chart data, JSON vs binary columns")
+    p.add_argument("--points", type=int, default=10000)
+
+    p = sub.add_parser("sensor", help="sensor line parsing, ad-hoc split vs compiled schema vs batch")
+    p.add_argument("--lines", type=int, default=100000)
+
+    p = sub.add_parser("startup", help="startup and import time (python -X importtime) of the dashboard and ingest scripts")
+    p.add_argument("--runs", type=int, default=5)
+
+    p = sub.add_parser("flight", help="end to end ingest frames/s, API latency and memory with a synthetic flight")
+    p.add_argument("--hours", type=float, default=3.0)
+    p.add_argument("--rate", type=float, default=1.0, help="readings per second")
+    p.add_argument("--clients", type=int, default=20)
+    p.add_argument("--requests", type=int, default=10, help="requests per client and endpoint")
+    p.add_argument("--latency", type=float, default=0.01, help="seconds added to every Firebase call")
+    p.add_argument("--failure-rate", type=float, default=0.01, help="fraction of Firebase calls that fail")
+
+    p = sub.add_parser("payloads", help="RX extension payload decoding, eager vs lazy views vs filtered by type")
+    p.add_argument("--frames", type=int, default=20000)
+
+    p = sub.add_parser("traffic", help="encoder/decoder round trip, parser fuzzing and load at a multiple of "
+                                       "the link rate with generated traffic (traffic.py)")
+    p.add_argument("--frames", type=int, default=20000)
+    p.add_argument("--noise", type=float, default=0.2, help="chance of line noise before a frame")
+    p.add_argument("--corruption", type=float, default=0.05, help="chance that a frame is damaged")
+    p.add_argument("--rate", type=float, default=1.0, help="link rate in frames per second")
+    p.add_argument("--speedup", type=float, default=100, help="load test at this multiple of the link rate")
+
+    args = arg_parser.parse_args()
+    if args.bench == "parser":
+        bench_parser(args.size_mb)
+    elif args.bench == "crc":
+        bench_crc(args.frames)
+    elif args.bench == "decode":
+        bench_decode(args.frames)
+    elif args.bench == "bulk":
+        bench_bulk(args.size_mb)
+    elif args.bench == "writer":
+        bench_writer(args.frames, args.latency)
+    elif args.bench == "api":
+        bench_api(args.clients, args.requests, args.latency)
+    elif args.bench == "columns":
+        bench_columns(args.points)
+    elif args.bench == "sensor":
+        bench_sensor(args.lines)
+    elif args.bench == "startup":
+        bench_startup(args.runs)
+    elif args.bench == "flight":
+        bench_flight(args.hours, args.rate, args.clients, args.requests, args.latency, args.failure_rate)
+    elif args.bench == "payloads":
+        bench_payloads(args.frames)
+    elif args.bench == "traffic":
+        bench_traffic(args.frames, args.noise, args.corruption, args.rate, args.speedup)
+
+
+if __name__ == "__main__":
+    main()
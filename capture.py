@@ -0,0 +1,111 @@
+"""
+Raw serial captures for recording a downlink and replaying it later.
+
+A capture file is the magic bytes followed by one record per serial read:
+    arrival time (uint64, ns since epoch) | length (uint32) | data
+"""
+import struct
+import threading
+import time
+
+CAPTURE_MAGIC = b"RSCAP1\n"
+_RECORD = struct.Struct('<QI')
+
+
+class CaptureWriter:
+    def __init__(self, path):
+        self._file = open(path, "wb")
+        self._file.write(CAPTURE_MAGIC)
+
+    def write(self, chunk, arrival_ns=None):
+        """Records a chunk as read from the serial port"""
+        if arrival_ns is None:
+            arrival_ns = time.time_ns()
+        self._file.write(_RECORD.pack(arrival_ns, len(chunk)))
+        self._file.write(chunk)
+
+    def close(self):
+        self._file.close()
+
+
+def read_capture(path):
+    """
+        Reads a capture file
+        Output: generator of (arrival time ns, chunk bytes)
+    """
+    with open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while True:
+            record = f.read(_RECORD.size)
+            if len(record) < _RECORD.size:
+                return
+            arrival_ns, length = _RECORD.unpack(record)
+            yield arrival_ns, f.read(length)
+
+
+class ReplaySerial:
+    """
+        Plays back a capture file through the same read()/in_waiting interface
+        as serial.Serial. speed is the playback rate relative to the recording
+        (1.0 is real time), 0 replays as fast as possible.
+        close() and cancel_read() may be called from another thread than the
+        one reading, e.g. to stop a real time replay that waits for a record.
+    """
+
+    def __init__(self, path, speed=1.0):
+        self.port = path
+        self.speed = speed
+        self.eof = False
+        self._records = read_capture(path)
+        self._lock = threading.Lock()  # the records generator can not be closed while it is being read
+        self._wake = threading.Event()  # cuts short the wait for the next record
+        self._buffer = b""
+        self._start_ns = None
+        self._first_arrival_ns = None
+
+    @property
+    def in_waiting(self) -> int:
+        if not self._buffer:
+            self._next_record()
+        return len(self._buffer)
+
+    def read(self, size=1) -> bytes:
+        if not self._buffer:
+            self._next_record()
+        data = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return data
+
+    def cancel_read(self):
+        """Like serial.Serial.cancel_read, a read waiting for its record returns at once"""
+        self._wake.set()
+
+    def close(self):
+        self._wake.set()
+        with self._lock:
+            if self._records is None:
+                return  # Already closed
+            self._records.close()
+            self._records = None
+            self.eof = True
+
+    def _next_record(self):
+        with self._lock:
+            if self._records is None:
+                return
+            try:
+                arrival_ns, self._buffer = next(self._records)
+            except StopIteration:
+                self.eof = True
+                return
+
+        if not self.speed:
+            return
+        if self._start_ns is None:
+            self._start_ns = time.monotonic_ns()
+            self._first_arrival_ns = arrival_ns
+        due_ns = self._start_ns + (arrival_ns - self._first_arrival_ns) / self.speed
+        delay_ns = due_ns - time.monotonic_ns()
+        if delay_ns > 0 and self._wake.wait(delay_ns / 1e9):
+            self._wake.clear()
@@ -0,0 +1,288 @@
+"""
+In-memory stand-in for firebase_admin.db references, for running the ingest
+path and the dashboard offline. Only the subset of the Reference API used in
+this repo is implemented: child, get, set, update, push and the key queries
+order_by_key().start_at()/end_at()/limit_to_first()/limit_to_last().get().
+
+FakeDatabase.serve() also exposes the data over the Realtime Database REST
+protocol, so firebase_admin (databaseURL http://127.0.0.1:<port>/?ns=<name>,
+as for the emulator) and the dashboard's async REST client can run against it.
+Run it as a local server without credentials:
+
+    python fake_firebase.py [--port 9000] [--latency 0.02] [--failure-rate 0.01] [--load data.json]
+
+Latency and failures are injected on every call, failed calls raise
+FakeFirebaseError (HTTP 503 over REST) like an unreachable database.
+"""
+import argparse
+import copy
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class FakeFirebaseError(Exception):
+    """Injected failure of a call to the FakeDatabase"""
+
+
+class FakeDatabase:
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.data = {}
+        self.latency = latency  # seconds added to every call, to mimic a slow link
+        self.jitter = jitter  # up to this many seconds added at random on top of latency
+        self.failure_rate = failure_rate  # fraction of calls that fail
+        self.calls = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._fail_next = 0
+
+    def reference(self, path="/"):
+        return FakeReference(self, path)
+
+    def fail_next(self, n=1):
+        """Makes the next n calls fail, e.g. to test the retries of a writer"""
+        self._fail_next += n
+
+    def _call(self):
+        """Delay and injected failure of one call, returns the lock to hold while it runs"""
+        self.calls += 1
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if self._fail_next or (self.failure_rate and self._random.random() < self.failure_rate):
+            self._fail_next = max(self._fail_next - 1, 0)
+            self.failures += 1
+            raise FakeFirebaseError(f"Injected failure of call #{self.calls}")
+        return self.lock
+
+    def serve(self, host="127.0.0.1", port=0):
+        """
+            Serves the database over the REST protocol from a background thread
+            Output: the running server, its URL is f"http://{host}:{server.server_port}"
+        """
+        server = ThreadingHTTPServer((host, port), _RestHandler)
+        server.daemon_threads = True
+        server.database = self
+        threading.Thread(target=server.serve_forever, name="fake-firebase", daemon=True).start()
+        return server
+
+
+class FakeReference:
+    def __init__(self, database, path="/"):
+        self.database = database
+        self.path = "/" + "/".join(_split(path))
+
+    def child(self, path):
+        return FakeReference(self.database, f"{self.path}/{path}")
+
+    def get(self):
+        with self._call():
+            return copy.deepcopy(self._node())
+
+    def set(self, value):
+        with self._call():
+            self._put(_split(self.path), copy.deepcopy(value))
+
+    def update(self, value):
+        with self._call():
+            for path, child_value in value.items():
+                self._put(_split(self.path) + _split(path), copy.deepcopy(child_value))
+
+    def push(self, value=""):
+        key = f"{time.time_ns():x}"
+        ref = self.child(key)
+        ref.set(value)
+        return ref
+
+    def order_by_key(self):
+        return FakeQuery(self)
+
+    def _call(self):
+        return self.database._call()
+
+    def _node(self):
+        node = self.database.data
+        for key in _split(self.path):
+            if not isinstance(node, dict) or key not in node:
+                return None
+            node = node[key]
+        return node
+
+    def _put(self, keys, value):
+        if not keys:
+            self.database.data = value if isinstance(value, dict) else {}
+            return
+        node = self.database.data
+        for key in keys[:-1]:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        if value is None:
+            node.pop(keys[-1], None)
+        else:
+            node[keys[-1]] = value
+
+
+class FakeQuery:
+    """order_by_key() query of a FakeReference, the methods chain like db.Query"""
+
+    def __init__(self, ref):
+        self.ref = ref
+        self._start_at = None
+        self._end_at = None
+        self._limit_to_first = None
+        self._limit_to_last = None
+
+    def start_at(self, start):
+        self._start_at = start
+        return self
+
+    def end_at(self, end):
+        self._end_at = end
+        return self
+
+    def limit_to_first(self, limit):
+        if self._limit_to_last is not None:
+            raise ValueError("Cannot set both first and last limits.")
+        self._limit_to_first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        if self._limit_to_first is not None:
+            raise ValueError("Cannot set both first and last limits.")
+        self._limit_to_last = limit
+        return self
+
+    def get(self):
+        with self.ref._call():
+            node = self.ref._node()
+            result = query_by_key(node, self._start_at, self._limit_to_first, self._limit_to_last, self._end_at)
+            return copy.deepcopy(result)
+
+
+def _split(path):
+    return [key for key in str(path).split("/") if key]
+
+
+def key_order(key):
+    """Firebase orders keys that are 32 bit integers numerically, before all other keys"""
+    try:
+        number = int(key)
+    except ValueError:
+        return (1, 0, key)
+    if -2 ** 31 <= number < 2 ** 31 and str(number) == key:
+        return (0, number, "")
+    return (1, 0, key)
+
+
+def query_by_key(node, start_at=None, limit_to_first=None, limit_to_last=None, end_at=None):
+    """Children of node ordered by key, like order_by_key() with start_at, end_at and limits"""
+    if not isinstance(node, dict):
+        return node
+    keys = sorted(node, key=key_order)
+    if start_at is not None:
+        start = key_order(str(start_at))
+        keys = [key for key in keys if key_order(key) >= start]
+    if end_at is not None:
+        end = key_order(str(end_at))
+        keys = [key for key in keys if key_order(key) <= end]
+    if limit_to_first is not None:
+        keys = keys[:limit_to_first]
+    if limit_to_last is not None:
+        keys = keys[-limit_to_last:] if limit_to_last else []
+    return {key: node[key] for key in keys}
+
+
+class _RestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _ref(self):
+        url = urlparse(self.path)
+        path = url.path[:-len(".json")] if url.path.endswith(".json") else url.path
+        params = {key: json.loads(values[0]) for key, values in parse_qs(url.query).items()
+                  if key in ("orderBy", "startAt", "endAt", "limitToFirst", "limitToLast")}
+        return self.server.database.reference(path), params
+
+    def _body(self):
+        return json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+
+    def _reply(self, value, status=200):
+        body = json.dumps(value).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        ref, params = self._ref()
+        if params.get("orderBy") == "$key":
+            query = ref.order_by_key()
+            for param, method in (("startAt", query.start_at), ("endAt", query.end_at),
+                                  ("limitToFirst", query.limit_to_first), ("limitToLast", query.limit_to_last)):
+                if param in params:
+                    method(params[param])
+            self._handle(query.get)
+        else:
+            self._handle(ref.get)
+
+    def do_PUT(self):
+        ref, _ = self._ref()
+        value = self._body()
+        self._handle(lambda: ref.set(value) or value)
+
+    def do_PATCH(self):
+        ref, _ = self._ref()
+        value = self._body()
+        self._handle(lambda: ref.update(value) or value)
+
+    def do_POST(self):
+        ref, _ = self._ref()
+        value = self._body()
+        self._handle(lambda: {"name": ref.push(value).path.rsplit("/", 1)[-1]})
+
+    def do_DELETE(self):
+        ref, _ = self._ref()
+        self._handle(lambda: ref.set(None))
+
+    def _handle(self, call):
+        try:
+            value = call()
+        except FakeFirebaseError as e:
+            self._reply({"error": str(e)}, 503)
+            return
+        self._reply(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Realtime Database stand-in, no credentials needed")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--namespace", default="local")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many seconds added at random")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--load", metavar="FILE", help="JSON export of a database to start from")
+    args = parser.parse_args()
+
+    database = FakeDatabase(args.latency, args.jitter, args.failure_rate)
+    if args.load:
+        with open(args.load) as f:
+            database.data = json.load(f)
+    server = database.serve(args.host, args.port)
+    print(f"databaseURL=http://{args.host}:{server.server_port}/?ns={args.namespace}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
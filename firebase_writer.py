@@ -0,0 +1,194 @@
+import logging
+import os
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+
+_log = logging.getLogger(__name__)
+
+
+def is_emulator_url(database_url) -> bool:
+    """
+        True if database_url is a local emulator (or `python fake_firebase.py`),
+        http://host:port/?ns=name, which needs no service account credentials
+    """
+    return urlparse(database_url or "").scheme == "http" or bool(os.getenv("FIREBASE_DATABASE_EMULATOR_HOST"))
+
+
+class LazyFirebaseReference:
+    """
+        Root reference of a Firebase app that is initialized on the first
+        update(), from whichever thread writes first (the writer thread of a
+        BatchedFirebaseWriter). Importing firebase_admin and reading the
+        credentials then no longer delay the start of the serial port.
+        An emulator databaseURL is used without credentials.
+    """
+
+    def __init__(self, database_url, credentials_file="credentials.json"):
+        self.database_url = database_url
+        self.credentials_file = credentials_file
+        self._ref = None
+        self._lock = threading.Lock()
+
+    def reference(self):
+        ref = self._ref
+        if ref is None:
+            with self._lock:
+                if self._ref is None:
+                    from firebase_admin import db, credentials
+                    import firebase_admin
+
+                    cred = None if is_emulator_url(self.database_url) else credentials.Certificate(self.credentials_file)
+                    try:
+                        firebase_admin.initialize_app(cred, {"databaseURL": self.database_url})
+                    except ValueError:
+                        # App already initialized
+                        pass
+                    self._ref = db.reference("/")
+                ref = self._ref
+        return ref
+
+    def child(self, path):
+        return self.reference().child(path)
+
+    def update(self, updates):
+        self.reference().update(updates)
+
+
+class BatchedFirebaseWriter:
+    """
+        Writes to Firebase from a background thread
+        set() only puts the write on a bounded queue, so the serial loop never
+        waits for Firebase. Every flush_interval the queued writes are combined
+        into a single multi-path update() on the root reference. Writes to the
+        same path within one batch collapse to the newest value, so 'latest' is
+        written once per batch.
+        After a failed update the writer waits before retrying, starting at
+        flush_interval and doubling up to max_backoff seconds. Each retry also
+        takes up to max_batch new writes, so fresh readings keep leaving the
+        queue. A batch that failed max_retries times is dropped (counted in
+        dropped) and the writer carries on with the writes queued since.
+    """
+
+    def __init__(self, ref, flush_interval=1.0, max_queue=10000, max_batch=1000, max_backoff=30.0,
+                 max_retries=5):
+        self.ref = ref
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_backoff = max_backoff
+        self.max_retries = max_retries
+        self._backoff = 0.0
+        self._attempts = 0  # failed updates of the batch in _retry
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="firebase-writer", daemon=True)
+        self._retry = {}
+
+        # Backpressure metrics
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.max_queue_depth = 0
+        self.last_batch_size = 0
+        self.last_flush_seconds = 0.0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10.0):
+        """Stops the writer thread after flushing everything that is queued"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def set(self, path: str, value) -> bool:
+        """
+            Queues a write of value to path (relative to the root reference)
+            Output: False if the queue is full and the write was dropped
+        """
+        try:
+            self._queue.put_nowait((path, value))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return True
+
+    def get(self, path: str):
+        """Reads path (relative to the root reference) from Firebase, writes still queued are not included"""
+        return self.ref.child(path).get()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
+
+    def _collect(self, deadline) -> dict:
+        """Collects queued writes (on top of a batch to retry) until the deadline or until max_batch are taken"""
+        updates = self._retry
+        self._retry = {}
+        for _ in range(self.max_batch):
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout <= 0 or self._stop.is_set():
+                    path, value = self._queue.get_nowait()
+                else:
+                    path, value = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            updates[path] = value
+        return updates
+
+    def _flush(self, updates: dict):
+        start = time.monotonic()
+        try:
+            self.ref.update(updates)
+        except Exception as e:
+            self.write_errors += 1
+            self._backoff = min(max(self._backoff * 2, self.flush_interval), self.max_backoff)
+            self._attempts += 1
+            if self._attempts > self.max_retries:
+                # The outage has lasted too long for these writes, make room for the fresh ones
+                _log.warning("Firebase write failed, batch dropped", extra={"fields": {
+                    "paths": len(updates), "error": str(e), "attempts": self._attempts}})
+                self.dropped += len(updates)
+                self._attempts = 0
+                return
+            _log.warning("Firebase write failed", extra={"fields": {
+                "paths": len(updates), "error": str(e), "retry_in_s": self._backoff}})
+            # Retried together with the writes queued in the meantime
+            self._retry = updates
+            return
+        self._backoff = 0.0
+        self._attempts = 0
+        self.last_flush_seconds = time.monotonic() - start
+        self.last_batch_size = len(updates)
+        self.written += len(updates)
+        self.batches += 1
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty() and not self._retry):
+            updates = self._collect(time.monotonic() + self.flush_interval)
+            if updates:
+                self._flush(updates)
+            if self._retry and not self._stop.is_set():
+                # Back off instead of retrying a failing Firebase in a tight loop, stop() cuts the wait short
+                self._stop.wait(self._backoff)
+            if self._stop.is_set() and self._retry:
+                # Give up on a failing Firebase at shutdown
+                self.dropped += len(self._retry)
+                self._retry = {}
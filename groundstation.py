@@ -1,10 +1,12 @@
-from firebase_admin import db, credentials
 from dotenv import load_dotenv
-import firebase_admin
 
 import os
 import serial
 
+from rollups import Rollups
+from spool import Spool
+from sensor_schema import parse_sensor_line
+
 load_dotenv()
 
 GCP_PROJECT_ID = os.getenv('projectID')
@@ -12,12 +14,10 @@ SERIVCE_ACCOUNT_ID = os.getenv('SERVICE_ACCOUNT_FILE')
 STORAGE_BUCKET_NAME = os.getenv('storageBucket')
 DATABASE_URL = os.getenv('databaseURL')
 
-# default_app = firebase_admin.initialize_app()
-cred = credentials.Certificate("credentials.json")
-firebase_admin.initialize_app(cred, {"databaseURL": DATABASE_URL})
-
-ref = db.reference("/")
-print(ref.get())
+# Writes go to the local spool, `python spool.py drain` uploads them to Firebase.
+# Nothing here talks to Firebase, so it is not initialized (and not read) at startup
+spool = Spool(os.getenv('SPOOL_FILE', 'spool.sqlite3'))
+rollups = Rollups(spool)
 
 
 SERIAL_PORT = 'COM3' # COM3 if Windows, /dev/ttyUSB0 if Linux
@@ -33,42 +33,26 @@ except serial.SerialException as e:
 """
 data in format:
 timestamp_ms;pressure_hPa;insideTemperature_C;outsideTemperature_C;UV_candela;ozone_ppm;gyro_x;gyro_y;gyro_z
+(sensor_schema.py version 1)
 """
 
 def addToFirebase(line):
-    data = line.split(";")
-    if len(data) != 9:
-        print("Invalid data format!")
+    # Layout (see sensor_schema.py) is picked by the line's version tag or field count
+    try:
+        reading = parse_sensor_line(line)
+    except ValueError as e:
+        print(f"Invalid data format! {e}")
         return
-    
-    timestamp, pressure, insideTemp, outsideTemp, uv, ozone, gyroX, gyroY, gyroZ = data
-    timestamp = float(data[0]) # ms
-    pressure = float(data[1])  # hPa
-    insideTemp = float(data[2])    # degree C
-    outsideTemp = float(data[3])   # degree C
-    uv = float(data[4])    # candela
-    ozone = float(data[5]) # ppm
-    gyroX = float(data[6])
-    gyroY = float(data[7])
-    gyroZ = float(data[8])
-
-    data_entry = {
-        'timestamp': timestamp,
-        'pressure': pressure,
-        'insideTemp': insideTemp,
-        'outsideTemp': outsideTemp,
-        'uv': uv,
-        'ozone': ozone,
-        'gyroX': gyroX,
-        'gyroY': gyroY,
-        'gyroZ': gyroZ
-    }
 
-    readings_ref = ref.child('sensordata')
-    readings_ref.child(timestamp).set(data_entry)
+    data_entry = reading.to_firebase()
+
+    # Keys are whole ms, like the ones the dashboard reads
+    spool.set(f"sensordata/{int(reading.timestamp)}", data_entry)
     
     # Gets latest data
-    ref.child('latest').set(data_entry)
+    spool.set("latest", data_entry)
+
+    rollups.add(reading)
 
 
 while True:
@@ -77,10 +61,11 @@ while True:
         line = lineBinary.decode('ascii')
         line = line.replace("\n", "")
         print(line)
-        addToFirebase(line)
+        addToFirebase(lineBinary)
 
     except KeyboardInterrupt:
         print("KeyboardInterrupt")
+        rollups.flush()
         ser.close()
         break
 
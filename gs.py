@@ -1,21 +1,33 @@
-import serial
+import argparse
+import logging
 import sys
-import json
 import os
+import time
 
 from datetime import datetime
-from firebase_admin import db, credentials
 from dotenv import load_dotenv
-import firebase_admin
 
 
 import ngham
+from capture import CaptureWriter, ReplaySerial
+from firebase_writer import BatchedFirebaseWriter, LazyFirebaseReference
+from metrics import configure_logging
+from pipeline import IngestPipeline
+from receivers import FrameDeduplicator
+from rollups import Rollups
+from spool import Spool
 
 load_dotenv()
 
 """
+Usage:
+    python gs.py [--port COM3] [--record capture.bin]
+    python gs.py --port COM3 --port COM4  # several receivers, frames heard by more than one are written once
+    python gs.py --replay capture.bin [--speed 0] [--fake-firebase] [--quiet]
+
 data in format:
 callsign;timestamp_ms;pressure_hPa;insideTemperature_C;outsideTemperature_C;UV_candela;ozone_ppm;height;rwoffon;rwmanual
+(sensor_schema.py version 2)
 
 (nvm no gyro)
 
@@ -29,125 +41,173 @@ GCP_PROJECT_ID = os.getenv('projectID')
 SERIVCE_ACCOUNT_ID = os.getenv('SERVICE_ACCOUNT_FILE')
 STORAGE_BUCKET_NAME = os.getenv('storageBucket')
 DATABASE_URL = os.getenv('databaseURL')
-
-# default_app = firebase_admin.initialize_app()
-cred = credentials.Certificate("credentials.json")
-firebase_admin.initialize_app(cred, {"databaseURL": DATABASE_URL})
-
-ref = db.reference("/")
-# print(ref.get())
+SPOOL_FILE = os.getenv('SPOOL_FILE', 'spool.sqlite3')  # empty to upload directly to Firebase
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))  # /metrics on localhost, 0 to disable
 
 SERIAL_PORT = 'COM3'  # COM3 if Windows, /dev/ttyUSB0 if Linux
 BAUD_RATE = 38400
 START_BYTE = ngham.START_BYTE
 
+_log = logging.getLogger("gs")
 
-def read_exactly(ser, n):
-    """Read exactly n bytes from serial."""
-    data = b""
-    while len(data) < n:
-        chunk = ser.read(n - len(data))  # Read missing bytes
-        if not chunk:
-            return None  # Handle errors (timeout, disconnection)
-        data += chunk
-    return list(data)
-
-
-try:
-    ser = serial.Serial(port=SERIAL_PORT, baudrate=BAUD_RATE)
-except serial.SerialException as e:
-    print(f"Error opening serial port {SERIAL_PORT}: {e}")
-    exit()
-
-print(f"Listening on {SERIAL_PORT} at {BAUD_RATE} baud...")
-
-
-def add_to_firebase(data_list):
-    timestamp = int(data_list[0])  # ms
-    pressure = float(data_list[1])  # hPa
-    insideTemp = float(data_list[2])  # degree C
-    outsideTemp = float(data_list[3])  # degree C
-    uv = float(data_list[4])  # candela
-    ozone = float(data_list[5])  # ppm
-    height = float(data_list[6])
-    rwstate = str(data_list[7])
-    rwmanual = str(data_list[8])
-
-    data_entry = {
-        'timestamp': timestamp,
-        'pressure': pressure,
-        'insideTemp': insideTemp,
-        'outsideTemp': outsideTemp,
-        'uv': uv,
-        'ozone': ozone,
-        'height': height,
-        'rwstate': rwstate,
-        'rwmanual': rwmanual,
-    }
-
-    readings_ref = ref.child('sensordata')
-    readings_ref.child(str(timestamp)).set(data_entry)
-    
-    # Gets latest data
-    ref.child('latest').set(data_entry)
-
-
-
-while True:
-    try:
-        data_b = ser.read()
 
-        if not data_b:
-            continue
+def open_writer(spool_file, fake_firebase=False):
+    """Where decoded data is written: the local spool, Firebase or an in-memory fake Firebase"""
+    if fake_firebase:
+        from fake_firebase import FakeDatabase
+        return BatchedFirebaseWriter(FakeDatabase().reference("/")).start()
 
-        byte_value = data_b[0]
+    if spool_file:
+        # Every write goes to the local spool first, `python spool.py drain` uploads it to Firebase
+        return Spool(spool_file)
 
-        if byte_value == START_BYTE:
-            print("Found NGHam-SPP Frame Start")
+    # Firebase writes happen in the background so a slow upload never stalls the serial port.
+    # The app is initialized by the writer thread on its first batch
+    return BatchedFirebaseWriter(LazyFirebaseReference(DATABASE_URL)).start()
 
-            ngham_header = [byte_value]
 
-            header_data = read_exactly(ser, 4)
-            if header_data is None:
-                print("Error: Incomplete NGHam-SPP Header")
-                continue
-
-            ngham_header.extend(header_data)
-
-            _, _, _, pl_len = ngham.decode_ngham_spp_header_only(ngham_header)
+def add_to_firebase(writer, reading, rollups=None):
+    """Writes a telemetry.Reading to sensordata and latest"""
+    data_entry = reading.to_firebase()
+    writer.set(f"sensordata/{reading.timestamp}", data_entry)
+    
+    # Gets latest data
+    writer.set("latest", data_entry)
+
+    if rollups is not None:
+        rollups.add(reading)
+
+
+def write_frame(writer, decoded, reading=None, error=None, verbose=True, rollups=None, receiver=None, copies=1):
+    """
+        Writes a decoded NGHam-SPP frame (the upload stage, see pipeline.decode_frame)
+        receiver and copies are recorded with several receivers
+    """
+    if decoded is None:
+        if error:
+            _log.warning(error)
+        return
+    if receiver is not None:
+        decoded["receiver"] = {"name": receiver, "copies": copies}
+
+    now = datetime.now()
+    current_time = now.strftime("%Y_%m_%d_%H_%M_%S")
+    if verbose:
+        print(current_time)
+
+    writer.set(f"owldata/{current_time}", decoded)
+    
+    if verbose:
+        print("Decoded NGHam-SPP Packet:")
+    # print(json.dumps(decoded, indent=2))
+    if error:
+        _log.warning(error)
+    if reading is not None:
+        if verbose:
+            print(reading)
+        add_to_firebase(writer, reading, rollups)
+
+
+def print_stats(ingest, elapsed):
+    """Summary of an IngestPipeline run, per stage"""
+    stats = ingest.stats()
+    for name, read in stats["read"].items():
+        print(f"{name}: {read['frames']} frames in {elapsed:.2f} s ({read['frames'] / elapsed:,.0f} frames/s), "
+              f"{read['dropped_bytes']} bytes dropped, {read['crc_errors']} CRC errors")
+    if "dedup" in stats:
+        dedup = stats["dedup"]
+        print(f"{dedup['unique']} unique of {dedup['frames']} frames, "
+              f"{dedup['duplicates'] + dedup['late_duplicates']} duplicates dropped")
+    for stage in ("decode", "upload"):
+        stage_stats = stats[stage]
+        wait, service = stage_stats["wait"], stage_stats["service"]
+        print(f"{stage}: {stage_stats['items']} frames, max queue depth {stage_stats['max_queue_depth']}, "
+              f"wait p50/p99 {wait['p50_ms']:.2f}/{wait['p99_ms']:.2f} ms, "
+              f"service p50/p99 {service['p50_ms']:.3f}/{service['p99_ms']:.3f} ms")
+    end_to_end = stats["end_to_end"]
+    print(f"end to end: p50/p99 {end_to_end['p50_ms']:.2f}/{end_to_end['p99_ms']:.2f} ms, "
+          f"max {end_to_end['max_ms']:.2f} ms")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="NGHam-SPP ground station")
+    arg_parser.add_argument("--port", action="append",
+                            help=f"serial port, repeat for several receivers (default {SERIAL_PORT})")
+    arg_parser.add_argument("--baud", type=int, default=BAUD_RATE)
+    arg_parser.add_argument("--record", metavar="FILE", help="record the raw serial stream to a capture file")
+    arg_parser.add_argument("--replay", metavar="FILE", action="append",
+                            help="read from a capture file instead of the serial port, repeat for several receivers")
+    arg_parser.add_argument("--speed", type=float, default=1.0,
+                            help="replay speed relative to the recording, 0 for as fast as possible")
+    arg_parser.add_argument("--spool", default=SPOOL_FILE, help="spool file, empty to upload directly to Firebase")
+    arg_parser.add_argument("--fake-firebase", action="store_true", help="write to an in-memory fake Firebase")
+    arg_parser.add_argument("--quiet", action="store_true", help="do not print every frame")
+    arg_parser.add_argument("--dedup-hold", type=float, default=0.5,
+                            help="seconds to wait for copies of a frame from the other receivers")
+    arg_parser.add_argument("--decode-processes", type=int, default=0,
+                            help="decode in a pool of this many processes, e.g. for a fast replay")
+    arg_parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                            help="serve /metrics and /metrics.json on this local port, 0 to disable")
+    args = arg_parser.parse_args()
+
+    # Warnings like dropped bytes can repeat for every chunk, they are rate limited per message
+    configure_logging()
+
+    receivers = {}
+    if args.replay:
+        for path in args.replay:
+            name = path if path not in receivers else f"{path} ({len(receivers) + 1})"
+            receivers[name] = ReplaySerial(path, args.speed)
+            print(f"Replaying {path} at speed {args.speed or 'max'}...")
+    else:
+        import serial
+
+        for port in args.port or [SERIAL_PORT]:
+            try:
+                receivers[port] = serial.Serial(port=port, baudrate=args.baud)
+            except serial.SerialException as e:
+                print(f"Error opening serial port {port}: {e}")
+                exit()
+            print(f"Listening on {port} at {args.baud} baud...")
+    if args.record and len(receivers) > 1:
+        arg_parser.error("--record needs a single receiver")
+
+    writer = open_writer(args.spool, args.fake_firebase)
+    recorder = CaptureWriter(args.record) if args.record else None
+    rollups = Rollups(writer)
+    verbose = not args.quiet
+    several = len(receivers) > 1
+
+    def upload(receiver, copies, decoded, reading, error):
+        if verbose:
+            print(f"Found NGHam-SPP Frame on {receiver}" + (f" ({copies} copies)" if several else ""))
+        write_frame(writer, decoded, reading, error, verbose, rollups,
+                    receiver if several else None, copies)
+
+    # Serial reader(s) -> decode -> upload, each stage in its own thread with a bounded queue in between
+    ingest = IngestPipeline(receivers, upload, FrameDeduplicator(hold=args.dedup_hold) if several else None,
+                            recorder, args.decode_processes)
+    if args.metrics_port:
+        try:
+            ingest.registry.serve(port=args.metrics_port)
+            print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+        except OSError as e:
+            _log.error("Metrics endpoint not started", extra={"fields": {"port": args.metrics_port, "error": str(e)}})
+
+    start = time.perf_counter()
+    try:
+        ingest.run()
+    finally:
+        rollups.flush()
+        if recorder:
+            recorder.close()
 
-            ngham_payload = read_exactly(ser, pl_len)
-            if ngham_payload is None:
-                print("Error: Incomplete NGHam-SPP Payload")
-                continue
+    print_stats(ingest, time.perf_counter() - start)
 
-            ngham_spp_packet = ngham_header + ngham_payload
-            ngham_spp_packet_decoded = ngham.decode_ngham_spp_packet(ngham_spp_packet)
+    if isinstance(writer, BatchedFirebaseWriter):
+        writer.stop()
+        print(writer.stats())
 
-            now = datetime.now()
-            current_time = now.strftime("%Y_%m_%d_%H_%M_%S")
-            print(current_time)
 
-            readings_ref = ref.child('owldata')
-            readings_ref.child(str(current_time)).set(ngham_spp_packet_decoded)
-            
-            print("Decoded NGHam-SPP Packet:")
-            # print(json.dumps(ngham_spp_packet_decoded, indent=2))
-            # print(json.dumps(ngham_spp_packet_decoded["spp_payload"]["data"], indent=2))
-            # print(type(ngham_spp_packet_decoded["spp_payload"]["data"]))
-            try:
-                if ngham_spp_packet_decoded["spp_payload"]["data"]["ngham_flags"] == "0x0":
-                    sensor_data = ngham_spp_packet_decoded["spp_payload"]["data"]["rx_payloads"].get("sensor_data")
-                    if sensor_data:
-                        print(sensor_data)
-                        add_to_firebase(sensor_data)
-            except:
-                continue        
-
-        else:
-            print("No NGHam-SPP Frame Start")
-            print("Data:", data_b.hex(), end=" ")
-            sys.stdout.flush()
-
-    except KeyboardInterrupt:
-        print("continue")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Metrics and logging of the ground station.
+
+A MetricsRegistry holds counters, gauges and latency histograms (optionally
+with labels) and renders them in the Prometheus text format. serve() makes
+them available on a local HTTP endpoint:
+
+    /metrics       Prometheus text format, for scraping
+    /metrics.json  the same values as JSON, for the dashboard panel
+
+configure_logging() sets up key=value log lines with a rate limit per
+message, for warnings that can repeat for every received byte.
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds of the latency histogram buckets in seconds, the last bucket is everything above
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of durations in seconds, safe to observe from several threads"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, n: int = 1):
+        """Adds n observations of seconds each"""
+        with self._lock:
+            self.counts[bisect_left(self.buckets, seconds)] += n
+            self.count += n
+            self.sum += seconds * n
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (0..100), at most the max"""
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "mean_ms": self.sum / self.count * 1000 if self.count else 0.0,
+                "p50_ms": self.percentile(50) * 1000,
+                "p99_ms": self.percentile(99) * 1000,
+                "max_ms": self.max * 1000,
+            }
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} has labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """[(label values, value)]"""
+        with self._lock:
+            return list(self._values.items())
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, n=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def set(self, total, **labels):
+        """Sets the total of a count kept elsewhere, from a collector"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = total
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+
+    def child(self, **labels) -> LatencyHistogram:
+        """The histogram of one set of labels, to observe without the label lookup"""
+        key = self._key(labels)
+        with self._lock:
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = LatencyHistogram(self.buckets)
+            return histogram
+
+    def observe(self, seconds, n=1, **labels):
+        self.child(**labels).observe(seconds, n)
+
+
+class MetricsRegistry:
+    """
+        Named metrics of one process
+
+        Values that are already counted elsewhere (like the frame parser
+        counters) are read when the metrics are rendered by a collector:
+        a function that sets gauges or counters just before each scrape.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collect):
+        self._collectors.append(collect)
+
+    def _collect(self):
+        for collect in self._collectors:
+            collect()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        self._collect()
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for key, value in sorted(metric.samples()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.type != 'histogram':
+                    lines.append(f"{metric.name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip((*metric.buckets, '+Inf'), value.counts):
+                    cumulative += count
+                    lines.append(f"{metric.name}_bucket{_labels(labels + [('le', bound)])} {cumulative}")
+                lines.append(f"{metric.name}_sum{_labels(labels)} {_number(value.sum)}")
+                lines.append(f"{metric.name}_count{_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """{metric name: [{"labels": {...}, "value": value or histogram snapshot}]}"""
+        self._collect()
+        return {
+            metric.name: [
+                {
+                    "labels": dict(zip(metric.labelnames, key)),
+                    "value": value.snapshot() if metric.type == 'histogram' else value,
+                }
+                for key, value in sorted(metric.samples())
+            ]
+            for metric in self._metrics.values()
+        }
+
+    def serve(self, host="127.0.0.1", port=0):
+        """
+            Serves /metrics and /metrics.json from a background thread
+            Output: the running server, its port is server.server_port
+        """
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        server.daemon_threads = True
+        server.registry = self
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            self._send(self.server.registry.render().encode(), PROMETHEUS_CONTENT_TYPE)
+        elif path == '/metrics.json':
+            self._send(json.dumps(self.server.registry.snapshot()).encode(), 'application/json')
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# Logging
+
+class RateLimitFilter(logging.Filter):
+    """
+        Lets at most burst records of the same message through per interval
+        seconds. The next record after that carries the number of suppressed
+        records in its "suppressed" field.
+    """
+
+    def __init__(self, interval=10.0, burst=5):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._windows = {}  # (logger, message) -> [window start, records let through, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record) -> bool:
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.fields = {**getattr(record, 'fields', {}), "suppressed": suppressed}
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class KeyValueFormatter(logging.Formatter):
+    """time level logger: message key=value ..., from the "fields" dict passed as extra={"fields": {...}}"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record) -> str:
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += " " + " ".join(f"{key}={json.dumps(value) if isinstance(value, str) and ' ' in value else value}"
+                                   for key, value in fields.items())
+        return line
+
+
+def configure_logging(level=logging.INFO, interval=10.0, burst=5):
+    """Key=value log lines on stderr, each message rate limited to burst per interval seconds"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(KeyValueFormatter())
+    handler.addFilter(RateLimitFilter(interval, burst))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
@@ -1,14 +1,141 @@
+import logging
+import re
+import struct
+from collections.abc import Mapping
+from typing import Callable, NamedTuple
+
+from telemetry import RxMetadata
+
+
+_log = logging.getLogger(__name__)
+
 START_BYTE = 0x24
+SPP_HEADER_LEN = 5  # start byte, crc (2), pl_type, pl_len
+SPP_PL_TYPES = (0x00, 0x01, 0x02, 0x03)  # RX, TX, LOCAL, CMD
+
+_START_BYTE_RE = re.compile(re.escape(bytes([START_BYTE])))
+
+
+def _make_crc_ccitt_table() -> tuple:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+# CRC-16-CCITT (reflected, polynomial 0x8408), one entry per byte value
+CRC_CCITT_TABLE = _make_crc_ccitt_table()
+
+
+def _crc_ccitt_update(crc: int, data) -> int:
+    table = CRC_CCITT_TABLE
+    for c in data:
+        crc = (crc >> 8) ^ table[(crc ^ c) & 0xFF]
+    return crc
 
 
-def ngh_ext_decode_callsign(enc_callsign: list) -> dict:
+def crc_ccitt(data) -> int:
+    """
+        CRC-16-CCITT as used by NGHAM (init 0xFFFF, final xor 0xFFFF)
+        Input: data (bytes, memoryview or list of bytes)
+        Output: crc (int)
+    """
+    return _crc_ccitt_update(0xFFFF, data) ^ 0xFFFF
+
+
+def check_ngham_spp_crc(header, payload) -> bool:
+    """
+        Checks the CRC of an NGHAM SPP frame. The CRC covers pl_type, pl_len and payload.
+        Input: header (5 bytes), payload (pl_len bytes)
+        Output: True if the CRC matches
+    """
+    crc = _crc_ccitt_update(0xFFFF, header[3:5])
+    crc = _crc_ccitt_update(crc, payload) ^ 0xFFFF
+    return crc == (header[1] << 8) | header[2]
+
+
+def check_ngham_spp_crc_batch(frames, lengths=None, starts=None):
+    """
+        Checks the CRC of many NGHAM SPP frames at once (requires numpy)
+        Input: frames (2D uint8 array, one zero-padded frame per row, or a list of frames),
+               lengths (frame lengths, defaults to pl_len + header length),
+               starts (offsets of the frames if frames is a single buffer, e.g. a capture)
+        Output: numpy bool array, True where the CRC matches
+    """
+    import numpy as np
+
+    if starts is None:
+        if not isinstance(frames, np.ndarray):
+            frames = list(frames)
+            width = max((len(f) for f in frames), default=SPP_HEADER_LEN)
+            padded = np.zeros((len(frames), width), dtype=np.uint8)
+            for i, frame in enumerate(frames):
+                padded[i, :len(frame)] = np.frombuffer(frame, dtype=np.uint8)
+            frames = padded
+        frames = np.asarray(frames, dtype=np.uint8)
+        buf = frames.reshape(-1)
+        starts = np.arange(len(frames), dtype=np.intp) * frames.shape[1]
+        max_lengths = frames.shape[1]
+    else:
+        buf = np.frombuffer(frames, dtype=np.uint8)
+        starts = np.asarray(starts, dtype=np.intp)
+        max_lengths = len(buf) - starts
+
+    if lengths is None:
+        lengths = buf[starts + 4].astype(np.intp) + SPP_HEADER_LEN
+    lengths = np.minimum(np.asarray(lengths, dtype=np.intp), max_lengths)
+
+    # Longest frames first: the frames that still have a byte in a column are then a prefix of the rows
+    order = np.argsort(-lengths, kind='stable')
+    starts = starts[order]
+    active = np.searchsorted(-lengths[order], -np.arange(int(lengths.max(initial=0))), side='left')
+
+    table = np.array(CRC_CCITT_TABLE, dtype=np.uint16)
+    crc = np.full(len(starts), 0xFFFF, dtype=np.uint16)
+
+    # One vectorized table lookup per byte column
+    for col in range(3, len(active)):
+        n = active[col]
+        head = crc[:n]
+        crc[:n] = (head >> 8) ^ table.take(head.astype(np.uint8) ^ buf[starts[:n] + col])
+    crc ^= 0xFFFF
+
+    received = (buf[starts + 1].astype(np.uint16) << 8) | buf[starts + 2]
+    ok = np.empty(len(starts), dtype=bool)
+    ok[order] = crc == received
+    return ok
+
+
+# Precompiled layouts, all decoders read straight from the frame buffer with unpack_from
+_SPP_HEADER = struct.Struct('>BHBB')        # start_byte, crc, pl_type, pl_len
+_RX_HEADER = struct.Struct('<IBBBB')        # timestamp_toh_us, noise, rssi, errors, ngham_flags
+_TIME_OF_HOUR = struct.Struct('<I')
+_EXT_CALLSIGN = struct.Struct('>BHBHB')     # 2 x 24 bit packed callsign, sequence number
+_EXT_STAT = struct.Struct('<HHBBIBBBBHHHH')
+_EXT_POSITION = struct.Struct('<iiiHHB')
+
+
+def _as_buffer(data):
+    """Lists of bytes are still accepted, everything else is used as a buffer as is"""
+    if isinstance(data, list):
+        return bytes(data)
+    return data
+
+
+def ngh_ext_decode_callsign(enc_callsign, offset: int = 0) -> dict:
     """
         Decode NGHAM spp rx callsign packet
-        Input: callsign packet (list of bytes) containing only the 'Data' section
+        Input: callsign packet (bytes, memoryview or list of bytes) containing only the 'Data' section,
+               offset of the 'Data' section in the buffer
         Output: dictionary with decoded callsign and sequence number
     """
-    # Extract first 6 bytes to decode the callsign
-    temp = (enc_callsign[0] << 16) | (enc_callsign[1] << 8) | enc_callsign[2]
+    high_1, low_1, high_2, low_2, sequence_number = _EXT_CALLSIGN.unpack_from(_as_buffer(enc_callsign), offset)
+
+    # 4 + 3 characters of 6 bits each
+    temp = (high_1 << 16) | low_1
     callsign = [
         (temp >> 18) & 0x3F,
         (temp >> 12) & 0x3F,
@@ -16,7 +143,7 @@ def ngh_ext_decode_callsign(enc_callsign: list) -> dict:
         temp & 0x3F,
     ]
 
-    temp = (enc_callsign[3] << 16) | (enc_callsign[4] << 8) | enc_callsign[5]
+    temp = (high_2 << 16) | low_2
     callsign.extend([
         (temp >> 18) & 0x3F,
         (temp >> 12) & 0x3F,
@@ -31,177 +158,222 @@ def ngh_ext_decode_callsign(enc_callsign: list) -> dict:
     if ssid:
         callsign += f"-{ssid}"
 
-    # Extract sequence number (last byte)
-    sequence_number = enc_callsign[6]  
-
     return {"callsign": callsign, "sequence_number": sequence_number}
 
 
-def ngh_ext_decode_stat(stat: list) -> dict:
+def ngh_ext_decode_stat(stat, offset: int = 0) -> dict:
     """
         Decode NGHAM spp rx stat packet
-        Input: stat packet (list of bytes)
+        Input: stat packet (bytes, memoryview or list of bytes), offset of the packet in the buffer
         Output: decoded stat (dict)
     """
+    (hw_ver_value, serial_number, sw_ver_0, sw_ver_1, uptime_seconds, voltage, temp, signal, noise,
+     cntr_rx_ok, cntr_rx_fix, cntr_rx_err, cntr_tx) = _EXT_STAT.unpack_from(_as_buffer(stat), offset)
+
     # Hardware version 10b company, 6b product
-    hw_ver = stat[0:2]
-    hw_ver_value = (hw_ver[1] << 8) | hw_ver[0]  # little-endian
     company_id = (hw_ver_value >> 6) & 0x3FF
     product_id = hw_ver_value & 0x3F
-    hw_ver_str = f"{company_id}/{product_id}"
-
-    # Serial number
-    serial = stat[2:4]
-    serial_number = (serial[1] << 8) | serial[0]  # little-endian
 
     # Software version 4b major, 4b minor, 8b build
-    sw_ver = stat[4:6]
-    major_version = sw_ver[0] >> 4
-    minor_version = sw_ver[1]
-    build_version = sw_ver[0] & 0x0F
-    sw_version_str = f"{major_version}.{minor_version}.{build_version}"
+    major_version = sw_ver_0 >> 4
+    minor_version = sw_ver_1
+    build_version = sw_ver_0 & 0x0F
 
     # Uptime in seconds since startup
-    uptime_s = stat[6:10]
-    uptime_seconds = uptime_s[0] | (uptime_s[1] << 8) | (uptime_s[2] << 16) | (uptime_s[3] << 24)
     hours, remainder = divmod(uptime_seconds, 3600)
     minutes, seconds = divmod(remainder, 60)
-    uptime_str = f"{hours:02}:{minutes:02}:{seconds:02}"
-
-    voltage = stat[10]
-    voltage = voltage / 10
-
-    temp = stat[11]
-
-    # Signal offset by 200 in dBm
-    signal = stat[12]
-    signal = signal - 200
-
-    # Noise offset by 200 in dBm
-    noise = stat[13]
-    noise = noise - 200
-
-    cntr_rx_ok = int.from_bytes(stat[14:16], byteorder='little')
-    cntr_rx_fix = int.from_bytes(stat[16:18], byteorder='little')
-    cntr_rx_err = int.from_bytes(stat[18:20], byteorder='little')
-    cntr_tx = int.from_bytes(stat[20:22], byteorder='little')
 
     return {
-        "hw_ver": hw_ver_str,
+        "hw_ver": f"{company_id}/{product_id}",
         "serial": serial_number,
-        "sw_ver": sw_version_str,
-        "uptime H:M:S": uptime_str,
-        "voltage V": voltage,
+        "sw_ver": f"{major_version}.{minor_version}.{build_version}",
+        "uptime H:M:S": f"{hours:02}:{minutes:02}:{seconds:02}",
+        "voltage V": voltage / 10,
         "temp C": temp,
-        "signal dBm": signal,
-        "noise dBm": noise,
+        "signal dBm": signal - 200,  # Signal offset by 200 in dBm
+        "noise dBm": noise - 200,  # Noise offset by 200 in dBm
         "cntr_rx_ok": cntr_rx_ok,
         "cntr_rx_fix": cntr_rx_fix,
         "cntr_rx_err": cntr_rx_err,
         "cntr_tx": cntr_tx,
     }
 
-def ngh_ext_decode_position(position: list) -> dict:
+def ngh_ext_decode_position(position, offset: int = 0) -> dict:
     """
         Decode NGHAM spp rx position packet
-        Input: position packet (list of bytes)
+        Input: position packet (bytes, memoryview or list of bytes), offset of the packet in the buffer
         Output: decoded position (dict)
     """
-    lat = position[0:4]
-    lon = position[4:8]
-    alt = position[8:12]
-
-    sog = position[12:14] # hundreds of meters per second
-    sog = sog * 100
-
-    cog = position[14:16] # tenths of degrees
-    cog = cog / 10
-
-    hdop = position[16] # tenths
-    hdop = hdop / 10
+    lat, lon, alt, sog, cog, hdop = _EXT_POSITION.unpack_from(_as_buffer(position), offset)
 
     return {
         "lat": lat,
         "lon": lon,
         "alt": alt,
-        "sog m/s": sog,
-        "cog deg": cog,
-        "hdop deg": hdop
+        "sog m/s": sog * 100,  # hundreds of meters per second
+        "cog deg": cog / 10,  # tenths of degrees
+        "hdop deg": hdop / 10  # tenths
     }
 
-def decode_time_of_hour(bytes_array: list) -> str:
+def decode_time_of_hour(bytes_array, offset: int = 0) -> str:
     """
         Decode time of hour in microseconds. Wraps around after one hour.
-        Input: bytes_array (list of bytes)
+        Input: bytes_array (bytes, memoryview or list of bytes), offset of the uint32 in the buffer
         Output: time_of_hour M:S.milliseconds (str) or None if invalid timestamp
     """
-    toh_us = int.from_bytes(bytes_array, byteorder='little')
+    toh_us, = _TIME_OF_HOUR.unpack_from(_as_buffer(bytes_array), offset)
 
     if toh_us == 0xFFFFFFFF:
-        print("Invalid timestamp (0xFFFFFFFF), skipping...")
+        _log.warning("Invalid timestamp (0xFFFFFFFF), skipping...")
         return None
 
-    seconds_in_hour = toh_us // 1_000_000
-    microseconds_in_hour = toh_us % 1_000_000
-    
-    minutes = seconds_in_hour // 60
-    seconds = seconds_in_hour % 60
-    
-    time_of_hour = f"{minutes:02}:{seconds:02}.{microseconds_in_hour:06d}"
+    seconds_in_hour, microseconds_in_hour = divmod(toh_us, 1_000_000)
+    minutes, seconds = divmod(seconds_in_hour, 60)
+
+    return f"{minutes:02}:{seconds:02}.{microseconds_in_hour:06d}"
+
+
+# Extension packet type ids of decode_ngham_spp_packet_rx_payloads
+EXT_DATA = 0
+EXT_CALLSIGN = 1
+EXT_STAT = 2
+EXT_SIMPLE_DIGI = 3
+EXT_POSITION = 4
+EXT_TIME_OF_HOUR = 5
+EXT_DESTINATION = 6
+EXT_COMMAND_REQUEST = 7
+EXT_COMMAND_REPLY = 8
+EXT_REQUEST = 9
+
+
+class RxPayloadType(NamedTuple):
+    """Name and decoder of an RX extension payload type, decode(view, start, end) -> data"""
+    name: str
+    decode: Callable
+
+
+def _raw_payload(view, start: int, end: int) -> list:
+    """Data that is passed through undecoded, as a list of bytes"""
+    return view[start:end].tolist()
+
+
+def _struct_payload(decode):
+    """Adapts an ngh_ext_decode_* function (buffer, offset) to RxPayloadType.decode"""
+    return lambda view, start, end: decode(view, start)
+
+
+# Packet type id -> RxPayloadType, extend with register_rx_payload_type()
+RX_PAYLOAD_TYPES = {
+    EXT_DATA: RxPayloadType("Data", _raw_payload),
+    EXT_CALLSIGN: RxPayloadType("SRC", _struct_payload(ngh_ext_decode_callsign)),
+    EXT_STAT: RxPayloadType("Stat", _struct_payload(ngh_ext_decode_stat)),
+    EXT_SIMPLE_DIGI: RxPayloadType("Simple Digi", _raw_payload),
+    EXT_POSITION: RxPayloadType("Position", _struct_payload(ngh_ext_decode_position)),
+    EXT_TIME_OF_HOUR: RxPayloadType("Time of Hour", _raw_payload),
+    EXT_DESTINATION: RxPayloadType("Destination", _raw_payload),
+    EXT_COMMAND_REQUEST: RxPayloadType("Command Request", _raw_payload),
+    EXT_COMMAND_REPLY: RxPayloadType("Command Reply", _raw_payload),
+    EXT_REQUEST: RxPayloadType("Request", _raw_payload),
+}
+_UNKNOWN_PAYLOAD_TYPE = RxPayloadType("Unknown", _raw_payload)
+
+
+def register_rx_payload_type(packet_type: int, name: str, decode=None):
+    """
+        Adds (or replaces) an RX extension payload type, e.g. for a new SO year
+        Input: packet type id, name used as "type" in the decoded payloads,
+               decode(view, start, end) -> data of the payload in view[start:end], None to pass the bytes through
+    """
+    RX_PAYLOAD_TYPES[packet_type] = RxPayloadType(name, decode or _raw_payload)
+
+
+_NOT_DECODED = object()
+
+
+class RxPayloadView(Mapping):
+    """
+        One RX extension payload as returned by decode_ngham_spp_packet_rx_payloads(lazy=True)
+        Reads like the dict {"type": name, "data": data}, but the data is only
+        decoded when it is first accessed. The view keeps a reference to the
+        frame buffer. dict(view) or to_dict() gives a plain dict, e.g. for JSON.
+    """
+    __slots__ = ("packet_type", "_view", "_start", "_end", "_data")
+
+    def __init__(self, packet_type: int, view, start: int, end: int):
+        self.packet_type = packet_type
+        self._view = view
+        self._start = start
+        self._end = end
+        self._data = _NOT_DECODED
+
+    @property
+    def type(self) -> str:
+        return RX_PAYLOAD_TYPES.get(self.packet_type, _UNKNOWN_PAYLOAD_TYPE).name
+
+    @property
+    def data(self):
+        data = self._data
+        if data is _NOT_DECODED:
+            decode = RX_PAYLOAD_TYPES.get(self.packet_type, _UNKNOWN_PAYLOAD_TYPE).decode
+            data = self._data = decode(self._view, self._start, self._end)
+        return data
 
-    return time_of_hour
+    def __getitem__(self, key):
+        if key == "type":
+            return self.type
+        if key == "data":
+            return self.data
+        raise KeyError(key)
 
+    def __iter__(self):
+        return iter(("type", "data"))
 
-def decode_ngham_spp_packet_rx_payloads(payload: list) -> list:
+    def __len__(self) -> int:
+        return 2
+
+    def __repr__(self) -> str:
+        decoded = "not decoded" if self._data is _NOT_DECODED else repr(self._data)
+        return f"<RxPayloadView {self.type}: {decoded}>"
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, "data": self.data}
+
+
+def decode_ngham_spp_packet_rx_payloads(payload, offset: int = 0, types=None, lazy: bool = False) -> list:
     """
         Decodes NGHAM SPP RX packet payloads
-        Input: spp rx payloads (list of bytes)
-        Output: decoded spp rx payloads (list of dicts)
+        Input: spp rx payloads (bytes, memoryview or list of bytes), offset of the first payload,
+               types: packet type ids (EXT_*) to return, None for all,
+               lazy: return RxPayloadView that decode their data on first access
+        Output: decoded spp rx payloads (list of dicts, or of RxPayloadView if lazy)
     """
+    payload = memoryview(_as_buffer(payload))
+    payload_types = RX_PAYLOAD_TYPES
     decoded_payloads = []
-    i = 0
-    while i < len(payload):
+    i = offset
+    end = len(payload)
+    while i < end:
         packet_type = payload[i]
-        payload_length = payload[i + 1]
-        
-        packet_data = payload[i + 2 : i + 2 + payload_length]
-
-        if packet_type == 0:
-            decoded_payloads.append({"type": "Data", "data": packet_data})
-        elif packet_type == 1:
-            decoded_callsign = ngh_ext_decode_callsign(packet_data)
-            decoded_payloads.append({"type": "SRC", "data": decoded_callsign})
-        elif packet_type == 2:
-            decoded_stat = ngh_ext_decode_stat(packet_data)
-            decoded_payloads.append({"type": "Stat", "data": decoded_stat})
-        elif packet_type == 3:
-            decoded_payloads.append({"type": "Simple Digi", "data": packet_data})
-        elif packet_type == 4:
-            decoded_position = ngh_ext_decode_position(packet_data)
-            decoded_payloads.append({"type": "Position", "data": decoded_position})
-        elif packet_type == 5:
-            decoded_payloads.append({"type": "Time of Hour", "data": packet_data})
-        elif packet_type == 6:
-            decoded_payloads.append({"type": "Destination", "data": packet_data})
-        elif packet_type == 7:
-            decoded_payloads.append({"type": "Command Request", "data": packet_data})
-        elif packet_type == 8:
-            decoded_payloads.append({"type": "Command Reply", "data": packet_data})
-        elif packet_type == 9:
-            decoded_payloads.append({"type": "Request", "data": packet_data})
-        else:
-            decoded_payloads.append({"type": "Unknown", "data": packet_data})
+        data_start = i + 2
+        i = data_end = data_start + payload[i + 1]
 
-        i += 2 + payload_length
+        if types is not None and packet_type not in types:
+            continue
+        if lazy:
+            decoded_payloads.append(RxPayloadView(packet_type, payload, data_start, data_end))
+        else:
+            name, decode = payload_types.get(packet_type, _UNKNOWN_PAYLOAD_TYPE)
+            decoded_payloads.append({"type": name, "data": decode(payload, data_start, data_end)})
     return decoded_payloads
 
-def decode_ngham_spp_packet_rx_sensor_data(payload: list) -> dict:
+def decode_ngham_spp_packet_rx_sensor_data(payload, offset: int = 0) -> dict:
     """
         Decodes NGHAM SPP RX packet sensor data (as defined by SO 2025)
-        Input: spp rx sensor data (list of bytes)
+        Input: spp rx sensor data (bytes, memoryview or list of bytes), offset of the text in the buffer
         Output: decoded spp rx sensor data (dict)
     """
-    payload_txt = ''.join(chr(c) for c in payload)
+    payload = memoryview(_as_buffer(payload))[offset:]
+    payload_txt = str(payload, 'latin-1')
 
     fields = payload_txt.strip().split(';')
 
@@ -219,91 +391,134 @@ def decode_ngham_spp_packet_rx_sensor_data(payload: list) -> dict:
         }
 
 
-def decode_ngham_spp_packet_rx(payload: list) -> dict:
+def decode_ngham_spp_rx_metadata(payload, offset: int = 0) -> RxMetadata:
+    """
+        Decodes the header of an NGHAM SPP RX packet
+        Input: spp payload (bytes, memoryview or list of bytes), offset of the payload in the buffer
+        Output: link metadata (RxMetadata)
+    """
+    # timestamp_toh_us uint32_t, noise, rssi, errors and ngham_flags uint8_t
+    toh_us, noise, rssi, errors, ngham_flags = _RX_HEADER.unpack_from(_as_buffer(payload), offset)
+    return RxMetadata(toh_us, noise - 200, rssi - 200, errors, ngham_flags)
+
+
+def decode_ngham_spp_packet_rx(payload, offset: int = 0, types=None, lazy: bool = False) -> dict:
     """
         Decodes NGHAM SPP RX packet
-        Input: spp payload (list of bytes)
+        Input: spp payload (bytes, memoryview or list of bytes), offset of the payload in the buffer,
+               types and lazy as for decode_ngham_spp_packet_rx_payloads
         Output: decoded spp payload packet (dict)
     """
+    payload = _as_buffer(payload)
+    rx = decode_ngham_spp_rx_metadata(payload, offset)
+
     decoded_packet = {}
+    decoded_packet['timestamp_toh_us'] = decode_time_of_hour(payload, offset)
+    decoded_packet['noise dBm'] = rx.noise_dbm
+    decoded_packet['rssi dBm'] = rx.rssi_dbm
+    decoded_packet['errors'] = rx.errors
+    decoded_packet['ngham_flags'] = hex(rx.ngham_flags)
 
-    # timestamp_toh_us uint32_t 
-    timestamp_toh_us = payload[0:4]
-    decoded_timestamp = decode_time_of_hour(timestamp_toh_us)
-    decoded_packet['timestamp_toh_us'] = decoded_timestamp
+    # payloads
+    if rx.ngham_flags == 0x01:
+        decoded_packet['rx_payloads'] = decode_ngham_spp_packet_rx_payloads(payload, offset + _RX_HEADER.size,
+                                                                            types, lazy)
+    else:
+        decoded_packet['rx_payloads'] = decode_ngham_spp_packet_rx_sensor_data(payload, offset + _RX_HEADER.size)
 
-    # noise uint8_t
-    noise = payload[4]
-    decoded_packet['noise dBm'] = noise - 200
+    return decoded_packet
 
-    # rssi uint8_t
-    rssi = payload[5]
-    decoded_packet['rssi dBm'] = rssi - 200
 
-    # errors uint8_t
-    errors = payload[6]
-    decoded_packet['errors'] = errors
+def decode_ngham_spp_rx_source(frame):
+    """
+        Link metadata and source of an NGHAM SPP RX frame without decoding the rest
+        Input: whole frame (bytes, memoryview or list of bytes)
+        Output: (RxMetadata, callsign or None, sequence_number or None, memoryview of the payloads after the
+                RX header) or None if the frame is not an RX frame
+    """
+    frame = memoryview(_as_buffer(frame))
+    if len(frame) < SPP_HEADER_LEN + _RX_HEADER.size or frame[3] != 0x00:
+        return None
+    rx = decode_ngham_spp_rx_metadata(frame, SPP_HEADER_LEN)
+    body_start = SPP_HEADER_LEN + _RX_HEADER.size
+    body_end = min(len(frame), SPP_HEADER_LEN + frame[4])
 
-    # ngham_flags uint8_t
-    ngham_flags = payload[7]
-    decoded_packet['ngham_flags'] = hex(ngham_flags)
+    callsign = sequence_number = None
+    if rx.ngham_flags == 0x01:
+        offset = _find_ext(frame, body_start, body_end, EXT_CALLSIGN)
+        if offset >= 0 and offset + _EXT_CALLSIGN.size <= body_end:
+            source = ngh_ext_decode_callsign(frame, offset)
+            callsign, sequence_number = source["callsign"], source["sequence_number"]
+    return rx, callsign, sequence_number, frame[body_start:body_end]
 
-    payload = payload[8:]
 
-    # payloads
+def decode_ngham_spp_packet_tx(payload, offset: int = 0, types=None, lazy: bool = False) -> dict:
+    """
+        Decodes NGHAM SPP TX packet (the NGHam flags and the payload to transmit)
+        Input: spp payload (bytes, memoryview or list of bytes), offset of the payload in the buffer,
+               types and lazy as for decode_ngham_spp_packet_rx_payloads
+        Output: decoded spp payload packet (dict)
+    """
+    payload = _as_buffer(payload)
+    ngham_flags = payload[offset]
+
+    decoded_packet = {'ngham_flags': hex(ngham_flags)}
     if ngham_flags == 0x01:
-        decoded_packet['rx_payloads'] = decode_ngham_spp_packet_rx_payloads(payload)
+        decoded_packet['tx_payloads'] = decode_ngham_spp_packet_rx_payloads(payload, offset + 1, types, lazy)
     else:
-        decoded_packet['rx_payloads'] = decode_ngham_spp_packet_rx_sensor_data(payload)
-
+        decoded_packet['tx_payloads'] = decode_ngham_spp_packet_rx_sensor_data(payload, offset + 1)
     return decoded_packet
 
 
-def decode_ngham_spp_packet_tx(payload):
-    # TODO: Implement
-    return
-
-
-def decode_ngham_spp_header_only(header):
+def decode_ngham_spp_header_only(header, payload=None):
     """
         Decodes NGHAM SPP header
-        Input: header (list of bytes)
-        Output: decoded header
+        Input: header (bytes, memoryview or list of bytes), payload (optional) to check the CRC against
+        Output: decoded header or None if the start byte or CRC is invalid
     """
-    start_byte = header[0]
+    start_byte, crc, spp_pl_type, pl_len = _SPP_HEADER.unpack_from(_as_buffer(header))
     if start_byte != START_BYTE:
-        print("Invalid start byte!")
+        _log.warning("Invalid start byte!", extra={"fields": {"start_byte": start_byte}})
+        return None
+    if payload is not None and not check_ngham_spp_crc(header, payload):
+        _log.warning("Invalid CRC!", extra={"fields": {"crc": crc}})
         return None
-    crc = int.from_bytes(header[1:3], byteorder='big') # TODO: Check CRC
-    spp_pl_type = header[3]
-    pl_len = header[4]
 
     return start_byte, crc, spp_pl_type, pl_len
 
 
-def decode_ngham_spp_header(packet: list):
+def decode_ngham_spp_header(packet):
     """
         Decodes NGHAM SPP header including payload separation
-        Input: whole packet (list of bytes)
-        Output: decoded header
+        Input: whole packet (bytes, memoryview or list of bytes)
+        Output: decoded header or None if the header or CRC is invalid.
+                The payload is a memoryview into the packet.
     """
-    header = packet[0:5]
-    start_byte, crc, spp_pl_type, pl_len = decode_ngham_spp_header_only(header)
-    
-    payload = packet[5:5+pl_len]
+    packet = memoryview(_as_buffer(packet))
+    header = packet[0:SPP_HEADER_LEN]
+    payload = packet[SPP_HEADER_LEN:SPP_HEADER_LEN + header[4]]
+
+    decoded_header = decode_ngham_spp_header_only(header, payload)
+    if decoded_header is None:
+        return None
+    start_byte, crc, spp_pl_type, pl_len = decoded_header
 
     return start_byte, crc, spp_pl_type, pl_len, payload
 
 
-def decode_ngham_spp_packet(packet: list) -> dict:
+def decode_ngham_spp_packet(packet, types=None, lazy: bool = False) -> dict:
     """
         Decodes NGHAM SPP packet
-        Input: whole packet (list of bytes)
-        Output: decoded packet (dict)
+        Input: whole packet (bytes, memoryview or list of bytes),
+               types and lazy as for decode_ngham_spp_packet_rx_payloads (RX extension payloads)
+        Output: decoded packet (dict) or None if the header or CRC is invalid
     """
     decoded_packet = {}
     
-    spp_start, spp_crc, spp_pl_type, spp_pl_len, payload = decode_ngham_spp_header(packet)
+    decoded_header = decode_ngham_spp_header(packet)
+    if decoded_header is None:
+        return None
+    spp_start, spp_crc, spp_pl_type, spp_pl_len, payload = decoded_header
 
     decoded_packet["header"] = {
         "start_byte": hex(spp_start),
@@ -313,14 +528,402 @@ def decode_ngham_spp_packet(packet: list) -> dict:
     }
 
     if spp_pl_type == 0x00:
-        decoded_packet["spp_payload"] = {"type": "RX", "data": decode_ngham_spp_packet_rx(payload)}
+        decoded_packet["spp_payload"] = {"type": "RX", "data": decode_ngham_spp_packet_rx(payload, 0, types, lazy)}
     elif spp_pl_type == 0x01:
-        decoded_packet["spp_payload"] = {"type": "TX", "data": payload}
+        decoded_packet["spp_payload"] = {"type": "TX", "data": payload.tolist()}
     elif spp_pl_type == 0x02:
-        decoded_packet["spp_payload"] = {"type": "LOCAL", "data": payload}
+        decoded_packet["spp_payload"] = {"type": "LOCAL", "data": payload.tolist()}
     elif spp_pl_type == 0x03:
-        decoded_packet["spp_payload"] = {"type": "CMD", "data": payload}
+        decoded_packet["spp_payload"] = {"type": "CMD", "data": payload.tolist()}
     else:
-        print("Unknown packet type")
+        _log.warning("Unknown packet type", extra={"fields": {"pl_type": spp_pl_type}})
+
+    return decoded_packet
+
+
+# Encoders, the inverse of the decoders above (for generated traffic, see traffic.py)
+
+def ngh_ext_encode_callsign(callsign: str, sequence_number: int = 0) -> bytes:
+    """
+        Encode NGHAM spp rx callsign packet
+        Input: callsign of up to 7 characters (32..95, e.g. upper case) with an optional -SSID, sequence number
+        Output: 'Data' section of the callsign packet
+    """
+    callsign, _, ssid = callsign.partition('-')
+    chars = [ord(c) - 32 for c in callsign.ljust(7)]
+    if len(chars) > 7 or not all(0 <= c < 64 for c in chars):
+        raise ValueError(f"Callsign {callsign!r} can not be encoded")
+
+    temp_1 = (chars[0] << 18) | (chars[1] << 12) | (chars[2] << 6) | chars[3]
+    temp_2 = (chars[4] << 18) | (chars[5] << 12) | (chars[6] << 6) | (int(ssid) if ssid else 0) & 0x3F
+    return _EXT_CALLSIGN.pack(temp_1 >> 16, temp_1 & 0xFFFF, temp_2 >> 16, temp_2 & 0xFFFF, sequence_number)
+
+
+def ngh_ext_encode_stat(hw_ver=(0, 0), serial=0, sw_ver=(0, 0, 0), uptime_s=0, voltage_v=0.0, temp_c=0,
+                        signal_dbm=-200, noise_dbm=-200, cntr_rx_ok=0, cntr_rx_fix=0, cntr_rx_err=0,
+                        cntr_tx=0) -> bytes:
+    """
+        Encode NGHAM spp rx stat packet
+        Input: hw_ver (company id, product id), sw_ver (major, minor, build), the other fields in the units
+               of ngh_ext_decode_stat
+        Output: stat packet
+    """
+    company_id, product_id = hw_ver
+    major_version, minor_version, build_version = sw_ver
+    return _EXT_STAT.pack((company_id & 0x3FF) << 6 | product_id & 0x3F, serial,
+                          (major_version & 0x0F) << 4 | build_version & 0x0F, minor_version, uptime_s,
+                          round(voltage_v * 10), temp_c, signal_dbm + 200, noise_dbm + 200,
+                          cntr_rx_ok, cntr_rx_fix, cntr_rx_err, cntr_tx)
+
+
+def ngh_ext_encode_position(lat: int, lon: int, alt: int, sog_ms=0.0, cog_deg=0.0, hdop=0.0) -> bytes:
+    """
+        Encode NGHAM spp rx position packet
+        Input: lat, lon and alt as sent, the other fields in the units of ngh_ext_decode_position
+        Output: position packet
+    """
+    return _EXT_POSITION.pack(lat, lon, alt, round(sog_ms / 100), round(cog_deg * 10), round(hdop * 10))
+
+
+def encode_time_of_hour(toh_us=None) -> bytes:
+    """
+        Encode time of hour in microseconds
+        Input: microseconds since the start of the hour, None for an invalid timestamp (0xFFFFFFFF)
+        Output: uint32
+    """
+    return _TIME_OF_HOUR.pack(0xFFFFFFFF if toh_us is None else toh_us % 3_600_000_000)
 
-    return decoded_packet
\ No newline at end of file
+
+def encode_ngham_spp_packet_rx_payloads(payloads) -> bytes:
+    """
+        Encodes NGHAM SPP RX packet payloads
+        Input: iterable of (packet type, data bytes)
+        Output: the payloads, each with its type and length
+    """
+    parts = []
+    for packet_type, data in payloads:
+        if len(data) > 0xFF:
+            raise ValueError(f"Payload of type {packet_type} is {len(data)} bytes, at most 255 fit")
+        parts.append(bytes((packet_type, len(data))))
+        parts.append(bytes(data))
+    return b"".join(parts)
+
+
+def encode_ngham_spp_packet_rx_sensor_data(msg: str, sensor_data=()) -> bytes:
+    """
+        Encodes NGHAM SPP RX packet sensor data (as defined by SO 2025)
+        Input: msg (the callsign), sensor data fields
+        Output: the ';' separated line
+    """
+    return ';'.join([msg, *map(str, sensor_data)]).encode('latin-1')
+
+
+def _encode_body(body):
+    """NGHam flags and bytes of a packet body: extension payloads (flag 0x01) or a sensor data line"""
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return 0x00, bytes(body)
+    return 0x01, encode_ngham_spp_packet_rx_payloads(body)
+
+
+def encode_ngham_spp_packet_rx(body, toh_us=None, noise_dbm=-120, rssi_dbm=-80, errors=0) -> bytes:
+    """
+        Encodes NGHAM SPP RX packet
+        Input: body, either the sensor data line (bytes) or a list of (packet type, data) extension payloads,
+               and the link metadata in the units of decode_ngham_spp_rx_metadata
+        Output: spp payload
+    """
+    ngham_flags, body = _encode_body(body)
+    return _RX_HEADER.pack(0xFFFFFFFF if toh_us is None else toh_us % 3_600_000_000,
+                           noise_dbm + 200, rssi_dbm + 200, errors, ngham_flags) + body
+
+
+def encode_ngham_spp_packet_tx(body) -> bytes:
+    """
+        Encodes NGHAM SPP TX packet
+        Input: body, as for encode_ngham_spp_packet_rx
+        Output: spp payload
+    """
+    ngham_flags, body = _encode_body(body)
+    return bytes((ngham_flags,)) + body
+
+
+def encode_ngham_spp_packet(pl_type: int, payload) -> bytes:
+    """
+        Encodes NGHAM SPP packet
+        Input: pl_type (0x00 RX, 0x01 TX, 0x02 LOCAL, 0x03 CMD), spp payload of at most 255 bytes
+        Output: whole packet (header + payload)
+    """
+    if len(payload) > 0xFF:
+        raise ValueError(f"SPP payload is {len(payload)} bytes, at most 255 fit")
+    crc = crc_ccitt(bytes((pl_type, len(payload))) + payload)
+    return _SPP_HEADER.pack(START_BYTE, crc, pl_type, len(payload)) + payload
+
+
+class NGHamSPPFrameParser:
+    """
+        Incremental NGHAM SPP frame parser
+        Feed it chunks of any size as they arrive from the serial port and it
+        yields every complete frame found so far. Bytes that can not be part of
+        a frame are dropped (and counted) and the parser resynchronizes on the
+        next start byte. Frames with a bad CRC are treated the same way, so a
+        start byte inside line noise can not swallow the next real frame.
+    """
+
+    def __init__(self, check_crc=True):
+        self.check_crc = check_crc
+        self._pending = b""
+        self.frames = 0
+        self.dropped_bytes = 0
+        self.resyncs = 0
+        self.crc_errors = 0
+
+    def feed(self, chunk):
+        """
+            Feeds a chunk of received bytes to the parser
+            Input: chunk (bytes, bytearray or memoryview)
+            Output: generator of complete frames (memoryview of header + payload)
+            Frames are views into the chunk, so they are only valid as long as
+            the caller does not modify the chunk. Consume the generator fully
+            before feeding the next chunk.
+        """
+        if self._pending:
+            data = self._pending + chunk
+        else:
+            data = chunk
+        view = memoryview(data)
+
+        for start, end in self._scan(data, view):
+            yield view[start:end]
+
+    def _scan(self, data, view, pos=0):
+        """
+            Yields (start, end) offsets of the complete frames in data from pos on
+            and keeps the unparsed tail for the next call
+        """
+        end = len(view)
+
+        while pos < end:
+            match = _START_BYTE_RE.search(data, pos)
+            if match is None:
+                self._drop(end - pos)
+                pos = end
+                break
+
+            start = match.start()
+            if start > pos:
+                self._drop(start - pos)
+
+            if end - start < SPP_HEADER_LEN:
+                pos = start
+                break
+
+            if view[start + 3] not in SPP_PL_TYPES:
+                # Not a real frame start, skip it and search again
+                self._drop(1)
+                pos = start + 1
+                continue
+
+            frame_end = start + SPP_HEADER_LEN + view[start + 4]
+            if frame_end > end:
+                pos = start
+                break
+
+            if self.check_crc and not check_ngham_spp_crc(view[start:start + SPP_HEADER_LEN],
+                                                          view[start + SPP_HEADER_LEN:frame_end]):
+                self.crc_errors += 1
+                self._drop(1)
+                pos = start + 1
+                continue
+
+            self.frames += 1
+            yield start, frame_end
+            pos = frame_end
+
+        self._pending = bytes(view[pos:])
+
+    def _drop(self, n):
+        self.dropped_bytes += n
+        self.resyncs += 1
+
+
+def index_ngham_spp_frames(capture, check_crc=True) -> list:
+    """
+        Finds all NGHAM SPP frames in a raw capture
+        Input: capture (bytes or memoryview)
+        Output: list of (start, end) offsets of every frame in the capture
+        With numpy the CRCs are checked in batches (check_ngham_spp_crc_batch),
+        the frames found are the same as with NGHamSPPFrameParser.
+    """
+    if check_crc:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            return _index_ngham_spp_frames_batch(capture)
+    parser = NGHamSPPFrameParser(check_crc)
+    return list(parser._scan(capture, memoryview(capture)))
+
+
+def _index_ngham_spp_frames_batch(capture) -> list:
+    """
+        index_ngham_spp_frames with batched CRC checks
+        The capture is scanned for frames without checking the CRC first. The
+        parser resyncs one byte after the start of a frame with a bad CRC, so
+        each round scans again from there, until it reaches a frame that was
+        already found (from there on both scans are the same), and checks the
+        CRCs of the new frames in one batch. Then the frames are picked the way
+        the parser does.
+    """
+    import numpy as np
+
+    view = memoryview(capture)
+    scanner = NGHamSPPFrameParser(check_crc=False)
+    ends = {}  # start -> end of every frame found without checking the CRC
+    following = {}  # scan position -> start of the next frame from there, None at the end of the capture
+    crc_ok = {}
+
+    def scan(pos):
+        new = []
+        for start, end in scanner._scan(capture, view, pos):
+            following[pos] = start
+            if start in ends:
+                return new
+            ends[start] = end
+            new.append(start)
+            pos = end
+        following[pos] = None
+        return new
+
+    resyncs = [0]
+    while resyncs:
+        starts = [start for pos in resyncs for start in scan(pos)]
+        if not starts:
+            break
+        offsets = np.array(starts, dtype=np.intp)
+        lengths = np.array([ends[start] for start in starts], dtype=np.intp) - offsets
+        crc_ok.update(zip(starts, check_ngham_spp_crc_batch(capture, lengths, offsets).tolist()))
+        resyncs = [start + 1 for start in starts if not crc_ok[start] and start + 1 not in following]
+
+    frames = []
+    start = following[0]
+    while start is not None:
+        if crc_ok[start]:
+            frames.append((start, ends[start]))
+            start = following[ends[start]]
+        else:
+            start = following[start + 1]
+    return frames
+
+
+# Column layouts of decode_ngham_spp_capture
+SPP_RX_COLUMNS_DTYPE = [
+    ('offset', '<i8'),  # offset of the frame in the capture
+    ('timestamp_toh_us', '<u4'),  # 0xFFFFFFFF if invalid
+    ('noise_dbm', '<i2'),
+    ('rssi_dbm', '<i2'),
+    ('errors', 'u1'),
+    ('ngham_flags', 'u1'),
+]
+SPP_STAT_COLUMNS_DTYPE = [
+    ('frame', '<i8'),  # row in the rx columns
+    ('company_id', '<u2'),
+    ('product_id', 'u1'),
+    ('serial', '<u2'),
+    ('sw_major', 'u1'),
+    ('sw_minor', 'u1'),
+    ('sw_build', 'u1'),
+    ('uptime_s', '<u4'),
+    ('voltage_v', '<f4'),
+    ('temp_c', '<i2'),
+    ('signal_dbm', '<i2'),
+    ('noise_dbm', '<i2'),
+    ('cntr_rx_ok', '<u2'),
+    ('cntr_rx_fix', '<u2'),
+    ('cntr_rx_err', '<u2'),
+    ('cntr_tx', '<u2'),
+]
+
+# Wire layouts of the RX header and the Stat extension, same as _RX_HEADER and _EXT_STAT
+_RX_HEADER_DTYPE = [('toh', '<u4'), ('noise', 'u1'), ('rssi', 'u1'), ('errors', 'u1'), ('ngham_flags', 'u1')]
+_EXT_STAT_DTYPE = [
+    ('hw_ver', '<u2'), ('serial', '<u2'), ('sw_ver_0', 'u1'), ('sw_ver_1', 'u1'), ('uptime', '<u4'),
+    ('voltage', 'u1'), ('temp', 'u1'), ('signal', 'u1'), ('noise', 'u1'),
+    ('cntr_rx_ok', '<u2'), ('cntr_rx_fix', '<u2'), ('cntr_rx_err', '<u2'), ('cntr_tx', '<u2'),
+]
+
+
+def _find_ext(view, start: int, end: int, packet_type: int) -> int:
+    """Returns the offset of the data of the first extension of packet_type, or -1"""
+    i = start
+    while i + 2 <= end:
+        payload_length = view[i + 1]
+        if view[i] == packet_type and i + 2 + payload_length <= end:
+            return i + 2
+        i += 2 + payload_length
+    return -1
+
+
+def decode_ngham_spp_capture(capture) -> dict:
+    """
+        Decodes all SPP RX frames of a raw capture into columns (requires numpy)
+        Input: capture (bytes or memoryview), e.g. a recorded serial stream
+        Output: {"rx": structured array (SPP_RX_COLUMNS_DTYPE), one row per RX frame,
+                 "stat": structured array (SPP_STAT_COLUMNS_DTYPE), one row per RX frame with a Stat extension}
+    """
+    import numpy as np
+
+    view = memoryview(capture)
+    buf = np.frombuffer(capture, dtype=np.uint8)
+
+    # Frame boundaries first, then every fixed-layout field in one gather per layout
+    spans = np.array(index_ngham_spp_frames(capture), dtype=np.int64).reshape(-1, 2)
+    starts = spans[:, 0]
+    pl_types = buf[starts + 3]
+    pl_lens = buf[starts + 4]
+    is_rx = (pl_types == 0x00) & (pl_lens >= _RX_HEADER.size)
+    rx_starts = starts[is_rx]
+    rx_payloads = rx_starts + SPP_HEADER_LEN
+
+    header = buf[rx_payloads[:, None] + np.arange(_RX_HEADER.size)]
+    header = np.ascontiguousarray(header).view(np.dtype(_RX_HEADER_DTYPE)).reshape(-1)
+
+    rx = np.empty(len(rx_starts), dtype=SPP_RX_COLUMNS_DTYPE)
+    rx['offset'] = rx_starts
+    rx['timestamp_toh_us'] = header['toh']
+    rx['noise_dbm'] = header['noise'].astype(np.int16) - 200
+    rx['rssi_dbm'] = header['rssi'].astype(np.int16) - 200
+    rx['errors'] = header['errors']
+    rx['ngham_flags'] = header['ngham_flags']
+
+    # Extension lists have no fixed layout, so only the Stat offsets are found per frame
+    stat_frames = []
+    stat_offsets = []
+    rx_ends = spans[is_rx, 1]
+    for frame in np.flatnonzero(rx['ngham_flags'] == 0x01):
+        offset = _find_ext(view, int(rx_payloads[frame]) + _RX_HEADER.size, int(rx_ends[frame]), EXT_STAT)
+        if offset >= 0 and offset + _EXT_STAT.size <= rx_ends[frame]:
+            stat_frames.append(frame)
+            stat_offsets.append(offset)
+
+    stat_offsets = np.array(stat_offsets, dtype=np.int64)
+    raw = buf[stat_offsets[:, None] + np.arange(_EXT_STAT.size)]
+    raw = np.ascontiguousarray(raw).view(np.dtype(_EXT_STAT_DTYPE)).reshape(-1)
+
+    stat = np.empty(len(stat_offsets), dtype=SPP_STAT_COLUMNS_DTYPE)
+    stat['frame'] = stat_frames
+    stat['company_id'] = (raw['hw_ver'] >> 6) & 0x3FF
+    stat['product_id'] = raw['hw_ver'] & 0x3F
+    stat['serial'] = raw['serial']
+    stat['sw_major'] = raw['sw_ver_0'] >> 4
+    stat['sw_minor'] = raw['sw_ver_1']
+    stat['sw_build'] = raw['sw_ver_0'] & 0x0F
+    stat['uptime_s'] = raw['uptime']
+    stat['voltage_v'] = raw['voltage'] / 10
+    stat['temp_c'] = raw['temp']
+    stat['signal_dbm'] = raw['signal'].astype(np.int16) - 200
+    stat['noise_dbm'] = raw['noise'].astype(np.int16) - 200
+    for name in ('cntr_rx_ok', 'cntr_rx_fix', 'cntr_rx_err', 'cntr_tx'):
+        stat[name] = raw[name]
+
+    return {"rx": rx, "stat": stat}
@@ -0,0 +1,321 @@
+"""
+Staged ingest pipeline of the ground station.
+
+    receivers (one ReceiverThread per port) -> frames queue -> decode stage -> decoded queue -> upload stage
+
+The stages run in their own threads and the queues between them are
+bounded, so a stage that falls behind blocks the one before it instead of
+growing memory. The decode stage can hand batches of frames to a process
+pool, for replaying captures as fast as possible. Every stage records how
+long items wait in its input queue and how long it takes to process them,
+so stats() shows which stage saturates during a burst. The same values,
+together with the frame counters and the link quality of the received
+frames, are kept in a metrics.MetricsRegistry for the /metrics endpoint.
+"""
+import logging
+import queue
+import threading
+import time
+
+import ngham
+from metrics import MetricsRegistry
+from receivers import ReceiverThread
+from sensor_schema import parse_sensor_line
+
+_STOP = object()
+
+
+_log = logging.getLogger(__name__)
+
+# Stat extension counters published as link quality
+STAT_COUNTERS = ('cntr_rx_ok', 'cntr_rx_fix', 'cntr_rx_err')
+
+
+class StageStats:
+    """Counters of one stage: items processed, its input queue and the wait and service time histograms"""
+
+    def __init__(self, name, input_queue, wait, service):
+        self.name = name
+        self.input_queue = input_queue
+        self.items = 0
+        self.max_queue_depth = 0
+        self.wait = wait  # arrival (or end of the previous stage) until taken from the queue
+        self.service = service  # processing time per item
+
+    def took(self):
+        depth = self.input_queue.qsize() + 1
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def stats(self) -> dict:
+        return {
+            "items": self.items,
+            "queue_depth": self.input_queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "wait": self.wait.snapshot(),
+            "service": self.service.snapshot(),
+        }
+
+
+def decode_frame(frame):
+    """
+        Decodes one NGHam-SPP frame (the decode stage, also run in worker processes)
+        Output: (decoded packet or None, telemetry.Reading or None, error message or None)
+        A CRC-valid frame that can not be decoded (e.g. a truncated extension)
+        gives (None, None, error) instead of raising, so it can not stop the stage.
+    """
+    try:
+        decoded = ngham.decode_ngham_spp_packet(frame)
+    except Exception as e:
+        return None, None, f"Undecodable frame: {type(e).__name__}: {e}"
+    if decoded is None:
+        return None, None, None
+    try:
+        spp_payload = decoded["spp_payload"]
+        data = spp_payload["data"]
+        # Only RX frames carry sensor data, TX, LOCAL and CMD payloads are lists of bytes
+        if spp_payload["type"] == "RX" and data["ngham_flags"] == "0x0":
+            rx_payloads = data["rx_payloads"]
+            if rx_payloads.get("sensor_data"):
+                # Layout (see sensor_schema.py) is picked by the line's version tag or field count
+                return decoded, parse_sensor_line(rx_payloads["data"]), None
+    except Exception as e:
+        return decoded, None, f"Invalid sensor data: {e}"
+    return decoded, None, None
+
+
+def decode_frames(frames) -> list:
+    """decode_frame of a batch, one call per batch to a worker process"""
+    return [decode_frame(frame) for frame in frames]
+
+
+class IngestPipeline:
+    """
+        Runs receivers through the decode and upload stages
+
+        upload(receiver, copies, decoded, reading, error) is called from the
+        upload thread once per frame, in the order the frames were received.
+        With a FrameDeduplicator (several receivers) only the best copy of a
+        frame is decoded. decode_processes > 0 decodes in a process pool.
+        Metrics are added to registry (a new MetricsRegistry by default).
+    """
+
+    def __init__(self, receivers, upload, dedup=None, recorder=None, decode_processes=0,
+                 max_queue=10000, max_batch=256, registry=None):
+        self.upload = upload
+        self.dedup = dedup
+        self.decode_processes = decode_processes
+        self.max_batch = max_batch
+
+        self._frames = queue.Queue(maxsize=max_queue)
+        self._decoded = queue.Queue(maxsize=max(1, max_queue // max_batch))
+        self.readers = {name: ReceiverThread(name, ser, self._frames, recorder)
+                        for name, ser in receivers.items()}
+
+        self.registry = registry or MetricsRegistry()
+        self._add_metrics(self.registry)
+        self.decode_stats = StageStats("decode", self._frames, self._stage_wait.child(stage="decode"),
+                                       self._stage_service.child(stage="decode"))
+        self.upload_stats = StageStats("upload", self._decoded, self._stage_wait.child(stage="upload"),
+                                       self._stage_service.child(stage="upload"))
+        self.read_to_decoded = self._latency.child(span="read_to_decoded")
+        self.decoded_to_uploaded = self._latency.child(span="decoded_to_uploaded")
+        self.end_to_end = self._latency.child(span="read_to_uploaded")
+
+        self._pool = None
+        self._decode_thread = threading.Thread(target=self._run_decode, name="decode", daemon=True)
+        self._upload_thread = threading.Thread(target=self._run_upload, name="upload", daemon=True)
+
+    def run(self):
+        """Runs until every receiver has run out of data (or KeyboardInterrupt), then drains the stages"""
+        if self.decode_processes:
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(self.decode_processes)
+
+        self._upload_thread.start()
+        self._decode_thread.start()
+        for reader in self.readers.values():
+            reader.start()
+
+        try:
+            while any(reader.is_alive() for reader in self.readers.values()):
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            print("Stopping receivers")
+        finally:
+            for reader in self.readers.values():
+                reader.stop()
+            self._frames.put(_STOP)
+            self._decode_thread.join()
+            self._upload_thread.join()
+            if self._pool is not None:
+                self._pool.shutdown()
+
+    def _add_metrics(self, registry):
+        self._stage_wait = registry.histogram(
+            "gs_stage_wait_seconds", "Time frames wait in the input queue of a stage", ("stage",))
+        self._stage_service = registry.histogram(
+            "gs_stage_service_seconds", "Processing time per frame of a stage", ("stage",))
+        self._latency = registry.histogram(
+            "gs_frame_latency_seconds", "Time from reading a frame off the port to decoded and uploaded", ("span",))
+        self._queue_depth = registry.gauge("gs_queue_depth", "Frames in the input queue of a stage", ("stage",))
+        self._max_queue_depth = registry.gauge(
+            "gs_queue_depth_max", "Most frames seen in the input queue of a stage", ("stage",))
+
+        self._read_bytes = registry.counter("gs_read_bytes_total", "Bytes read from the receiver", ("receiver",))
+        self._read_frames = registry.counter(
+            "gs_read_frames_total", "Frames with a valid header and CRC", ("receiver",))
+        self._dropped_bytes = registry.counter(
+            "gs_dropped_bytes_total", "Bytes that were not part of a frame", ("receiver",))
+        self._resyncs = registry.counter("gs_resyncs_total", "Searches for the next frame start", ("receiver",))
+        self._crc_errors = registry.counter("gs_crc_errors_total", "Frames dropped for a bad CRC", ("receiver",))
+        self._frames_by_type = registry.counter("gs_frames_total", "Frames decoded", ("pl_type",))
+        self._decode_errors = registry.counter(
+            "gs_decode_errors_total", "Frames that failed to decode or held invalid sensor data", ("pl_type",))
+
+        self._rssi = registry.gauge("gs_rssi_dbm", "RSSI of the last RX frame", ("receiver",))
+        self._noise = registry.gauge("gs_noise_dbm", "Noise of the last RX frame", ("receiver",))
+        self._rx_errors = registry.gauge("gs_rx_errors", "Corrected errors of the last RX frame", ("receiver",))
+        self._rx_errors_total = registry.counter(
+            "gs_rx_errors_total", "Corrected errors of all RX frames", ("receiver",))
+        self._stat = registry.gauge(
+            "gs_stat_counter", "Counters of the last Stat extension (cntr_rx_ok/fix/err)", ("receiver", "counter"))
+
+        registry.add_collector(self._collect)
+
+    def _collect(self):
+        for name, reader in self.readers.items():
+            self._read_bytes.set(reader.bytes_read, receiver=name)
+            self._read_frames.set(reader.parser.frames, receiver=name)
+            self._dropped_bytes.set(reader.parser.dropped_bytes, receiver=name)
+            self._resyncs.set(reader.parser.resyncs, receiver=name)
+            self._crc_errors.set(reader.parser.crc_errors, receiver=name)
+        for stage in (self.decode_stats, self.upload_stats):
+            self._queue_depth.set(stage.input_queue.qsize(), stage=stage.name)
+            self._max_queue_depth.set(stage.max_queue_depth, stage=stage.name)
+
+    def _record_link(self, receiver, frame):
+        """Keeps the link quality of every received copy of an RX frame, before de-duplication"""
+        source = ngham.decode_ngham_spp_rx_source(frame)
+        if source is None:
+            return
+        rx = source[0]
+        self._rssi.set(rx.rssi_dbm, receiver=receiver)
+        self._noise.set(rx.noise_dbm, receiver=receiver)
+        self._rx_errors.set(rx.errors, receiver=receiver)
+        self._rx_errors_total.inc(rx.errors, receiver=receiver)
+
+    def _record(self, receiver, frame, decoded, error):
+        """Counts a decoded frame by pl_type and keeps the Stat counters"""
+        pl_type = frame[3]
+        self._frames_by_type.inc(pl_type=pl_type)
+        if decoded is None or error:
+            self._decode_errors.inc(pl_type=pl_type)
+        if decoded is None or pl_type != 0x00:
+            return
+        data = decoded["spp_payload"]["data"]
+        if isinstance(data["rx_payloads"], list):
+            for payload in data["rx_payloads"]:
+                if payload["type"] == "Stat":
+                    for counter in STAT_COUNTERS:
+                        self._stat.set(payload["data"][counter], receiver=receiver, counter=counter)
+
+    def stats(self) -> dict:
+        stats = {
+            "read": {name: {"frames": reader.parser.frames, "dropped_bytes": reader.parser.dropped_bytes,
+                            "crc_errors": reader.parser.crc_errors}
+                     for name, reader in self.readers.items()},
+            "decode": self.decode_stats.stats(),
+            "upload": self.upload_stats.stats(),
+            "read_to_decoded": self.read_to_decoded.snapshot(),
+            "decoded_to_uploaded": self.decoded_to_uploaded.snapshot(),
+            "end_to_end": self.end_to_end.snapshot(),
+        }
+        if self.dedup is not None:
+            stats["dedup"] = self.dedup.stats()
+        return stats
+
+    def _next_frames(self):
+        """Blocks for the next frames to decode, ([(receiver, frame, copies, arrival)], stopped)"""
+        deadline = self.dedup.next_deadline() if self.dedup else None
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            item = self._frames.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+
+        items = []
+        while item is not None:
+            if item is _STOP:
+                break
+            self.decode_stats.took()
+            receiver, frame, arrival = item
+            self.decode_stats.wait.observe(time.monotonic() - arrival)
+            self._record_link(receiver, frame)
+            items.append(item)
+            if len(items) >= self.max_batch:
+                break
+            try:
+                item = self._frames.get_nowait()
+            except queue.Empty:
+                item = None
+
+        if self.dedup is None:
+            return [(receiver, frame, 1, arrival) for receiver, frame, arrival in items], item is _STOP
+        for receiver, frame, arrival in items:
+            self.dedup.offer(receiver, frame, arrival)
+        return self.dedup.flush() if item is _STOP else self.dedup.ready(), item is _STOP
+
+    def _run_decode(self):
+        stopped = False
+        while not stopped:
+            ready, stopped = self._next_frames()
+            if not ready:
+                continue
+            frames = [frame for _, frame, _, _ in ready]
+            if self._pool is not None:
+                # Timed in the upload stage when the result is taken
+                results = self._pool.submit(decode_frames, frames)
+            else:
+                start = time.monotonic()
+                results = decode_frames(frames)
+                self.decode_stats.service.observe((time.monotonic() - start) / len(ready), len(ready))
+            self.decode_stats.items += len(ready)
+            self._decoded.put((ready, results, time.monotonic()))
+        self._decoded.put(_STOP)
+
+    def _run_upload(self):
+        while True:
+            item = self._decoded.get()
+            if item is _STOP:
+                return
+            self.upload_stats.took()
+            ready, results, queued = item
+            if not isinstance(results, list):
+                # A process pool future, the time until it is done counts as decode time
+                try:
+                    results = results.result()
+                except Exception as e:
+                    _log.error("Decode failed", extra={"fields": {"frames": len(ready), "error": str(e)}})
+                    results = [(None, None, f"Decode failed: {e}")] * len(ready)
+                self.decode_stats.service.observe((time.monotonic() - queued) / len(ready), len(ready))
+                queued = time.monotonic()
+            self.upload_stats.wait.observe(time.monotonic() - queued, len(ready))
+
+            for (receiver, frame, copies, arrival), result in zip(ready, results):
+                self.read_to_decoded.observe(queued - arrival)
+                start = time.monotonic()
+                try:
+                    self.upload(receiver, copies, *result)
+                except Exception as e:
+                    _log.error("Upload failed", extra={"fields": {"receiver": receiver, "error": str(e)}})
+                try:
+                    # Metrics of a frame that failed to upload are still counted
+                    self._record(receiver, frame, result[0], result[2])
+                except Exception as e:
+                    _log.error("Frame metrics failed", extra={"fields": {"receiver": receiver, "error": str(e)}})
+                end = time.monotonic()
+                self.upload_stats.service.observe(end - start)
+                self.decoded_to_uploaded.observe(end - queued)
+                self.end_to_end.observe(end - arrival)
+                self.upload_stats.items += 1
@@ -0,0 +1,201 @@
+"""
+Several receivers (serial ports at different sites) feeding one ground station.
+
+Every receiver is read by its own thread, which splits the stream into
+NGHam-SPP frames and puts them on one shared queue (see pipeline.py). The same downlink frame
+heard by several receivers is written only once: RX frames are identified by
+callsign + sequence_number (SRC extension) + a hash of the payloads, and of
+the copies arriving within a short hold time the one with the fewest errors
+and then the best RSSI is passed on. Later copies within the window are
+dropped.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import ngham
+
+_log = logging.getLogger(__name__)
+
+
+class ReceiverThread:
+    """
+        Reads one serial port (or a ReplaySerial) and queues every complete
+        frame as (receiver name, frame bytes, arrival time)
+        The port is closed by the reader thread when it stops, so it is never
+        closed under a read that is still running.
+    """
+
+    def __init__(self, name, ser, frames, recorder=None):
+        self.name = name
+        self.ser = ser
+        self.frames = frames
+        self.recorder = recorder
+        self.parser = ngham.NGHamSPPFrameParser()
+        self.bytes_read = 0
+        self.read_errors = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"receiver-{name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        """Stops reading, a blocking read is cut short with cancel_read() where the port has it"""
+        self._stop.set()
+        cancel_read = getattr(self.ser, 'cancel_read', None)
+        if cancel_read is not None:
+            cancel_read()
+        self._thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def _run(self):
+        try:
+            self._read()
+        finally:
+            self.ser.close()
+
+    def _read(self):
+        while not self._stop.is_set() and not getattr(self.ser, 'eof', False):
+            try:
+                data_b = self.ser.read(self.ser.in_waiting or 1)
+            except Exception as e:
+                if self._stop.is_set():
+                    return
+                # A receiver that goes away must not take the others down with it
+                _log.error("Receiver failed", extra={"fields": {"receiver": self.name, "error": str(e)}})
+                self.read_errors += 1
+                return
+            if not data_b:
+                continue
+            self.bytes_read += len(data_b)
+
+            if self.recorder:
+                self.recorder.write(data_b)
+
+            dropped_bytes = self.parser.dropped_bytes
+
+            for frame in self.parser.feed(data_b):
+                # Copy, the frame is a view into the chunk
+                self.frames.put((self.name, bytes(frame), time.monotonic()))
+
+            if self.parser.dropped_bytes != dropped_bytes:
+                # Rate limited by metrics.configure_logging, line noise can cause this for every chunk
+                _log.warning("No NGHam-SPP Frame Start", extra={"fields": {
+                    "receiver": self.name,
+                    "dropped_bytes": self.parser.dropped_bytes - dropped_bytes,
+                    "total_dropped_bytes": self.parser.dropped_bytes,
+                    "crc_errors": self.parser.crc_errors,
+                }})
+
+
+class FrameDeduplicator:
+    """
+        Keeps the best copy of frames heard by several receivers
+
+        offer() a frame as it arrives, ready() returns the frames whose hold
+        time is over, best copy first. A frame that is not an RX frame is
+        passed on at once. Keys are remembered for window seconds (at most
+        max_keys of them) to drop copies that arrive after the hold time.
+    """
+
+    def __init__(self, hold=0.5, window=30.0, max_keys=10000):
+        self.hold = hold
+        self.window = window
+        self.max_keys = max_keys
+        self._pending = OrderedDict()  # key -> [deadline, rank, receiver, frame, copies, first arrival]
+        self._seen = OrderedDict()  # key -> expiry of keys already passed on
+        self._passed = []
+
+        self.frames = 0
+        self.unique = 0
+        self.duplicates = 0
+        self.late_duplicates = 0
+
+    @staticmethod
+    def frame_key(frame):
+        """(key, rank) of a frame, rank sorts the better copy first. None for frames that are not RX frames"""
+        source = ngham.decode_ngham_spp_rx_source(frame)
+        if source is None:
+            return None
+        rx, callsign, sequence_number, body = source
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        return (callsign, sequence_number, digest), (rx.errors, -rx.rssi_dbm)
+
+    def offer(self, receiver, frame, now=None):
+        """Adds a frame heard by receiver, now is its arrival time"""
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        identity = self.frame_key(frame)
+        if identity is None:
+            self.unique += 1
+            self._passed.append((receiver, frame, 1, now))
+            return
+        key, rank = identity
+
+        self._expire(now)
+        if key in self._seen:
+            self.late_duplicates += 1
+            return
+
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = [now + self.hold, rank, receiver, frame, 1, now]
+            return
+        self.duplicates += 1
+        pending[4] += 1
+        if rank < pending[1]:
+            pending[1:4] = rank, receiver, frame
+
+    def ready(self, now=None) -> list:
+        """Frames to pass on as [(receiver, frame, number of copies heard, first arrival)], oldest first"""
+        now = time.monotonic() if now is None else now
+        passed, self._passed = self._passed, []
+        while self._pending:
+            key, (deadline, _, receiver, frame, copies, arrival) = next(iter(self._pending.items()))
+            if deadline > now:
+                break
+            del self._pending[key]
+            self._remember(key, now)
+            self.unique += 1
+            passed.append((receiver, frame, copies, arrival))
+        return passed
+
+    def flush(self) -> list:
+        """All frames still held, e.g. on shutdown"""
+        return self.ready(float('inf'))
+
+    def next_deadline(self):
+        """When the oldest held frame is due, None if nothing is held"""
+        if self._passed:
+            return 0.0
+        for deadline, *_ in self._pending.values():
+            return deadline
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "unique": self.unique,
+            "duplicates": self.duplicates,
+            "late_duplicates": self.late_duplicates,
+            "held": len(self._pending),
+        }
+
+    def _remember(self, key, now):
+        self._seen[key] = now + self.window
+        while len(self._seen) > self.max_keys:
+            self._seen.popitem(last=False)
+
+    def _expire(self, now):
+        while self._seen:
+            key, expiry = next(iter(self._seen.items()))
+            if expiry > now:
+                break
+            del self._seen[key]
+
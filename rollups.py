@@ -0,0 +1,140 @@
+"""
+Min/max/mean rollups of the sensor readings, computed while ingesting.
+
+For every resolution the readings are summarized per bucket of that length
+and written next to the raw data as
+    rollups/<resolution>/<bucket start ms> = {"count": n, <field>: {"min", "max", "mean", "count"}, ...}
+so the dashboard can read a few hundred buckets for a long period instead of
+every raw reading.
+"""
+import logging
+
+from telemetry import READING_KEYS
+
+_log = logging.getLogger(__name__)
+
+# Bucket lengths in milliseconds, finest first
+ROLLUP_RESOLUTIONS_MS = {
+    '1s': 1000,
+    '10s': 10 * 1000,
+    '1m': 60 * 1000,
+    '10m': 10 * 60 * 1000,
+}
+
+# Reading fields that are summarized, stored under their sensordata keys
+ROLLUP_FIELDS = ('pressure', 'inside_temp', 'outside_temp', 'uv', 'ozone', 'height')
+
+
+class _Bucket:
+    __slots__ = ('start', 'count', 'stats')
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.stats = {}  # field -> [min, max, sum, count]
+
+    def add(self, reading, fields):
+        self.count += 1
+        for field in fields:
+            value = getattr(reading, field)
+            if value is None:
+                continue
+            stat = self.stats.get(field)
+            if stat is None:
+                self.stats[field] = [value, value, value, 1]
+            else:
+                if value < stat[0]:
+                    stat[0] = value
+                if value > stat[1]:
+                    stat[1] = value
+                stat[2] += value
+                stat[3] += 1
+
+    def merge(self, summary, fields):
+        """Adds a stored summary of this bucket, e.g. written before a restart"""
+        bucket_count = summary.get('count') or 0
+        self.count += bucket_count
+        for field in fields:
+            stored = summary.get(READING_KEYS[field])
+            if not stored:
+                continue
+            # Summaries written before the per-field count assumed every reading had the field
+            count = stored.get('count', bucket_count)
+            stat = self.stats.get(field)
+            if stat is None:
+                self.stats[field] = [stored['min'], stored['max'], stored['mean'] * count, count]
+            else:
+                stat[0] = min(stat[0], stored['min'])
+                stat[1] = max(stat[1], stored['max'])
+                stat[2] += stored['mean'] * count
+                stat[3] += count
+
+    def summary(self):
+        summary = {'count': self.count}
+        for field, (low, high, total, count) in self.stats.items():
+            summary[READING_KEYS[field]] = {'min': low, 'max': high, 'mean': total / count, 'count': count}
+        return summary
+
+
+class Rollups:
+    """
+        Keeps one open bucket per resolution and writes it through writer
+        (a Spool or BatchedFirebaseWriter) when a reading falls in a later
+        bucket. Readings older than the open bucket are only counted in
+        late_readings, the raw sensordata still has them.
+        The first bucket of each resolution starts from what is stored for it
+        (writer.get), so after a restart its aggregates are continued instead
+        of overwritten by the readings since the restart.
+    """
+
+    def __init__(self, writer, resolutions=None, fields=ROLLUP_FIELDS, resume=True):
+        self.writer = writer
+        self.resolutions = dict(resolutions or ROLLUP_RESOLUTIONS_MS)
+        self.fields = fields
+        self.resume = resume
+        self._open = {}  # resolution name -> _Bucket
+        self.buckets_written = 0
+        self.buckets_resumed = 0
+        self.late_readings = 0
+
+    def add(self, reading):
+        """Adds a reading (telemetry.Reading)"""
+        timestamp_ms = int(reading.timestamp)
+        for name, length in self.resolutions.items():
+            start = timestamp_ms - timestamp_ms % length
+            bucket = self._open.get(name)
+            if bucket is None or start > bucket.start:
+                if bucket is not None:
+                    self._write(name, bucket)
+                    bucket = self._open[name] = _Bucket(start)
+                else:
+                    bucket = self._open[name] = self._first_bucket(name, start)
+            elif start < bucket.start:
+                self.late_readings += 1
+                continue
+            bucket.add(reading, self.fields)
+
+    def flush(self):
+        """Writes the open buckets, e.g. on shutdown. They are rewritten if more readings arrive"""
+        for name, bucket in self._open.items():
+            self._write(name, bucket)
+
+    def _first_bucket(self, name, start):
+        """Open bucket after a (re)start, with the summary stored by the last run if there is one"""
+        bucket = _Bucket(start)
+        if not self.resume:
+            return bucket
+        try:
+            stored = self.writer.get(f"rollups/{name}/{start}")
+        except Exception as e:
+            _log.warning("Stored rollup bucket not read, it is overwritten", extra={"fields": {
+                "resolution": name, "bucket": start, "error": str(e)}})
+            return bucket
+        if isinstance(stored, dict):
+            bucket.merge(stored, self.fields)
+            self.buckets_resumed += 1
+        return bucket
+
+    def _write(self, name, bucket):
+        self.writer.set(f"rollups/{name}/{bucket.start}", bucket.summary())
+        self.buckets_written += 1
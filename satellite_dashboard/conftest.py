@@ -0,0 +1,7 @@
+# Lets plain pytest run the Django tests, e.g. `python -m pytest groundstation/tests.py`
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'satellite_dashboard.settings')
+django.setup()
@@ -0,0 +1,33 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from groundstation.services.local_store import LocalTelemetryBackend
+from spool import Spool, drain
+
+
+class Command(BaseCommand):
+    help = "Copy the readings of the ground station spool into the local telemetry store"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--spool", default=os.getenv('SPOOL_FILE', 'spool.sqlite3'),
+                            help="spool file, relative paths are relative to the repository root")
+        parser.add_argument("--batch", type=int, default=5000, help="spooled writes per transaction")
+        parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls of the spool")
+        parser.add_argument("--once", action="store_true", help="exit when the spool is copied")
+        parser.add_argument("--from-start", action="store_true", help="copy the whole spool again")
+
+    def handle(self, *args, **options):
+        spool = Spool(settings.REPO_DIR / options["spool"])
+        if options["from_start"]:
+            spool.set_checkpoint(0, name="telemetry")
+
+        # The spool keeps a separate checkpoint for this consumer, the Firebase drain is not affected
+        try:
+            drain(spool, LocalTelemetryBackend(), options["batch"], options["interval"], options["once"],
+                  name="telemetry")
+        except KeyboardInterrupt:
+            self.stdout.write("KeyboardInterrupt")
+        finally:
+            spool.close()
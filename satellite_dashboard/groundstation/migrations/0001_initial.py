@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorReading',
+            fields=[
+                ('timestamp', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('pressure', models.FloatField(null=True)),
+                ('inside_temp', models.FloatField(null=True)),
+                ('outside_temp', models.FloatField(null=True)),
+                ('uv', models.FloatField(null=True)),
+                ('ozone', models.FloatField(null=True)),
+                ('gyro_x', models.FloatField(null=True)),
+                ('gyro_y', models.FloatField(null=True)),
+                ('gyro_z', models.FloatField(null=True)),
+                ('height', models.FloatField(null=True)),
+                ('data', models.JSONField()),
+            ],
+            options={
+                'ordering': ['timestamp'],
+            },
+        ),
+    ]
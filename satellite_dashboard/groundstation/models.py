@@ -1,3 +1,24 @@
 from django.db import models
 
-# Create your models here.
+
+class SensorReading(models.Model):
+    """One sensordata entry of the local telemetry store, see services/local_store.py"""
+    # Key of the entry in sensordata, the reading's timestamp in ms
+    timestamp = models.BigIntegerField(primary_key=True)
+    pressure = models.FloatField(null=True)
+    inside_temp = models.FloatField(null=True)
+    outside_temp = models.FloatField(null=True)
+    uv = models.FloatField(null=True)
+    ozone = models.FloatField(null=True)
+    gyro_x = models.FloatField(null=True)
+    gyro_y = models.FloatField(null=True)
+    gyro_z = models.FloatField(null=True)
+    height = models.FloatField(null=True)
+    # The whole entry as written by the ingest script, including fields without a column
+    data = models.JSONField()
+
+    class Meta:
+        ordering = ['timestamp']
+
+    def __str__(self):
+        return f"SensorReading {self.timestamp}"
@@ -0,0 +1,86 @@
+def lttb_indices(x, series, points):
+    """
+    Pick `points` indices with Largest-Triangle-Three-Buckets over several series at once
+
+    All series share the x axis (the chart labels), so one set of indices is
+    chosen for all of them: in every bucket the point that forms the largest
+    triangle summed over the normalized series is kept.
+
+    Args:
+        x (numpy.ndarray): x values, ascending
+        series (numpy.ndarray): y values, one row per series, NaN where missing
+        points (int): Number of points to keep, at least 3
+
+    Returns:
+        numpy.ndarray: Selected indices, ascending, including the first and last point
+    """
+    import numpy as np
+
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    # Normalize every series to 0..1 so they weigh the same, missing values count as flat
+    missing = np.isnan(series)
+    low = np.where(missing, np.inf, series).min(axis=1, keepdims=True)
+    span = np.where(missing, -np.inf, series).max(axis=1, keepdims=True) - low
+    span = np.where(np.isfinite(span) & (span > 0), span, 1)
+    y = np.where(missing, 0, (series - np.where(np.isfinite(low), low, 0)) / span)
+    x = (x - x[0]) / ((x[-1] - x[0]) or 1)
+
+    # Bucket edges of the points between the first and the last one
+    edges = np.floor(np.linspace(1, n - 1, points - 1)).astype(np.intp)
+    edges[-1] = n - 1
+
+    selected = np.empty(points, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], max(edges[bucket + 1], edges[bucket] + 1)
+
+        # Third corner is the average of the next bucket (the last point for the last bucket)
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], max(edges[bucket + 2], edges[bucket + 1] + 1)
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[:, next_start:next_end].mean(axis=1, keepdims=True)
+        else:
+            avg_x = x[-1]
+            avg_y = y[:, -1:]
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[:, start:end] - y[:, a:a + 1])
+            - (x[a] - x[start:end]) * (avg_y - y[:, a:a + 1])
+        ).sum(axis=0)
+        a = start + int(np.argmax(area))
+        selected[bucket + 1] = a
+
+    return selected
+
+
+def downsample_chart_data(data, points):
+    """
+    Reduce chart data in the format of FirebaseService._process_sensor_data to `points` points
+
+    Returns the data unchanged if it already is small enough or numpy is not installed.
+    """
+    timestamps = data['timestamps']
+    if points is None or len(timestamps) <= points:
+        return data
+    try:
+        import numpy as np
+    except ImportError:
+        return data
+
+    columns = [(data, name) for name in data if name not in ('timestamps', 'gyro')]
+    columns += [(data['gyro'], axis) for axis in data['gyro']]
+    series = np.array([[np.nan if v is None else v for v in parent[name]] for parent, name in columns],
+                      dtype=np.float64)
+
+    indices = lttb_indices(np.asarray(timestamps, dtype=np.float64), series, points)
+
+    def pick(values):
+        return [values[i] for i in indices]
+
+    return {name: ({axis: pick(axis_values) for axis, axis_values in values.items()} if name == 'gyro' else pick(values))
+            for name, values in data.items()}
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import time
+import weakref
+from urllib.parse import urlparse, parse_qs
+
+from fake_firebase import key_order
+
+EMULATOR_HOST_ENV_VAR = 'FIREBASE_DATABASE_EMULATOR_HOST'
+
+
+def emulator_config(database_url):
+    """
+    Base URL and namespace of the Realtime Database emulator, following the rules of firebase_admin
+
+    Returns:
+        tuple: (base_url, namespace), or None when database_url is a production database
+    """
+    parsed_url = urlparse(database_url or '')
+    if parsed_url.scheme == 'http':
+        return f'http://{parsed_url.netloc}', parse_qs(parsed_url.query).get('ns', [''])[0]
+    emulator_host = os.getenv(EMULATOR_HOST_ENV_VAR)
+    if emulator_host:
+        return f'http://{emulator_host}', parsed_url.netloc.split('.')[0]
+    return None
+
+
+class AsyncFirebaseClient:
+    """
+    Async client for the Firebase Realtime Database REST API
+
+    Requests share one pooled HTTP/2 connection per event loop (httpx), so
+    concurrent requests from async views are multiplexed instead of each
+    holding a worker for a firebase_admin round-trip.
+    """
+
+    def __init__(self, database_url, credential=None, max_connections=20, timeout=10.0):
+        import httpx  # Optional dependency, only needed by the async views
+
+        self._httpx = httpx
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.timeout = timeout
+        self.credential = credential
+
+        emulator = emulator_config(database_url)
+        if emulator:
+            self.base_url, namespace = emulator
+            self.params = {'ns': namespace}
+        else:
+            self.base_url = database_url.rstrip('/')
+            self.params = {}
+        self.is_emulator = emulator is not None
+
+        self._clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+        self._token = None
+        self._token_expiry = 0.0
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._httpx.AsyncClient(http2=True, limits=self.limits, timeout=self.timeout)
+            self._clients[loop] = client
+        return client
+
+    async def _headers(self):
+        if self.is_emulator or self.credential is None:
+            return {'Authorization': 'Bearer owner'}
+
+        if self._token is None or time.time() > self._token_expiry - 60:
+            # google-auth refreshes tokens with blocking I/O, keep it off the event loop
+            token_info = await asyncio.to_thread(self.credential.get_access_token)
+            self._token = token_info.access_token
+            expiry = token_info.expiry
+            self._token_expiry = expiry.timestamp() if expiry else time.time() + 3600
+        return {'Authorization': f'Bearer {self._token}'}
+
+    async def _request(self, method, path, query=None, value=None):
+        params = dict(self.params)
+        for key, param in (query or {}).items():
+            # Query parameters of the REST API are JSON values
+            params[key] = json.dumps(param)
+
+        url = f"{self.base_url}/{path.strip('/')}.json"
+        kwargs = {'params': params, 'headers': await self._headers()}
+        if value is not None:
+            kwargs['content'] = json.dumps(value)
+        response = await self._client().request(method, url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def get(self, path, order_by=None, start_at=None, limit_to_first=None, limit_to_last=None):
+        """Read the node at path, with the same ordering and limits as db.Reference queries"""
+        query = {}
+        if order_by is not None:
+            query['orderBy'] = order_by
+        if start_at is not None:
+            query['startAt'] = start_at
+        if limit_to_first is not None:
+            query['limitToFirst'] = limit_to_first
+        if limit_to_last is not None:
+            query['limitToLast'] = limit_to_last
+        data = await self._request('GET', path, query)
+
+        # The REST API does not keep the order of a query in the JSON object, restore the key order
+        # of Firebase (32 bit integer keys numerically first), as firebase_admin does
+        if order_by == '$key' and isinstance(data, dict):
+            data = {key: data[key] for key in sorted(data, key=key_order)}
+        return data
+
+    async def get_key_range(self, path, start_key, page_size):
+        """Async version of FirebaseService._get_key_range"""
+        result = {}
+        while True:
+            limit = page_size + 1 if result else page_size
+            page = await self.get(path, order_by='$key', start_at=start_key, limit_to_first=limit) or {}
+
+            new_entries = 0
+            for key, value in page.items():
+                if key not in result:
+                    result[key] = value
+                    new_entries += 1
+
+            if len(page) < limit or new_entries == 0:
+                return result
+            start_key = key
+
+    async def push(self, path, value):
+        """Append value under path with a generated key, returns the key"""
+        return (await self._request('POST', path, value=value))['name']
+
+    async def aclose(self):
+        for client in list(self._clients.values()):
+            await client.aclose()
+        self._clients.clear()
@@ -1,68 +1,483 @@
-from firebase_admin import db, credentials
-import firebase_admin
+import asyncio
 import os
+import threading
+import time
+import weakref
+from collections import deque
+from itertools import islice
+from asgiref.sync import sync_to_async
 from dotenv import load_dotenv
+from rollups import ROLLUP_RESOLUTIONS_MS
+from telemetry import READING_KEYS, Reading
 
-class FirebaseService:
-    def __init__(self):
-        # Load environment variables
-        load_dotenv()
-        
-        # Initialize Firebase connection
-        self.database_url = os.getenv('databaseURL')
-        cred = credentials.Certificate("credentials.json")
-        
-        try:
-            firebase_admin.initialize_app(cred, {"databaseURL": self.database_url})
-        except ValueError:
-            # App already initialized
-            pass
-            
-        self.root_ref = db.reference("/")
+from .downsample import downsample_chart_data
+from .firebase_rest import AsyncFirebaseClient, emulator_config
+
+# Length of the periods of get_sensor_data in milliseconds
+PERIODS_MS = {
+    '24h': 24 * 60 * 60 * 1000,
+    '7d': 7 * 24 * 60 * 60 * 1000,
+    '30d': 30 * 24 * 60 * 60 * 1000,
+}
+
+# Entries per Firebase request when reading long ranges of sensordata
+SENSOR_DATA_PAGE_SIZE = 1000
+
+# Chart series of get_historical_data: Reading field and the value used when a reading lacks it
+CHART_SERIES = {
+    'inside_temperature': ('inside_temp', None),
+    'outside_temperature': ('outside_temp', None),
+    'pressure': ('pressure', None),
+    'uv': ('uv', 0),
+    'ozone': ('ozone', None),
+    'gyro_x': ('gyro_x', None),
+    'gyro_y': ('gyro_y', None),
+    'gyro_z': ('gyro_z', None),
+    'height': ('height', None),
+}
+
+
+def chart_columns(readings):
+    """
+    Chart series of a list of Reading
+    
+    Returns:
+        dict: Series name (CHART_SERIES and 'timestamps') -> list of values
+    """
+    if readings:
+        fields = dict(zip(Reading._fields, map(list, zip(*readings))))
+    else:
+        fields = {field: [] for field in Reading._fields}
+    
+    columns = {'timestamps': fields['timestamp']}
+    for name, (field, default) in CHART_SERIES.items():
+        values = fields[field]
+        columns[name] = values if default is None else [default if v is None else v for v in values]
+    return columns
+
+# get_rollup_data uses the finest rollup that covers the period in at most this many buckets
+ROLLUP_MAX_POINTS = 2000
+
+# Chart series that have rollups
+ROLLUP_SERIES = ('inside_temperature', 'outside_temperature', 'pressure', 'uv', 'ozone', 'height')
+
+
+def pick_rollup(period):
+    """
+    Rollup resolution for a period of get_rollup_data
+    
+    Args:
+        period (str): Period to fetch data for ('24h', '7d', '30d', 'all')
+        
+    Returns:
+        str: Name of the finest resolution with at most ROLLUP_MAX_POINTS buckets
+             in the period, the coarsest one for 'all' and longer periods
+    """
+    period_ms = PERIODS_MS.get(period)
+    if period_ms is not None:
+        for name, length in ROLLUP_RESOLUTIONS_MS.items():
+            if period_ms // length <= ROLLUP_MAX_POINTS:
+                return name
+    return next(reversed(ROLLUP_RESOLUTIONS_MS))
+
+# Historical data cache: points kept, optional max age, and how often Firebase is asked for new points
+HISTORY_MAX_POINTS = 10000
+HISTORY_MAX_AGE_MS = None
+HISTORY_REFRESH_INTERVAL = 5  # seconds
+HISTORY_FULL_REFRESH_INTERVAL = 10 * 60  # seconds, picks up entries written out of order
+
+
+class HistoricalDataCache:
+    """
+    Process-wide cache of the chart columns of sensordata
+    
+    A refresh only fetches the entries after the newest key in the cache and
+    appends them to the columns, so all dashboard viewers share one small
+    upstream read instead of each re-downloading the last `limit` entries.
+    The first fetch is sized by the requested limit; a request for more
+    points than are cached fetches a larger window, up to max_points.
+    """
+    
+    def __init__(self, max_points=HISTORY_MAX_POINTS, max_age_ms=HISTORY_MAX_AGE_MS,
+                 refresh_interval=HISTORY_REFRESH_INTERVAL, full_refresh_interval=HISTORY_FULL_REFRESH_INTERVAL):
+        self.max_points = max_points
+        self.max_age_ms = max_age_ms
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self._lock = threading.Lock()
+        self._async_locks = weakref.WeakKeyDictionary()  # event loop -> asyncio.Lock
+        self.last_key = None
+        self.columns = self._new_columns()
+        self._complete = False  # the columns hold every entry there is (within max_age_ms)
+        self._last_refresh = None
+        self._last_full_refresh = None
+    
+    def _new_columns(self):
+        return {name: deque(maxlen=self.max_points) for name in ('timestamps', *CHART_SERIES)}
+    
+    def get(self, service, limit):
+        """
+        Get the newest `limit` points in the format of FirebaseService._process_sensor_data
+        
+        Args:
+            service (FirebaseService): Service used to read Firebase on a refresh
+            limit (int): Number of points, at most max_points
+        """
+        with self._lock:
+            # Concurrent callers wait here and then use the points the first one fetched
+            now = time.monotonic()
+            sensor_ref = service.root_ref.child('sensordata')
+            fetch_size = self._full_fetch_size(now, limit)
+            if fetch_size is not None:
+                new_data = sensor_ref.order_by_key().limit_to_last(fetch_size).get() or {}
+                self._replace(new_data, fetch_size, now)
+            elif self._refresh_due(now):
+                new_data = service._get_key_range(sensor_ref, self.last_key, SENSOR_DATA_PAGE_SIZE)
+                self._append(new_data, now)
+            return self._chart_data(limit)
+    
+    async def aget(self, service, limit):
+        """Async version of get, reading Firebase through service.rest"""
+        loop = asyncio.get_running_loop()
+        async_lock = self._async_locks.setdefault(loop, asyncio.Lock())
+        async with async_lock:
+            # Concurrent requests on this event loop share one refresh
+            now = time.monotonic()
+            with self._lock:
+                fetch_size = self._full_fetch_size(now, limit)
+                refresh_due = self._refresh_due(now)
+                last_key = self.last_key
+            if fetch_size is not None:
+                new_data = await service.rest.get('sensordata', order_by='$key', limit_to_last=fetch_size)
+                with self._lock:
+                    self._replace(new_data or {}, fetch_size, now)
+            elif refresh_due:
+                new_data = await service.rest.get_key_range('sensordata', last_key, SENSOR_DATA_PAGE_SIZE)
+                with self._lock:
+                    if self.last_key == last_key:
+                        self._append(new_data or {}, now)
+        with self._lock:
+            return self._chart_data(limit)
+    
+    def _full_fetch_size(self, now, limit):
+        """Newest entries to fetch to replace the columns, None if appending the entries after last_key will do"""
+        cached = len(self.columns['timestamps'])
+        if self._last_full_refresh is None or now - self._last_full_refresh >= self.full_refresh_interval:
+            # First fill, or the periodic full refresh (it picks up entries written out of order)
+            return min(max(limit, cached), self.max_points)
+        if limit > cached and not self._complete:
+            # Grow the window, doubling so a run of slowly rising limits does not refetch every time
+            return min(max(limit, 2 * cached), self.max_points)
+        if self.last_key is None and self._refresh_due(now):
+            # sensordata was empty, there is no key to continue from
+            return min(limit, self.max_points)
+        return None
+    
+    def _refresh_due(self, now):
+        return self._last_refresh is None or now - self._last_refresh >= self.refresh_interval
+    
+    def _replace(self, new_data, fetch_size, now):
+        """Swap in the columns of a full fetch of the newest fetch_size entries"""
+        columns = self._new_columns()
+        last_key = self._extend(columns, new_data)
+        self.columns = columns
+        self.last_key = last_key
+        # A short answer means there are no older entries to grow into
+        self._complete = len(new_data) < fetch_size
+        if self._evict_old():
+            self._complete = True
+        self._last_refresh = now
+        self._last_full_refresh = now
+    
+    def _append(self, new_data, now):
+        """Append fetched entries; new_data may start with last_key, which is already cached"""
+        new_data.pop(self.last_key, None)
+        self.last_key = self._extend(self.columns, new_data) or self.last_key
+        self._evict_old()
+        self._last_refresh = now
+    
+    @staticmethod
+    def _extend(columns, new_data):
+        """Append the entries of new_data to columns in key order, returns the newest key (None if there is none)"""
+        sorted_data = sorted(new_data.items(), key=lambda x: int(x[0]))
+        readings = [Reading.from_firebase(entry, int(timestamp_str)) for timestamp_str, entry in sorted_data]
+        # Count eviction is done by the deques
+        for name, values in chart_columns(readings).items():
+            columns[name].extend(values)
+        return sorted_data[-1][0] if sorted_data else None
+    
+    def _evict_old(self):
+        """Drop the points older than max_age_ms, returns whether any were dropped"""
+        timestamps = self.columns['timestamps']
+        if self.max_age_ms is None or not timestamps:
+            return False
+        cutoff = timestamps[-1] - self.max_age_ms
+        evicted = False
+        while timestamps and timestamps[0] < cutoff:
+            for column in self.columns.values():
+                column.popleft()
+            evicted = True
+        return evicted
+    
+    def _chart_data(self, limit):
+        def tail(name):
+            # Walk from the newest end so this costs O(limit) and not O(max_points)
+            points = list(islice(reversed(self.columns[name]), limit))
+            points.reverse()
+            return points
         
+        return {
+            'timestamps': tail('timestamps'),
+            'inside_temperature': tail('inside_temperature'),
+            'outside_temperature': tail('outside_temperature'),
+            'pressure': tail('pressure'),
+            'uv': tail('uv'),
+            'ozone': tail('ozone'),
+            'gyro': {'x': tail('gyro_x'), 'y': tail('gyro_y'), 'z': tail('gyro_z')},
+            'height': tail('height')
+        }
+
+
+# Shared by every FirebaseService in the process
+historical_data_cache = HistoricalDataCache()
+
+# Where sensor data is read from (TELEMETRY_BACKEND): Firebase, or the local telemetry store in the
+# Django database. Any other value is the dotted path of a class with the methods of LocalTelemetryBackend.
+TELEMETRY_BACKENDS = {
+    'firebase': None,
+    'local': 'groundstation.services.local_store.LocalTelemetryBackend',
+}
+
+
+def load_telemetry_backend(name):
+    """Instance of the telemetry backend called name, None for Firebase"""
+    path = TELEMETRY_BACKENDS.get(name, name)
+    if path is None:
+        return None
+    from django.utils.module_loading import import_string
+    return import_string(path)()
+
+class FirebaseService:
+    """
+    Reads sensor data from Firebase (or the telemetry backend) and sends commands
+
+    Creating the service is cheap: views create it at import time, so the
+    environment, credentials.json, firebase_admin and the telemetry backend
+    are only loaded on first use. The lazy setup is thread-safe, sync views
+    run in worker threads.
+    """
+
+    def __init__(self, backend=None, root_ref=None):
+        """
+        Args:
+            backend: Telemetry backend to read from, by default the one named by TELEMETRY_BACKEND
+            root_ref (db.Reference): Root reference to use instead of the Firebase app of the environment,
+                e.g. of a fake_firebase.FakeDatabase. Reads then go to it and TELEMETRY_BACKEND is ignored
+        """
+        self._lock = threading.RLock()
+        self._config = None  # (database_url, credential)
+        self._root_ref = root_ref
+        self._rest = None
+        self._backend = backend
+        self._backend_loaded = backend is not None or root_ref is not None
+
+    def _load_config(self):
+        """Database URL and credential, loaded once"""
+        config = self._config
+        if config is None:
+            with self._lock:
+                if self._config is None:
+                    # Load environment variables
+                    load_dotenv()
+                    database_url = os.getenv('databaseURL')
+                    if emulator_config(database_url):
+                        # The Realtime Database emulator does not need service account credentials
+                        cred = None
+                    else:
+                        from firebase_admin import credentials
+                        cred = credentials.Certificate("credentials.json")
+                    self._config = (database_url, cred)
+                config = self._config
+        return config
+
+    @property
+    def database_url(self):
+        return self._load_config()[0]
+
+    @property
+    def credential(self):
+        return self._load_config()[1]
+
+    @property
+    def root_ref(self):
+        """Root reference of the Firebase app, initialized on first use"""
+        root_ref = self._root_ref
+        if root_ref is None:
+            with self._lock:
+                if self._root_ref is None:
+                    # firebase_admin takes longer to import than the rest of the dashboard
+                    from firebase_admin import db
+                    import firebase_admin
+
+                    database_url, cred = self._load_config()
+                    try:
+                        firebase_admin.initialize_app(cred, {"databaseURL": database_url})
+                    except ValueError:
+                        # App already initialized
+                        pass
+                    self._root_ref = db.reference("/")
+                root_ref = self._root_ref
+        return root_ref
+
+    @property
+    def backend(self):
+        """Telemetry backend the reads go to, None for Firebase. Commands always go to Firebase"""
+        if not self._backend_loaded:
+            with self._lock:
+                if not self._backend_loaded:
+                    self._load_config()
+                    self._backend = load_telemetry_backend(os.getenv('TELEMETRY_BACKEND', 'firebase'))
+                    self._backend_loaded = True
+        return self._backend
+
+    @property
+    def rest(self):
+        """
+        Async REST client used by the async methods, None if httpx is not installed or not under ASGI
+
+        The client pools its connections per event loop. Only the ASGI server (asgi.py) runs one
+        loop for the life of the process; under WSGI every async view gets a new loop, which would
+        leave a new unclosed client behind per request, so the async methods use threads there.
+        """
+        if os.getenv('DASHBOARD_SERVER') != 'asgi':
+            return None
+        if self._rest is None:
+            with self._lock:
+                if self._rest is None:
+                    try:
+                        self._rest = AsyncFirebaseClient(self.database_url, self.credential)
+                    except ImportError:
+                        self._rest = False
+        return self._rest or None
+    
     def get_latest_data(self):
         """Fetch only the latest sensor reading"""
+        if self.backend is not None:
+            return self.backend.latest()
         return self.root_ref.child('latest').get()
-    def get_sensor_data(self, period='24h'):
+
+    def get_sensor_data(self, period='24h', page_size=None):
         """
         Fetch sensor data from Firebase for the specified period
         
         Args:
             period (str): Period to fetch data for ('24h', '7d', '30d', 'all')
+            page_size (int): Entries fetched per request, defaults to SENSOR_DATA_PAGE_SIZE
             
         Returns:
             dict: Dictionary of timestamp-indexed sensor readings
         """
+        if self.backend is not None:
+            return self.backend.sensor_range(self._period_start_key(period))
+        
         # Get reference to the sensordata node
         sensor_ref = self.root_ref.child('sensordata')
         
-        # Get all sensor data (we'll filter by time later if needed)
-        sensor_data = sensor_ref.get()
-        
-        # If period is 'all' or we got no data, return whatever we have
-        if not sensor_data or period == 'all':
-            return sensor_data or {}
+        # Unrecognized periods default to all data
+        period_ms = PERIODS_MS.get(period)
+        if period_ms is None:
+            return self._get_key_range(sensor_ref, None, page_size or SENSOR_DATA_PAGE_SIZE)
         
-        # Filter data based on period
         # Calculate cutoff timestamp
-        import time
+        # Note: This assumes your timestamps are relative to current time, not from takeoff
+        # If they're from takeoff, you'll need to adjust this logic
         current_time_ms = int(time.time() * 1000)
+        cutoff_time_ms = current_time_ms - period_ms
         
-        if period == '24h':
-            cutoff_time_ms = current_time_ms - (24 * 60 * 60 * 1000)  # 24 hours in milliseconds
-        elif period == '7d':
-            cutoff_time_ms = current_time_ms - (7 * 24 * 60 * 60 * 1000)  # 7 days in milliseconds
-        elif period == '30d':
-            cutoff_time_ms = current_time_ms - (30 * 24 * 60 * 60 * 1000)  # 30 days in milliseconds
-        else:
-            return sensor_data  # Default to all data for unrecognized periods
+        # Keys are the timestamps, so Firebase only returns the requested window
+        return self._get_key_range(sensor_ref, str(cutoff_time_ms), page_size or SENSOR_DATA_PAGE_SIZE)
+    
+    def _period_start_key(self, period):
+        """First key (timestamp in ms) of a period, None for all data"""
+        period_ms = PERIODS_MS.get(period)
+        if period_ms is None:
+            return None
+        return str(int(time.time() * 1000) - period_ms)
+    
+    def get_rollup_data(self, period='24h'):
+        """
+        Fetch min/max/mean rollups of the chart series for the specified period
         
-        # Filter data by timestamp
-        # Note: This assumes your timestamps are relative to current time, not from takeoff
-        # If they're from takeoff, you'll need to adjust this logic
-        filtered_data = {ts: data for ts, data in sensor_data.items() if int(ts) >= cutoff_time_ms}
+        Reads the finest rollup with at most ROLLUP_MAX_POINTS buckets in the period
+        (see pick_rollup), so long periods cost at most a few thousand rows instead
+        of every raw reading.
         
-        return filtered_data
+        Args:
+            period (str): Period to fetch data for ('24h', '7d', '30d', 'all')
+            
+        Returns:
+            dict: Resolution, bucket start timestamps, reading counts and min/max/mean per series
+        """
+        resolution = pick_rollup(period)
+        if self.backend is not None:
+            rollup_data = self.backend.rollup_range(ROLLUP_RESOLUTIONS_MS[resolution], self._period_start_key(period))
+            return self._process_rollup_data(resolution, rollup_data)
+        
+        rollup_ref = self.root_ref.child(f'rollups/{resolution}')
+        rollup_data = self._get_key_range(rollup_ref, self._period_start_key(period), SENSOR_DATA_PAGE_SIZE)
+        return self._process_rollup_data(resolution, rollup_data)
+    
+    def _process_rollup_data(self, resolution, rollup_data):
+        """Process rollup buckets into columns, like _process_sensor_data"""
+        result = {
+            'resolution': resolution,
+            'timestamps': [],
+            'count': [],
+        }
+        for name in ROLLUP_SERIES:
+            result[name] = {'min': [], 'max': [], 'mean': []}
+        
+        for timestamp_str, bucket in sorted((rollup_data or {}).items(), key=lambda x: int(x[0])):
+            result['timestamps'].append(int(timestamp_str))
+            result['count'].append(bucket.get('count', 0))
+            for name in ROLLUP_SERIES:
+                stats = bucket.get(READING_KEYS[CHART_SERIES[name][0]]) or {}
+                for stat in ('min', 'max', 'mean'):
+                    result[name][stat].append(stats.get(stat))
+        
+        return result
+    
+    def _get_key_range(self, ref, start_key, page_size):
+        """
+        Fetch all children of ref with key >= start_key, page_size entries per request
+        
+        Args:
+            ref: Firebase reference to read from
+            start_key (str): First key to include, None to start at the first child
+            page_size (int): Entries fetched per request
+            
+        Returns:
+            dict: Dictionary of key-indexed children in key order
+        """
+        result = {}
+        while True:
+            query = ref.order_by_key()
+            if start_key is not None:
+                query = query.start_at(start_key)
+            
+            # Every page after the first starts at the last key we already have
+            limit = page_size + 1 if result else page_size
+            page = query.limit_to_first(limit).get() or {}
+            
+            new_entries = 0
+            for key, value in page.items():
+                if key not in result:
+                    result[key] = value
+                    new_entries += 1
+            
+            if len(page) < limit or new_entries == 0:
+                return result
+            start_key = key
     
     def process_data_for_graphs(data):
         """Helper function to format data for graphing"""
@@ -110,63 +525,50 @@ class FirebaseService:
         
         return result
 
-    def get_historical_data(self, limit=50):
-        """Fetch historical sensor data for graphs"""
+    def get_historical_data(self, limit=50, points=None):
+        """
+        Fetch historical sensor data for graphs
+        
+        Args:
+            limit (int): Number of newest readings to cover
+            points (int): If set, downsample the readings to at most this many points
+        """
+        if self.backend is not None:
+            # Local reads are cheap, the cache would only duplicate them
+            processed_data = self._process_sensor_data(self.backend.sensor_range(limit_to_last=limit))
+            return downsample_chart_data(processed_data, points)
+        
+        if limit <= historical_data_cache.max_points:
+            return downsample_chart_data(historical_data_cache.get(self, limit), points)
+        
         # Get data from 'sensordata' node, limited to the last 'limit' entries
         sensor_data = self.root_ref.child('sensordata').order_by_key().limit_to_last(limit).get()
         
         # Process the data into a format suitable for charts
         processed_data = self._process_sensor_data(sensor_data)
-        return processed_data
+        return downsample_chart_data(processed_data, points)
     
     def _process_sensor_data(self, sensor_data):
         """Process the raw sensor data into a format suitable for charts"""
-        if not sensor_data:
-            return {
-                'timestamps': [],
-                'inside_temperature': [],
-                'outside_temperature': [],
-                'pressure': [],
-                'uv': [],
-                'ozone': [],
-                'gyro': {'x': [], 'y': [], 'z': []},
-                'height': []
-            }
-        
-        # Initialize result dictionary
-        result = {
-            'timestamps': [],
-            'inside_temperature': [],
-            'outside_temperature': [],
-            'pressure': [],
-            'uv': [],
-            'ozone': [],
-            'gyro': {'x': [], 'y': [], 'z': []},
-            'height': []
-        }
-        
         # Sort data by timestamp (which is the key)
-        sorted_data = sorted(sensor_data.items(), key=lambda x: int(x[0]))
+        sorted_data = sorted((sensor_data or {}).items(), key=lambda x: int(x[0]))
+        readings = [Reading.from_firebase(entry, int(timestamp_str)) for timestamp_str, entry in sorted_data]
+        columns = chart_columns(readings)
         
-        # Process each reading
-        for timestamp_str, reading in sorted_data:
-            result['timestamps'].append(int(timestamp_str))
-            result['inside_temperature'].append(reading.get('insideTemp'))
-            result['outside_temperature'].append(reading.get('outsideTemp'))
-            result['pressure'].append(reading.get('pressure'))
-            result['uv'].append(reading.get('uv', 0))
-            result['ozone'].append(reading.get('ozone'))
-            result['gyro']['x'].append(reading.get('gyroX'))
-            result['gyro']['y'].append(reading.get('gyroY'))
-            result['gyro']['z'].append(reading.get('gyroZ'))
-            result['height'].append(reading.get('height'))
-        
-        return result
+        return {
+            'timestamps': columns['timestamps'],
+            'inside_temperature': columns['inside_temperature'],
+            'outside_temperature': columns['outside_temperature'],
+            'pressure': columns['pressure'],
+            'uv': columns['uv'],
+            'ozone': columns['ozone'],
+            'gyro': {'x': columns['gyro_x'], 'y': columns['gyro_y'], 'z': columns['gyro_z']},
+            'height': columns['height']
+        }
     
     def send_command(self, command_type, command_value):
         """Send command to the satellite via Firebase"""
         commands_ref = self.root_ref.child('commands')
-        import time
         timestamp = int(time.time() * 1000)
         
         new_command = {
@@ -178,3 +580,59 @@ class FirebaseService:
         
         commands_ref.push().set(new_command)
         return True
+    
+    async def _read_sync(self, read, *args):
+        """Runs a sync read from an async method, without blocking the event loop"""
+        if self.backend is not None:
+            # The telemetry backend reads through the ORM, which needs the thread Django runs sync code in
+            return await sync_to_async(read, thread_sensitive=True)(*args)
+        # firebase_admin is blocking network I/O, any worker thread will do
+        return await asyncio.to_thread(read, *args)
+
+    async def aget_latest_data(self):
+        """Async version of get_latest_data"""
+        if self.backend is not None or self.rest is None:
+            return await self._read_sync(self.get_latest_data)
+        return await self.rest.get('latest')
+    
+    async def aget_historical_data(self, limit=50, points=None):
+        """Async version of get_historical_data"""
+        if self.backend is not None or self.rest is None:
+            return await self._read_sync(self.get_historical_data, limit, points)
+        if limit <= historical_data_cache.max_points:
+            data = await historical_data_cache.aget(self, limit)
+        else:
+            sensor_data = await self.rest.get('sensordata', order_by='$key', limit_to_last=limit)
+            data = self._process_sensor_data(sensor_data)
+        if points is None or len(data['timestamps']) <= points:
+            return data
+        # Downsampling long series is CPU work, keep it off the event loop
+        return await asyncio.to_thread(downsample_chart_data, data, points)
+    
+    async def aget_dashboard_data(self, limit=50, points=None):
+        """Latest reading and historical data, fetched concurrently"""
+        latest, historical = await asyncio.gather(self.aget_latest_data(),
+                                                  self.aget_historical_data(limit, points))
+        return {'latest': latest, 'historical': historical}
+    
+    async def aget_rollup_data(self, period='24h'):
+        """Async version of get_rollup_data"""
+        if self.backend is not None or self.rest is None:
+            return await self._read_sync(self.get_rollup_data, period)
+        resolution = pick_rollup(period)
+        rollup_data = await self.rest.get_key_range(f'rollups/{resolution}', self._period_start_key(period),
+                                                    SENSOR_DATA_PAGE_SIZE)
+        return self._process_rollup_data(resolution, rollup_data)
+    
+    async def asend_command(self, command_type, command_value):
+        """Async version of send_command"""
+        if self.rest is None:
+            return await asyncio.to_thread(self.send_command, command_type, command_value)
+        new_command = {
+            'type': command_type,
+            'value': command_value,
+            'timestamp': int(time.time() * 1000),
+            'executed': False
+        }
+        await self.rest.push('commands', new_command)
+        return True
@@ -0,0 +1,54 @@
+import os
+
+# /metrics.json of the ground station (gs.py --metrics-port)
+INGEST_METRICS_URL = os.getenv('INGEST_METRICS_URL', 'http://127.0.0.1:9108/metrics.json')
+
+
+class IngestMetricsUnavailable(Exception):
+    """The ground station is not running or its metrics endpoint can not be reached"""
+
+
+async def fetch_ingest_metrics(url=INGEST_METRICS_URL, timeout=2.0):
+    """
+    Fetch the ground station metrics and summarize them for the dashboard panel
+
+    Returns:
+        dict: {'receivers': {name: {...}}, 'frames': {pl_type: n}, 'decode_errors': {pl_type: n},
+               'latency': {span: {'p50_ms', 'p99_ms'}}, 'queues': {stage: depth}}
+    """
+    import httpx  # Optional dependency, only needed by the async views
+
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.get(url)
+            response.raise_for_status()
+            metrics = response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        raise IngestMetricsUnavailable(f'{url}: {e}') from e
+    return summarize_ingest_metrics(metrics)
+
+
+def summarize_ingest_metrics(metrics):
+    """Summary of a /metrics.json snapshot, see fetch_ingest_metrics"""
+    def by_label(name, label):
+        return {sample['labels'][label]: sample['value'] for sample in metrics.get(name, [])}
+
+    receivers = {}
+    for metric, key in (('gs_read_frames_total', 'frames'), ('gs_crc_errors_total', 'crc_errors'),
+                        ('gs_dropped_bytes_total', 'dropped_bytes'), ('gs_rssi_dbm', 'rssi_dbm'),
+                        ('gs_noise_dbm', 'noise_dbm'), ('gs_rx_errors', 'errors')):
+        for receiver, value in by_label(metric, 'receiver').items():
+            receivers.setdefault(receiver, {})[key] = value
+    for sample in metrics.get('gs_stat_counter', []):
+        receivers.setdefault(sample['labels']['receiver'], {})[sample['labels']['counter']] = sample['value']
+
+    return {
+        'receivers': receivers,
+        'frames': by_label('gs_frames_total', 'pl_type'),
+        'decode_errors': by_label('gs_decode_errors_total', 'pl_type'),
+        'latency': {
+            span: {'p50_ms': value['p50_ms'], 'p99_ms': value['p99_ms']}
+            for span, value in by_label('gs_frame_latency_seconds', 'span').items()
+        },
+        'queues': by_label('gs_queue_depth', 'stage'),
+    }
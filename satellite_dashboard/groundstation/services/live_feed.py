@@ -0,0 +1,129 @@
+import asyncio
+import json
+import logging
+import threading
+
+from .response_cache import LATEST_DATA_TTL, response_cache
+
+_log = logging.getLogger(__name__)
+
+
+class LiveFeed:
+    """
+    Fans out new sensor readings to every connected browser
+
+    One Firebase listener on the 'latest' node is shared by all subscribers,
+    so upstream reads do not grow with the number of clients. Each subscriber
+    is an asyncio queue on the event loop of its streaming response.
+
+    The ground station writes readings in batches and 'latest' only gets the
+    newest reading of a batch, so on every change the readings in between are
+    read from sensordata. Listening on sensordata itself would download the
+    whole node on every (re)connect of the listener.
+    """
+
+    def __init__(self, max_queue=100, keepalive=15):
+        self.max_queue = max_queue
+        self.keepalive = keepalive  # seconds between keepalive comments on an idle stream
+        self.latest = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._listener = None
+        self._service = None
+
+    def start(self, service):
+        """Start the shared Firebase listener, once per process. Blocks until the listener is connected"""
+        with self._lock:
+            if self._listener is None:
+                self._service = service
+                self._listener = service.root_ref.child('latest').listen(self._on_event)
+
+    def _on_event(self, event):
+        """Firebase listener callback, runs on the listener thread"""
+        if event.path == '/':
+            if event.event_type == 'put':
+                latest = event.data
+            else:
+                latest = {**(self.latest or {}), **(event.data or {})}
+        else:
+            # A single field of 'latest' changed
+            latest = dict(self.latest or {})
+            latest[event.path.strip('/')] = event.data
+
+        previous = self.latest
+        self.latest = latest
+        if latest:
+            # Polling clients get the new reading without waiting for the cached one to expire
+            response_cache.put(('latest',), latest, LATEST_DATA_TTL)
+            for reading in self._missed_readings(previous, latest):
+                self.publish(reading)
+            self.publish(latest)
+
+    def _missed_readings(self, previous, latest):
+        """Readings written after previous and before latest, oldest first, at most max_queue"""
+        start = (previous or {}).get('timestamp')
+        end = latest.get('timestamp')
+        if start is None or end is None or end <= start + 1:
+            return []
+        with self._lock:
+            if not self._subscribers:
+                return []
+        try:
+            missed = (self._service.root_ref.child('sensordata').order_by_key()
+                      .start_at(str(start + 1)).end_at(str(end - 1)).limit_to_last(self.max_queue).get())
+        except Exception as e:
+            # The charts still get the readings from the next historical refresh
+            _log.warning("Readings between live updates not read: %s", e)
+            return []
+        return [entry for _, entry in sorted((missed or {}).items(), key=lambda item: int(item[0]))]
+
+    def publish(self, reading):
+        """Send a reading to every subscriber, can be called from any thread"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_put_newest, queue, reading)
+            except RuntimeError:
+                # The subscriber's event loop is closed
+                with self._lock:
+                    self._subscribers.discard((loop, queue))
+
+    async def events(self, service):
+        """
+        Server-Sent Events for one client
+
+        Yields the current reading first and then every new one. A slow client
+        only loses its oldest unsent readings, it never blocks the others.
+        """
+        if self._listener is None:
+            # Loading the credentials and connecting the listener are blocking I/O, keep them off the event loop
+            await asyncio.to_thread(self.start, service)
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+
+        try:
+            if self.latest:
+                yield _format_event(self.latest)
+            while True:
+                try:
+                    reading = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield _format_event(reading)
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+
+def _put_newest(queue, reading):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(reading)
+
+
+def _format_event(reading):
+    return f"data: {json.dumps(reading)}\n\n"
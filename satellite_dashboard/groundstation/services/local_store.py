@@ -0,0 +1,109 @@
+from django.db.models import Avg, BigIntegerField, Count, ExpressionWrapper, F, Max, Min
+from django.db.models.functions import Mod
+
+from rollups import ROLLUP_FIELDS
+from telemetry import READING_KEYS, Reading
+
+from ..models import SensorReading
+
+# SensorReading columns, named like the Reading fields
+SENSOR_COLUMNS = ('pressure', 'inside_temp', 'outside_temp', 'uv', 'ozone', 'gyro_x', 'gyro_y', 'gyro_z', 'height')
+
+
+class LocalTelemetryBackend:
+    """
+    Telemetry backend on the Django database (SensorReading)
+
+    Reads return the same shapes as the Firebase nodes they replace, so
+    FirebaseService processes them the same way. Range queries are scans of
+    the timestamp primary key and work without a network connection.
+
+    The store is filled from the ground station spool by
+    `python manage.py ingest_spool`, which replays the spool through update()
+    like `spool.py drain` does to Firebase.
+    """
+
+    def latest(self):
+        """The newest reading, like the 'latest' node"""
+        reading = SensorReading.objects.only('data').order_by('-timestamp').first()
+        return reading.data if reading else None
+
+    def sensor_range(self, start_key=None, limit_to_last=None):
+        """
+        Readings of sensordata in key order
+
+        Args:
+            start_key (str): First timestamp to include, None to start at the first reading
+            limit_to_last (int): Only return the newest readings
+
+        Returns:
+            dict: Dictionary of timestamp-indexed sensor readings
+        """
+        readings = SensorReading.objects.all()
+        if start_key is not None:
+            readings = readings.filter(timestamp__gte=int(start_key))
+        if limit_to_last is not None:
+            rows = list(readings.order_by('-timestamp').values_list('timestamp', 'data')[:limit_to_last])
+            rows.reverse()
+        else:
+            rows = readings.order_by('timestamp').values_list('timestamp', 'data')
+        return {str(timestamp): data for timestamp, data in rows}
+
+    def rollup_range(self, resolution_ms, start_key=None):
+        """
+        Min/max/mean per bucket of resolution_ms, in the format of the rollups/<resolution> nodes
+
+        Args:
+            resolution_ms (int): Bucket length in milliseconds
+            start_key (str): First timestamp to include, None for all readings
+
+        Returns:
+            dict: Dictionary of bucket start-indexed summaries
+        """
+        readings = SensorReading.objects.all()
+        if start_key is not None:
+            readings = readings.filter(timestamp__gte=int(start_key))
+
+        bucket = ExpressionWrapper(F('timestamp') - Mod('timestamp', resolution_ms), output_field=BigIntegerField())
+        aggregates = {'count': Count('timestamp')}
+        for column in ROLLUP_FIELDS:
+            aggregates[f'{column}_min'] = Min(column)
+            aggregates[f'{column}_max'] = Max(column)
+            aggregates[f'{column}_mean'] = Avg(column)
+        rows = readings.order_by().annotate(bucket=bucket).values('bucket').annotate(**aggregates).order_by('bucket')
+
+        result = {}
+        for row in rows:
+            summary = {'count': row['count']}
+            for column in ROLLUP_FIELDS:
+                if row[f'{column}_min'] is not None:
+                    summary[READING_KEYS[column]] = {stat: row[f'{column}_{stat}'] for stat in ('min', 'max', 'mean')}
+            result[str(row['bucket'])] = summary
+        return result
+
+    def update(self, updates):
+        """
+        Store a batch of ground station writes, path -> value like Reference.update()
+
+        Only sensordata entries are stored. 'latest' is the newest reading and
+        rollups are computed by rollup_range, other paths are skipped.
+        """
+        readings = {}
+        for path, value in updates.items():
+            node, _, key = path.partition('/')
+            if node != 'sensordata' or not key or not isinstance(value, dict):
+                continue
+            reading = Reading.from_firebase(value, int(float(key)))
+            readings[reading.timestamp] = SensorReading(
+                timestamp=reading.timestamp,
+                data=value,
+                **{column: getattr(reading, column) for column in SENSOR_COLUMNS},
+            )
+
+        if readings:
+            SensorReading.objects.bulk_create(
+                readings.values(),
+                update_conflicts=True,
+                unique_fields=['timestamp'],
+                update_fields=[*SENSOR_COLUMNS, 'data'],
+            )
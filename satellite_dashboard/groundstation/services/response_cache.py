@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds between polls of /api/latest-data/ by dashboard.html when it can not stream
+LATEST_POLL_INTERVAL = 5.0
+
+# Seconds a response stays fresh, per endpoint. Latest lives as long as a poll interval, so clients
+# polling at that rate share one Firebase read; the live feed puts every new reading in the cache
+LATEST_DATA_TTL = LATEST_POLL_INTERVAL
+HISTORICAL_DATA_TTL = 5.0
+
+
+class CacheEntry:
+    __slots__ = ('value', 'etag', 'expires')
+
+    def __init__(self, value, ttl):
+        self.value = value
+        # Same data, same tag: an unchanged reading keeps its ETag across refreshes
+        encoded = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str).encode()
+        self.etag = hashlib.blake2b(encoded, digest_size=12).hexdigest()
+        self.expires = time.monotonic() + ttl
+
+
+class ResponseCache:
+    """
+    In-process TTL cache of API data, with single-flight loading
+
+    Concurrent requests for a missing or expired key share one call of the
+    loader instead of each going to Firebase. Each entry carries an ETag of
+    its data, so views can answer conditional requests with 304.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> CacheEntry, least recently used first
+        self._loading = {}  # (event loop, key) -> Future of the CacheEntry being loaded
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.not_modified = 0
+
+    async def get(self, key, loader, ttl):
+        """
+        Cached entry of key, loaded with `await loader()` if it is missing or expired
+
+        Returns:
+            CacheEntry: The data (value) and its ETag
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            # Futures can only be shared on one event loop, e.g. not between runserver threads
+            flight = (asyncio.get_running_loop(), key)
+            future = self._loading.get(flight)
+            if future is None:
+                # The load runs in its own task: a request that is cancelled (its client went away)
+                # does not cancel the load for the requests that share it
+                future = self._loading[flight] = asyncio.ensure_future(self._load(flight, loader, ttl))
+                future.add_done_callback(_retrieve_exception)
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        return await asyncio.shield(future)
+
+    async def _load(self, flight, loader, ttl):
+        key = flight[1]
+        try:
+            entry = CacheEntry(await loader(), ttl)
+            self._store(key, entry)
+            return entry
+        finally:
+            with self._lock:
+                self._loading.pop(flight, None)
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, value, ttl):
+        """Stores fresh data for key, e.g. pushed by the live feed, so the next request needs no Firebase read"""
+        self._store(key, CacheEntry(value, ttl))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'not_modified': self.not_modified,
+            }
+
+
+def _retrieve_exception(future):
+    """Marks the exception of a load as retrieved when every waiting request was cancelled"""
+    if not future.cancelled():
+        future.exception()
+
+
+# Shared by every view in the process
+response_cache = ResponseCache()
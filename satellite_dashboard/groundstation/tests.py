@@ -1,3 +1,435 @@
-from django.test import TestCase
+import asyncio
+import os
+import queue
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+import gs
+import ngham
+from capture import CaptureWriter, ReplaySerial
+from fake_firebase import FakeDatabase, FakeFirebaseError
+from firebase_writer import BatchedFirebaseWriter
+from pipeline import IngestPipeline
+from receivers import ReceiverThread
+from sensor_schema import SCHEMA_V2, parse_sensor_line, parse_sensor_lines
+
+from .services.firebase_rest import AsyncFirebaseClient
+from .services.firebase_service import FirebaseService, HistoricalDataCache
+from .services.live_feed import LiveFeed
+from .services.response_cache import ResponseCache
+
+
+# Output of the NGHam-SPP decoder, before the struct decoders, for fixed frames
+RX_DATA = {
+    'errors': 3,
+    'ngham_flags': '0x0',
+    'noise dBm': -64,
+    'rssi dBm': -24,
+    'timestamp_toh_us': '00:01.000000',
+}
+
+GOLDEN_FRAMES = {
+    'sensor data': (
+        '24d1d8003040420f0088b003004c41394f52423b3130343931323b313030303b32333b32343b303b33303b3130303b6f6e3b6f6666',
+        {
+            'header': {'start_byte': '0x24', 'crc': '0xd1d8', 'pl_type': 0, 'pl_len': 48},
+            'spp_payload': {'type': 'RX', 'data': {**RX_DATA, 'rx_payloads': {
+                'type': 'text',
+                'len': 40,
+                'data': 'LA9ORB;104912;1000;23;24;0;30;100;on;off',
+                'msg': 'LA9ORB',
+                'sensor_data': ['104912', '1000', '23', '24', '0', '30', '100', 'on', 'off'],
+            }}},
+        },
+    ),
+    'extensions': (
+        '24cebd003340420f00507803010107b2166fca20000702164200921017038b0e00004a1578500a00000000000300050460e316002a027a7a',
+        {
+            'header': {'start_byte': '0x24', 'crc': '0xcebd', 'pl_type': 0, 'pl_len': 51},
+            'spp_payload': {'type': 'RX', 'data': {
+                **RX_DATA,
+                'ngham_flags': '0x1',
+                'noise dBm': -120,
+                'rssi dBm': -80,
+                'rx_payloads': [
+                    {'type': 'SRC', 'data': {'callsign': 'LA9ORB', 'sequence_number': 7}},
+                    {'type': 'Stat', 'data': {
+                        'hw_ver': '1/2',
+                        'serial': 4242,
+                        'sw_ver': '1.3.7',
+                        'uptime H:M:S': '01:02:03',
+                        'voltage V': 7.4,
+                        'temp C': 21,
+                        'signal dBm': -80,
+                        'noise dBm': -120,
+                        'cntr_rx_ok': 10,
+                        'cntr_rx_fix': 0,
+                        'cntr_rx_err': 0,
+                        'cntr_tx': 3,
+                    }},
+                    {'type': 'Time of Hour', 'data': [96, 227, 22, 0]},
+                    {'type': 'Unknown', 'data': [122, 122]},
+                ],
+            }},
+        },
+    ),
+    'tx': (
+        '247b07010450494e47',
+        {
+            'header': {'start_byte': '0x24', 'crc': '0x7b07', 'pl_type': 1, 'pl_len': 4},
+            'spp_payload': {'type': 'TX', 'data': [80, 73, 78, 71]},
+        },
+    ),
+    'local': (
+        '244ada02020102',
+        {
+            'header': {'start_byte': '0x24', 'crc': '0x4ada', 'pl_type': 2, 'pl_len': 2},
+            'spp_payload': {'type': 'LOCAL', 'data': [1, 2]},
+        },
+    ),
+    'cmd': (
+        '243f080301ff',
+        {
+            'header': {'start_byte': '0x24', 'crc': '0x3f08', 'pl_type': 3, 'pl_len': 1},
+            'spp_payload': {'type': 'CMD', 'data': [255]},
+        },
+    ),
+    # The old decoder crashed on Position, the values are the ones the frame was encoded from
+    'position': (
+        '24b411001b40420f00507803010411a0d04c2940758c09307500000100d2040c',
+        {
+            'header': {'start_byte': '0x24', 'crc': '0xb411', 'pl_type': 0, 'pl_len': 27},
+            'spp_payload': {'type': 'RX', 'data': {
+                **RX_DATA,
+                'ngham_flags': '0x1',
+                'noise dBm': -120,
+                'rssi dBm': -80,
+                'rx_payloads': [
+                    {'type': 'Position', 'data': {
+                        'lat': 692900000,
+                        'lon': 160200000,
+                        'alt': 30000,
+                        'sog m/s': 100,
+                        'cog deg': 123.4,
+                        'hdop deg': 1.2,
+                    }},
+                ],
+            }},
+        },
+    ),
+}
+
+
+class NghamGoldenOutputTests(SimpleTestCase):
+    """The struct decoders give the same output as before, for every kind of input buffer"""
+
+    def test_decode_ngham_spp_packet(self):
+        for name, (frame_hex, expected) in GOLDEN_FRAMES.items():
+            frame = bytes.fromhex(frame_hex)
+            for kind in (list, bytes, bytearray, memoryview):
+                with self.subTest(frame=name, input=kind.__name__):
+                    self.assertEqual(ngham.decode_ngham_spp_packet(kind(frame)), expected)
+
+    def test_frames_pass_crc(self):
+        for name, (frame_hex, _) in GOLDEN_FRAMES.items():
+            with self.subTest(frame=name):
+                frame = bytes.fromhex(frame_hex)
+                self.assertTrue(ngham.check_ngham_spp_crc(frame[:5], frame[5:]))
+
+    def test_decode_position(self):
+        position = ngham.ngh_ext_encode_position(-338688000, 1512093000, -12, sog_ms=0, cog_deg=359.9, hdop=0.8)
+        self.assertEqual(ngham.ngh_ext_decode_position(position), {
+            'lat': -338688000,
+            'lon': 1512093000,
+            'alt': -12,
+            'sog m/s': 0,
+            'cog deg': 359.9,
+            'hdop deg': 0.8,
+        })
+        # At an offset in a larger buffer, as the extension walker passes it
+        self.assertEqual(ngham.ngh_ext_decode_position(memoryview(b'\x00\x00' + position), 2),
+                         ngham.ngh_ext_decode_position(position))
+
+
+class SensorSchemaTests(SimpleTestCase):
+    LINE = b'LA9ORB;104912;1000;23;24;0;30;100;on;off'
+
+    def test_trailing_separator_is_ignored(self):
+        reading = parse_sensor_line(self.LINE)
+        for line in (self.LINE + b';', self.LINE + b';\r\n', (self.LINE + b';').decode(), b'V2;' + self.LINE + b';'):
+            with self.subTest(line=line):
+                self.assertEqual(parse_sensor_line(line), reading)
+        self.assertEqual(parse_sensor_lines([self.LINE, self.LINE + b';'])[0][2]['timestamp'], [104912, 104912])
+        self.assertEqual(SCHEMA_V2.parse_batch([self.LINE + b';'])['timestamp'], [104912])
+
+    def test_only_one_empty_field_is_ignored(self):
+        with self.assertRaises(ValueError):
+            parse_sensor_line(self.LINE + b';;')
+
+
+def fake_service(database):
+    """FirebaseService that reads database in-process instead of Firebase"""
+    return FirebaseService(root_ref=database.reference('/'))
+
+
+def sensor_entries(timestamps):
+    return {str(timestamp): {'timestamp': timestamp, 'pressure': 1000.0, 'height': 100.0}
+            for timestamp in timestamps}
+
+
+class FirebaseServiceFakeDatabaseTests(SimpleTestCase):
+    """Reads of FirebaseService against a FakeDatabase, with injected latency and failures"""
+
+    def test_get_sensor_data_pages_through_the_period(self):
+        database = FakeDatabase()
+        now_ms = int(time.time() * 1000)
+        old = [now_ms - 25 * 3600 * 1000 + i for i in range(5)]
+        recent = [now_ms - 3600 * 1000 + i * 1000 for i in range(20)]
+        database.reference('/sensordata').set(sensor_entries(old + recent))
+
+        data = fake_service(database).get_sensor_data('24h', page_size=10)
+
+        self.assertEqual(list(data), [str(timestamp) for timestamp in recent])
+        # Pages of 10, 10 + the last key of the page before, and the short last page
+        self.assertEqual(database.calls, 4)
+
+    def test_historical_cache_only_fetches_new_entries(self):
+        database = FakeDatabase()
+        database.reference('/sensordata').set(sensor_entries(range(1000, 11000, 1000)))
+        service = fake_service(database)
+        cache = HistoricalDataCache(max_points=100, refresh_interval=0)
+
+        self.assertEqual(cache.get(service, 5)['timestamps'], [6000, 7000, 8000, 9000, 10000])
+        database.reference('/sensordata').update(sensor_entries([11000, 12000]))
+        database.calls = 0
+        self.assertEqual(cache.get(service, 5)['timestamps'], [8000, 9000, 10000, 11000, 12000])
+        self.assertEqual(database.calls, 1)
+
+    def test_historical_cache_grows_with_the_limit(self):
+        database = FakeDatabase()
+        database.reference('/sensordata').set(sensor_entries(range(1000, 31000, 1000)))
+        service = fake_service(database)
+        cache = HistoricalDataCache(max_points=100, refresh_interval=60)
+
+        self.assertEqual(len(cache.get(service, 5)['timestamps']), 5)
+        self.assertEqual(len(cache.columns['timestamps']), 5)
+        self.assertEqual(cache.get(service, 8)['timestamps'], list(range(23000, 31000, 1000)))
+        self.assertEqual(len(cache.columns['timestamps']), 10)
+        # All 30 entries are cached after a short answer, larger limits need no more reads
+        cache.get(service, 50)
+        database.calls = 0
+        self.assertEqual(len(cache.get(service, 60)['timestamps']), 30)
+        self.assertEqual(database.calls, 0)
+
+    def test_historical_cache_keeps_its_points_when_a_refresh_fails(self):
+        database = FakeDatabase()
+        database.reference('/sensordata').set(sensor_entries(range(1000, 11000, 1000)))
+        service = fake_service(database)
+        cache = HistoricalDataCache(max_points=100, refresh_interval=0, full_refresh_interval=0)
+        cache.get(service, 10)
+        database.fail_next()
+
+        with self.assertRaises(FakeFirebaseError):
+            cache.get(service, 10)
+        self.assertEqual(list(cache.columns['timestamps']), list(range(1000, 11000, 1000)))
+
+    def test_latency_of_concurrent_async_reads(self):
+        latency = 0.3
+        database = FakeDatabase(latency=latency)
+        database.reference('/').set({'latest': {'timestamp': 1000}, 'rollups': {}})
+        database.calls = 0
+        service = fake_service(database)
+
+        async def read():
+            return await asyncio.gather(service.aget_latest_data(), service.aget_rollup_data('24h'))
+
+        start = time.perf_counter()
+        latest, rollups = asyncio.run(read())
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(latest, {'timestamp': 1000})
+        self.assertEqual(rollups['timestamps'], [])
+        self.assertEqual(database.calls, 2)
+        # Both reads wait for the database at the same time, one after the other takes twice the latency
+        self.assertGreaterEqual(elapsed, latency)
+        self.assertLess(elapsed, 2 * latency)
+
+    def test_failed_read_is_not_cached(self):
+        database = FakeDatabase()
+        database.reference('/latest').set({'timestamp': 1000})
+        service = fake_service(database)
+        cache = ResponseCache()
+        database.fail_next()
+
+        async def read():
+            return (await cache.get(('latest',), service.aget_latest_data, 60)).value
+
+        with self.assertRaises(FakeFirebaseError):
+            asyncio.run(read())
+        self.assertEqual(asyncio.run(read()), {'timestamp': 1000})
+        self.assertEqual(database.failures, 1)
+
+    def test_rest_client_orders_integer_keys_numerically(self):
+        database = FakeDatabase()
+        database.reference('/sensordata').set({key: {'timestamp': 0} for key in ['9', '10', '100', '-1', 'b', '0a']})
+        server = database.serve()
+        self.addCleanup(server.shutdown)
+        client = AsyncFirebaseClient(f'http://127.0.0.1:{server.server_port}/?ns=test')
+
+        async def read():
+            try:
+                return await client.get('sensordata', order_by='$key')
+            finally:
+                await client.aclose()
+
+        self.assertEqual(list(asyncio.run(read())), ['-1', '9', '10', '100', '0a', 'b'])
+
+    def test_writer_retries_failed_writes(self):
+        database = FakeDatabase()
+        database.fail_next(2)
+        writer = BatchedFirebaseWriter(database.reference('/'), flush_interval=0.01).start()
+        writer.set('latest', {'timestamp': 1000})
+        deadline = time.monotonic() + 5
+        while writer.written == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        writer.stop()
+
+        self.assertEqual(database.data, {'latest': {'timestamp': 1000}})
+        self.assertEqual(writer.stats()['write_errors'], 2)
+
+    def test_writer_drops_a_batch_that_keeps_failing(self):
+        database = FakeDatabase()
+        database.fail_next(2)
+        writer = BatchedFirebaseWriter(database.reference('/'), flush_interval=0.01, max_retries=1).start()
+        writer.set('sensordata/1000', {'timestamp': 1000})
+        deadline = time.monotonic() + 5
+        while writer.dropped == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        writer.set('latest', {'timestamp': 2000})
+        writer.stop()
+
+        self.assertEqual(database.data, {'latest': {'timestamp': 2000}})
+        self.assertEqual(writer.stats()['dropped'], 1)
+
+    def test_live_feed_publishes_the_readings_of_a_batch(self):
+        database = FakeDatabase()
+        feed = LiveFeed()
+        feed._service = fake_service(database)
+
+        def write_batch(timestamps):
+            entries = sensor_entries(timestamps)
+            database.reference('/').update({**{f'sensordata/{key}': entry for key, entry in entries.items()},
+                                            'latest': entries[str(timestamps[-1])]})
+            feed._on_event(SimpleNamespace(event_type='put', path='/', data=entries[str(timestamps[-1])]))
+
+        async def stream():
+            queue = asyncio.Queue()
+            feed._subscribers.add((asyncio.get_running_loop(), queue))
+            write_batch([1000])
+            write_batch([2000, 3000, 4000])
+            await asyncio.sleep(0)
+            return [queue.get_nowait()['timestamp'] for _ in range(queue.qsize())]
+
+        self.assertEqual(asyncio.run(stream()), [1000, 2000, 3000, 4000])
+
+    def test_live_feed_starts_its_listener_off_the_event_loop(self):
+        listen_threads = []
+
+        def listen(callback):
+            listen_threads.append(threading.current_thread())
+            return SimpleNamespace(close=lambda: None)
+
+        latest_ref = SimpleNamespace(listen=listen)
+        service = SimpleNamespace(root_ref=SimpleNamespace(child=lambda path: latest_ref))
+        feed = LiveFeed(keepalive=0.01)
+
+        async def first_event():
+            events = feed.events(service)
+            try:
+                return await anext(events)
+            finally:
+                await events.aclose()
+
+        self.assertEqual(asyncio.run(first_event()), ': keepalive\n\n')
+        self.assertEqual(len(listen_threads), 1)
+        self.assertIsNot(listen_threads[0], threading.main_thread())
+
+
+class IngestPipelineTests(SimpleTestCase):
+    """Replay of a capture with malformed frames through the ingest stages into a FakeDatabase"""
+
+    def test_malformed_frames_do_not_stop_ingest(self):
+        def rx_frame(body):
+            return ngham.encode_ngham_spp_packet(0, ngham.encode_ngham_spp_packet_rx(body, 1_000_000, -120, -80, 0))
+
+        def sensor_frame(timestamp):
+            return rx_frame(ngham.encode_ngham_spp_packet_rx_sensor_data(
+                'LA9ORB', (timestamp, 1000, 23, 24, 0, 30, 100, 'on', 'off')))
+
+        stat = ngham.ngh_ext_encode_stat(hw_ver=(1, 2), serial=1, sw_ver=(1, 0, 0), uptime_s=1, voltage_v=7.4,
+                                         temp_c=20, signal_dbm=-80, noise_dbm=-120)
+        crc_error = bytearray(sensor_frame(3000))
+        crc_error[-1] ^= 0xFF
+        stream = [
+            sensor_frame(1000),
+            ngham.encode_ngham_spp_packet(0, b'\x01\x02'),  # RX payload shorter than its header
+            rx_frame([(ngham.EXT_STAT, stat[:5])]),  # truncated Stat extension
+            b'\x00\x24\x55\xaa',  # line noise
+            bytes(crc_error),
+            rx_frame(b'LA9ORB;1000;abc'),  # sensor line of no known schema
+            sensor_frame(2000),
+        ]
+
+        database = FakeDatabase()
+        writer = BatchedFirebaseWriter(database.reference('/'), flush_interval=0.01).start()
+        uploads = []
+
+        def upload(receiver, copies, decoded, reading, error):
+            uploads.append((decoded is not None, reading is not None, error))
+            gs.write_frame(writer, decoded, reading, error, verbose=False)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'capture.bin')
+            capture = CaptureWriter(path)
+            for chunk in stream:
+                capture.write(chunk)
+            capture.close()
+
+            receiver = ReplaySerial(path, 0)
+            ingest = IngestPipeline({'replay': receiver}, upload)
+            with self.assertLogs('gs', 'WARNING'):
+                ingest.run()
+        writer.stop()
+
+        self.assertEqual([(decoded, reading) for decoded, reading, _ in uploads], [
+            (True, True), (False, False), (False, False), (True, False), (True, True)])
+        self.assertTrue(uploads[1][2].startswith('Undecodable frame'))
+        self.assertTrue(uploads[2][2].startswith('Undecodable frame'))
+        self.assertTrue(uploads[3][2].startswith('Invalid sensor data'))
+        self.assertEqual(ingest.stats()['read']['replay']['crc_errors'], 1)
+        self.assertEqual(set(database.data['sensordata']), {'1000', '2000'})
+        self.assertEqual(database.data['latest']['timestamp'], 2000)
+
+    def test_stop_cuts_short_a_real_time_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'capture.bin')
+            capture = CaptureWriter(path)
+            capture.write(b'\x00', arrival_ns=0)
+            capture.write(b'\x00', arrival_ns=60 * 10 ** 9)  # a minute later
+            capture.close()
+
+            replay = ReplaySerial(path, speed=1.0)
+            receiver = ReceiverThread('replay', replay, queue.Queue()).start()
+            while receiver.bytes_read == 0:
+                time.sleep(0.01)
+            start = time.monotonic()
+            receiver.stop(timeout=5)
+
+            self.assertFalse(receiver.is_alive())
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertTrue(replay.eof)
+            replay.close()  # a second close is harmless
@@ -5,7 +5,12 @@ from . import views
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('api/latest-data/', views.get_latest_data, name='latest_data'),
+    path('api/stream/', views.stream_latest_data, name='stream'),
     path('api/historical-data/', views.get_historical_data, name='historical_data'),
+    path('api/dashboard-data/', views.get_dashboard_data, name='dashboard_data'),
+    path('api/rollup-data/', views.get_rollup_data, name='rollup_data'),
+    path('api/cache-stats/', views.get_cache_stats, name='cache_stats'),
+    path('api/ingest-metrics/', views.get_ingest_metrics, name='ingest_metrics'),
     path('api/send-command/', views.send_command, name='send_command'),
 ]
 
@@ -1,33 +1,130 @@
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from .services.columnar import COLUMNAR_CONTENT_TYPE, encode_columns
 from .services.firebase_service import FirebaseService
+from .services.ingest_metrics import IngestMetricsUnavailable, fetch_ingest_metrics
+from .services.live_feed import LiveFeed
+from .services.response_cache import HISTORICAL_DATA_TTL, LATEST_DATA_TTL, response_cache
 import json
 
 # Create Firebase service instance
 firebase_service = FirebaseService()
 
+# Shared by every streaming client
+live_feed = LiveFeed()
+
 def dashboard(request):
     """Main dashboard view"""
     return render(request, 'groundstation/dashboard.html')
 
-def get_latest_data(request):
+def _get_limit(request):
+    limit = request.GET.get('limit', 50)
+    try:
+        return int(limit)
+    except ValueError:
+        return 50
+
+def _get_points(request):
+    """Optional points=N (or resolution=N) parameter, the number of points to downsample the series to"""
+    points = request.GET.get('points', request.GET.get('resolution'))
+    try:
+        points = int(points)
+    except (TypeError, ValueError):
+        return None
+    return max(points, 3)
+
+def _cached_response(request, entry, make_response, variant=''):
+    """
+    Response for a response_cache entry, 304 if the client already has this version
+    
+    variant tells apart representations of the same data (e.g. JSON and binary),
+    which must not share an ETag.
+    """
+    etag = f'"{entry.etag}{variant}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response_cache.not_modified += 1
+        response = HttpResponseNotModified()
+    else:
+        response = make_response(entry.value)
+    response['ETag'] = etag
+    # Let browsers keep the data but ask every time whether it changed
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def _chart_response(request, entry):
+    """JSON, or the binary column format if the client asks for it in the Accept header"""
+    columns = COLUMNAR_CONTENT_TYPE in request.headers.get('Accept', '')
+    use_gzip = columns and 'gzip' in request.headers.get('Accept-Encoding', '')
+    
+    def make_response(data):
+        if not columns:
+            return JsonResponse(data)
+        body = encode_columns(data)
+        response = HttpResponse(content_type=COLUMNAR_CONTENT_TYPE)
+        if use_gzip:
+            body = compress_string(body)
+            response['Content-Encoding'] = 'gzip'
+        response.content = body
+        return response
+    
+    variant = '-columns-gzip' if use_gzip else '-columns' if columns else ''
+    response = _cached_response(request, entry, make_response, variant)
+    patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+    return response
+
+async def get_latest_data(request):
     """API endpoint to get latest sensor data"""
-    data = firebase_service.get_latest_data()
-    return JsonResponse(data if data else {})
+    entry = await response_cache.get(('latest',), firebase_service.aget_latest_data, LATEST_DATA_TTL)
+    return _cached_response(request, entry, lambda data: JsonResponse(data if data else {}))
 
-def get_historical_data(request):
+async def stream_latest_data(request):
+    """Server-Sent Events stream of new sensor readings"""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be held by the stream forever, clients fall back to polling
+        return JsonResponse({'error': 'Streaming requires the ASGI application'}, status=503)
+    
+    response = StreamingHttpResponse(live_feed.events(firebase_service), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def get_historical_data(request):
     """API endpoint to get historical sensor data for graphs"""
     # Get period from request, default to all available data
-    limit = request.GET.get('limit', 50)
+    limit, points = _get_limit(request), _get_points(request)
+    entry = await response_cache.get(
+        ('historical', limit, points),
+        lambda: firebase_service.aget_historical_data(limit=limit, points=points),
+        HISTORICAL_DATA_TTL,
+    )
+    return _chart_response(request, entry)
+
+async def get_dashboard_data(request):
+    """API endpoint to get the latest reading and the historical data in one request"""
+    data = await firebase_service.aget_dashboard_data(limit=_get_limit(request), points=_get_points(request))
+    return JsonResponse(data)
+
+async def get_rollup_data(request):
+    """API endpoint to get min/max/mean rollups for a period (24h, 7d, 30d or all)"""
+    data = await firebase_service.aget_rollup_data(period=request.GET.get('period', '24h'))
+    return JsonResponse(data)
+
+def get_cache_stats(request):
+    """API endpoint with the hit/miss counters of the response cache"""
+    return JsonResponse(response_cache.stats())
+
+async def get_ingest_metrics(request):
+    """API endpoint with the ground station's link quality and pipeline metrics (gs.py /metrics)"""
     try:
-        limit = int(limit)
-    except ValueError:
-        limit = 50
-    
-    data = firebase_service.get_historical_data(limit=limit)
+        data = await fetch_ingest_metrics()
+    except IngestMetricsUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=503)
     return JsonResponse(data)
 
-def send_command(request):
+async def send_command(request):
     """API endpoint to send commands to the satellite"""
     if request.method == 'POST':
         try:
@@ -35,7 +132,7 @@ def send_command(request):
             command_type = data.get('type')
             command_value = data.get('value')
             
-            success = firebase_service.send_command(command_type, command_value)
+            success = await firebase_service.asend_command(command_type, command_value)
             
             return JsonResponse({'success': success})
         except Exception as e:
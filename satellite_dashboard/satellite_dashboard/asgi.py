@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'satellite_dashboard.settings')
+# One event loop for the life of the server: the async Firebase REST client can keep its connections
+os.environ.setdefault('DASHBOARD_SERVER', 'asgi')
 
 application = get_asgi_application()
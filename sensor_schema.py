@@ -0,0 +1,235 @@
+"""
+Versioned layouts of the ';' separated sensor data lines.
+
+Every layout is declared once as a SensorSchema and compiled into a parser
+that takes the line as bytes (or str) and returns a telemetry.Reading. The
+layout of a line is chosen by an explicit version tag in the first field
+("V2;LA9ORB;104912;...") or else by its number of fields. A trailing ';'
+(one empty last field) is ignored.
+
+    parse_sensor_line(b"LA9ORB;104912;1000;23;24;0;30;100;on;off")
+    parse_sensor_lines(lines)  # columns per layout, for many lines at once
+"""
+from telemetry import Reading
+
+_VERSION_PREFIXES = (b'V', 'V')
+
+
+def _text(value):
+    return value.decode('latin-1') if isinstance(value, (bytes, bytearray, memoryview)) else value
+
+
+# Field type -> converter from bytes or str
+FIELD_TYPES = {
+    'int': int,
+    'float': float,
+    'str': _text,
+}
+
+
+class SensorSchema:
+    """
+        One layout of a sensor data line
+        fields is a tuple of (name, type) in line order, type one of FIELD_TYPES.
+        Names that are not Reading fields (like the callsign) are skipped.
+    """
+
+    def __init__(self, version: int, name: str, fields: tuple):
+        self.version = version
+        self.name = name
+        self.fields = fields
+        self._parse = self._compile()
+
+    def _compile(self):
+        """Parser of split fields (bytes or str) into a Reading, None for the Reading fields the layout does not have"""
+        # (Reading field index, line field index, converter) of the fields to convert
+        converters = [(Reading._fields.index(name), i, FIELD_TYPES[field_type])
+                      for i, (name, field_type) in enumerate(self.fields) if name in Reading._fields]
+        empty = [None] * len(Reading._fields)
+
+        def parse(fields):
+            values = empty.copy()
+            for position, i, convert in converters:
+                values[position] = convert(fields[i])
+            return Reading._make(values)
+        return parse
+
+    def parse_fields(self, fields) -> Reading:
+        """
+            Parses an already split line
+            Output: Reading, ValueError if the fields do not match the layout
+        """
+        if len(fields) != len(self.fields):
+            raise ValueError(f"{self.name} has {len(self.fields)} fields, got {len(fields)}")
+        return self._parse(fields)
+
+    def parse(self, line) -> Reading:
+        """Parses one line (bytes or str, line ending allowed)"""
+        return self.parse_fields(_split(line))
+
+    def parse_batch(self, lines) -> dict:
+        """
+            Parses many lines of this layout (bytes) into columns
+            Output: {Reading field: list of values}, ValueError if a line does not match
+        """
+        lines = [_strip(bytes(line)) for line in lines]
+        columns = self._columns(lines)
+        if columns is None:
+            for line in lines:
+                self.parse(line)  # raises for the first line that does not match
+        return columns
+
+    def _columns(self, lines):
+        """Columns of stripped lines of this layout, None if their field count is off"""
+        # Decode and split all lines in one go and slice out every field, instead of a split per line.
+        # As text the str fields need no conversion at all
+        n = len(self.fields)
+        flat = b';'.join(lines).decode('latin-1').split(';') if lines else []
+        if len(flat) != n * len(lines):
+            return None
+        return {
+            name: flat[i::n] if field_type == 'str' else list(map(FIELD_TYPES[field_type], flat[i::n]))
+            for i, (name, field_type) in enumerate(self.fields)
+            if name in Reading._fields
+        }
+
+
+def _strip(line):
+    """line without the line ending and a trailing ';', which older firmware sent after the last field"""
+    line = line.strip()
+    return line[:-1] if line[-1:] in (b';', ';') else line
+
+
+def _split(line) -> list:
+    if type(line) is bytes:
+        return _strip(line).split(b';')
+    if isinstance(line, (bytearray, memoryview)):
+        return _strip(bytes(line)).split(b';')
+    return _strip(line).split(';')
+
+
+SENSOR_SCHEMAS = {}  # version -> SensorSchema
+_SCHEMAS_BY_FIELD_COUNT = {}  # number of fields -> SensorSchema
+
+
+def register_schema(schema: SensorSchema) -> SensorSchema:
+    """Adds a layout; field counts must be unique so lines without a version tag can be told apart"""
+    if schema.version in SENSOR_SCHEMAS:
+        raise ValueError(f"Sensor schema version {schema.version} already registered")
+    if len(schema.fields) in _SCHEMAS_BY_FIELD_COUNT:
+        raise ValueError(f"A sensor schema with {len(schema.fields)} fields is already registered")
+    SENSOR_SCHEMAS[schema.version] = schema
+    _SCHEMAS_BY_FIELD_COUNT[len(schema.fields)] = schema
+    return schema
+
+
+# groundstation.py, lines straight from the serial port
+SCHEMA_V1 = register_schema(SensorSchema(1, 'serial-gyro', (
+    ('timestamp', 'float'),  # ms
+    ('pressure', 'float'),  # hPa
+    ('inside_temp', 'float'),  # degree C
+    ('outside_temp', 'float'),  # degree C
+    ('uv', 'float'),  # candela
+    ('ozone', 'float'),  # ppm
+    ('gyro_x', 'float'),
+    ('gyro_y', 'float'),
+    ('gyro_z', 'float'),
+)))
+
+# gs.py, text of NGHam-SPP RX frames (SO 2025)
+SCHEMA_V2 = register_schema(SensorSchema(2, 'so2025', (
+    ('callsign', 'str'),
+    ('timestamp', 'int'),  # ms
+    ('pressure', 'float'),  # hPa
+    ('inside_temp', 'float'),  # degree C
+    ('outside_temp', 'float'),  # degree C
+    ('uv', 'float'),  # candela
+    ('ozone', 'float'),  # ppm
+    ('height', 'float'),
+    ('rwstate', 'str'),
+    ('rwmanual', 'str'),
+)))
+
+
+def _schema_for(fields):
+    """(schema, fields without the version tag) of a split line"""
+    first = fields[0]
+    if first[:1] in _VERSION_PREFIXES and first[1:].isdigit():
+        schema = SENSOR_SCHEMAS.get(int(first[1:]))
+        if schema is None:
+            raise ValueError(f"Unknown sensor schema version {_text(first)}")
+        return schema, fields[1:]
+    schema = _SCHEMAS_BY_FIELD_COUNT.get(len(fields))
+    if schema is None:
+        raise ValueError(f"No sensor schema with {len(fields)} fields")
+    return schema, fields
+
+
+def parse_sensor_line(line) -> Reading:
+    """
+        Parses a sensor data line of any registered layout
+        Input: line (bytes or str)
+        Output: Reading, ValueError if the line matches no layout
+    """
+    fields = _split(line)
+    schema, fields = _schema_for(fields)
+    return schema.parse_fields(fields)
+
+
+def parse_sensor_lines(lines) -> tuple:
+    """
+        Batch version of parse_sensor_line for lines as bytes
+        Output: ({schema version: {Reading field: list of values}}, number of lines that were skipped as invalid)
+    """
+    # Lines without a version tag are grouped by field count and converted a whole column at a time
+    lines = [_strip(bytes(line)) for line in lines]
+    counts = [line.count(b';') + 1 for line in lines]
+    tagged = [line for line in lines if line[:1] == b'V']
+    if not tagged and len(set(counts)) == 1:
+        by_count = {counts[0]: lines}
+    else:
+        by_count = {}
+        for line, count in zip(lines, counts):
+            if line[:1] != b'V':
+                by_count.setdefault(count, []).append(line)
+
+    rows = {}  # version -> list of split lines that could not take the fast path
+    columns = {}
+    rejected = 0
+    for count, group in by_count.items():
+        schema = _SCHEMAS_BY_FIELD_COUNT.get(count)
+        if schema is None:
+            rejected += len(group)
+            continue
+        try:
+            group_columns = schema._columns(group)
+        except ValueError:
+            # A field that does not convert, sort out the lines one by one
+            rows.setdefault(schema.version, []).extend(line.split(b';') for line in group)
+            continue
+        _extend_columns(columns.setdefault(schema.version, {}), group_columns)
+
+    for line in tagged:
+        try:
+            schema, fields = _schema_for(line.split(b';'))
+        except ValueError:
+            rejected += 1
+            continue
+        rows.setdefault(schema.version, []).append(fields)
+
+    for version, version_rows in rows.items():
+        schema = SENSOR_SCHEMAS[version]
+        for fields in version_rows:
+            try:
+                reading = schema.parse_fields(fields)
+            except ValueError:
+                rejected += 1
+                continue
+            _extend_columns(columns.setdefault(version, {}),
+                            {name: [getattr(reading, name)] for name, _ in schema.fields if name in Reading._fields})
+    return columns, rejected
+
+
+def _extend_columns(columns, new_columns):
+    for name, values in new_columns.items():
+        columns.setdefault(name, []).extend(values)
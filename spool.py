@@ -0,0 +1,159 @@
+"""
+Local write-ahead spool for the ground station.
+
+The ingest scripts append every write to an SQLite file (WAL mode) instead of
+talking to Firebase, so the serial side never waits for the network and
+nothing is lost while the uplink is down. A separate drain process replays
+the spool to Firebase in large batches and keeps a checkpoint of what has
+been uploaded.
+
+Usage:
+    python spool.py drain [--spool spool.sqlite3] [--batch 500] [--once] [--from-start]
+    python spool.py status [--spool spool.sqlite3]
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_log = logging.getLogger(__name__)
+
+SPOOL_FILE = os.getenv('SPOOL_FILE', 'spool.sqlite3')
+
+
+class Spool:
+    def __init__(self, path=SPOOL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, seq INTEGER NOT NULL)")
+
+    def set(self, path: str, value) -> bool:
+        """Appends a write of value to path (relative to the database root)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO spool (path, value, created) VALUES (?, ?, ?)",
+                (path, json.dumps(value), time.time()),
+            )
+        return True
+
+    def get(self, path: str):
+        """Newest value spooled for path, uploaded or not, None if there is none"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM spool WHERE path = ? ORDER BY seq DESC LIMIT 1", (path,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def read(self, after_seq: int, limit: int) -> list:
+        """
+            Reads spooled writes in order
+            Output: list of (seq, path, value)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, path, value FROM spool WHERE seq > ? ORDER BY seq LIMIT ?", (after_seq, limit)
+            ).fetchall()
+        return [(seq, path, json.loads(value)) for seq, path, value in rows]
+
+    def checkpoint(self, name="firebase") -> int:
+        """Sequence number of the last write the consumer `name` has processed"""
+        with self._lock:
+            row = self._conn.execute("SELECT seq FROM checkpoints WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def set_checkpoint(self, seq: int, name="firebase"):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO checkpoints (name, seq) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET seq = excluded.seq",
+                (name, seq),
+            )
+
+    def status(self, name="firebase") -> dict:
+        checkpoint = self.checkpoint(name)
+        with self._lock:
+            last_seq, = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM spool").fetchone()
+            pending, = self._conn.execute("SELECT COUNT(*) FROM spool WHERE seq > ?", (checkpoint,)).fetchone()
+        return {"last_seq": last_seq, "checkpoint": checkpoint, "pending": pending}
+
+    def close(self):
+        self._conn.close()
+
+
+def drain(spool, ref, batch_size=500, interval=1.0, once=False, name="firebase"):
+    """
+        Replays the spool to ref (Firebase, or another store with a multi-path
+        update() like the local telemetry store), one update() per batch
+        The checkpoint `name` only moves after ref accepted the batch, so a
+        crash or outage replays the batch again (writes are idempotent).
+    """
+    while True:
+        rows = spool.read(spool.checkpoint(name), batch_size)
+        if not rows:
+            if once:
+                return
+            time.sleep(interval)
+            continue
+
+        # Later writes to the same path win, so 'latest' is written once per batch
+        updates = {path: value for _, path, value in rows}
+        try:
+            ref.update(updates)
+        except Exception as e:
+            _log.warning("Spooled writes not accepted, retrying", extra={"fields": {
+                "target": name, "writes": len(rows), "error": str(e), "retry_in_s": interval}})
+            time.sleep(interval)
+            continue
+
+        spool.set_checkpoint(rows[-1][0], name)
+        print(f"Drained {len(rows)} spooled writes to {name} (up to #{rows[-1][0]})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("drain", "status"))
+    parser.add_argument("--spool", default=SPOOL_FILE)
+    parser.add_argument("--batch", type=int, default=500, help="writes per Firebase update")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls of the spool")
+    parser.add_argument("--once", action="store_true", help="exit when the spool is drained")
+    parser.add_argument("--from-start", action="store_true", help="replay the whole spool again")
+    args = parser.parse_args()
+
+    spool = Spool(args.spool)
+
+    if args.command == "status":
+        print(spool.status())
+        return
+
+    from firebase_writer import LazyFirebaseReference
+    from metrics import configure_logging
+
+    configure_logging()
+
+    if args.from_start:
+        spool.set_checkpoint(0)
+
+    try:
+        # credentials.json is not needed with an emulator databaseURL (python fake_firebase.py)
+        drain(spool, LazyFirebaseReference(os.getenv('databaseURL')), args.batch, args.interval, args.once)
+    except KeyboardInterrupt:
+        print("KeyboardInterrupt")
+    finally:
+        spool.close()
+
+
+if __name__ == "__main__":
+    main()
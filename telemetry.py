@@ -0,0 +1,67 @@
+"""
+Record types shared by the ingest scripts and the dashboard.
+
+A reading is a Reading tuple from the serial line to the chart columns;
+dicts with the Firebase keys are only built where data is written to or
+read from Firebase (to_firebase / from_firebase).
+"""
+from typing import NamedTuple, Optional
+
+
+class Reading(NamedTuple):
+    """One sensor reading, None for fields the payload layout does not have"""
+    timestamp: int  # ms
+    pressure: Optional[float] = None  # hPa
+    inside_temp: Optional[float] = None  # degree C
+    outside_temp: Optional[float] = None  # degree C
+    uv: Optional[float] = None  # candela
+    ozone: Optional[float] = None  # ppm
+    gyro_x: Optional[float] = None
+    gyro_y: Optional[float] = None
+    gyro_z: Optional[float] = None
+    height: Optional[float] = None
+    rwstate: Optional[str] = None
+    rwmanual: Optional[str] = None
+
+    def to_firebase(self) -> dict:
+        """sensordata entry, without the fields that are None"""
+        return {key: value for key, value in zip(READING_KEYS.values(), self) if value is not None}
+
+    @classmethod
+    def from_firebase(cls, entry, timestamp=None):
+        """Reading of a sensordata entry, timestamp defaults to the entry's own"""
+        reading = cls._make(map(entry.get, _READING_KEY_LIST))
+        if timestamp is not None:
+            reading = reading._replace(timestamp=timestamp)
+        return reading
+
+
+# Reading field -> key in the sensordata entries in Firebase
+READING_KEYS = {
+    'timestamp': 'timestamp',
+    'pressure': 'pressure',
+    'inside_temp': 'insideTemp',
+    'outside_temp': 'outsideTemp',
+    'uv': 'uv',
+    'ozone': 'ozone',
+    'gyro_x': 'gyroX',
+    'gyro_y': 'gyroY',
+    'gyro_z': 'gyroZ',
+    'height': 'height',
+    'rwstate': 'rwstate',
+    'rwmanual': 'rwmanual',
+}
+assert tuple(READING_KEYS) == Reading._fields
+_READING_KEY_LIST = tuple(READING_KEYS.values())
+
+
+class RxMetadata(NamedTuple):
+    """
+        Link metadata of an NGHam-SPP RX frame, the raw header values
+        Same fields as ngham.SPP_RX_COLUMNS_DTYPE
+    """
+    timestamp_toh_us: int  # time of hour in us, 0xFFFFFFFF if invalid
+    noise_dbm: int
+    rssi_dbm: int
+    errors: int
+    ngham_flags: int
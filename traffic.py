@@ -0,0 +1,209 @@
+"""
+Synthetic NGHam-SPP downlink traffic for testing the decoders and the ingest path.
+
+TrafficGenerator produces the frames that a receiver passes to the ground station
+during a flight:
+- RX frames with a sensor data line
+- RX beacons with the callsign, stat, position and time of hour extensions
+- TX echoes of the commands that were sent
+
+stream() adds line noise between frames, corrupts some of the frames, and splits
+the bytes into chunks like serial port reads. write_capture() saves a stream as a
+capture file for gs.py --replay. Replaying it with --speed 10 to 100 load tests the
+pipeline at 10 to 100 times the link rate.
+
+Usage:
+    python traffic.py capture.bin [--seconds 600] [--rate 1] [--noise 0.05] [--corruption 0.01] [--seed 0]
+    python gs.py --replay capture.bin --speed 100 --fake-firebase --quiet
+"""
+import argparse
+import math
+import random
+import time
+from typing import NamedTuple
+
+import ngham
+from capture import CaptureWriter
+
+# Line noise, biased towards start bytes and the bytes around them to make the parser resync
+_NOISE_BYTES = b"\x00\x24\x24\x55\xaa\xff\x01\x02"
+
+
+class GeneratedFrame(NamedTuple):
+    """One frame of a TrafficGenerator, before noise and corruption"""
+    time: float  # seconds since the start of the stream
+    kind: str  # "sensor", "beacon" or "tx"
+    frame: bytes
+
+
+class TrafficGenerator:
+    """
+        Frames of a balloon flight: it climbs at 5 m/s, bursts at 30 km and
+        comes down at 10 m/s.
+
+        rate is the number of frames per second. Every beacon_every-th frame
+        is a beacon and every tx_every-th frame is a TX echo (0 turns them off).
+        noise is the chance of a burst of line noise before a frame.
+        corruption is the chance that a frame is damaged, by a bit flip or by
+        being cut short. Corrupted frames fail the CRC check (almost always).
+    """
+
+    def __init__(self, rate=1.0, noise=0.0, corruption=0.0, beacon_every=10, tx_every=0, callsign="LA9ORB",
+                 start_ms=None, seed=0):
+        self.rate = rate
+        self.noise = noise
+        self.corruption = corruption
+        self.beacon_every = beacon_every
+        self.tx_every = tx_every
+        self.callsign = callsign
+        self.start_ms = int(time.time() * 1000) if start_ms is None else start_ms
+        self._random = random.Random(seed)
+        self._rssi = -80.0
+
+        # What stream() produced
+        self.frames = 0
+        self.corrupted = 0
+        self.noise_bytes = 0
+
+    def _height(self, t):
+        """Height in m, t seconds after launch"""
+        climb = 30000 / 5
+        if t < climb:
+            return 5 * t
+        return max(30000 - 10 * (t - climb), 0.0)
+
+    def _link(self):
+        """RSSI (a random walk), noise and symbol errors of the next frame"""
+        rng = self._random
+        self._rssi = min(max(self._rssi + rng.gauss(0, 1.5), -125.0), -60.0)
+        errors = min(int(rng.expovariate(1 / max(1.0, (-70 - self._rssi) / 10))), 255)
+        return round(self._rssi), round(-120 + rng.gauss(0, 2)), errors
+
+    def sensor_line(self, t) -> bytes:
+        """SO 2025 sensor data line (sensor_schema.py version 2) t seconds after launch"""
+        rng = self._random
+        height = self._height(t)
+        pressure = 1013.25 * math.exp(-height / 8400)
+        return ngham.encode_ngham_spp_packet_rx_sensor_data(self.callsign, (
+            self.start_ms + int(t * 1000),
+            f"{pressure:.2f}",
+            f"{22 - height / 3000 + rng.gauss(0, 0.2):.2f}",
+            f"{15 - height / 150 + rng.gauss(0, 0.5):.2f}",
+            f"{rng.random() * height / 1000:.2f}",
+            f"{30 + rng.gauss(0, 2):.1f}",
+            f"{height:.0f}",
+            "on" if height > 25000 else "off",
+            "off",
+        ))
+
+    def beacon(self, t, sequence_number) -> list:
+        """Extension payloads of a beacon t seconds after launch"""
+        rng = self._random
+        height = self._height(t)
+        toh_us = (self.start_ms * 1000 + int(t * 1_000_000)) % 3_600_000_000
+        return [
+            (ngham.EXT_CALLSIGN, ngham.ngh_ext_encode_callsign(self.callsign, sequence_number)),
+            (ngham.EXT_STAT, ngham.ngh_ext_encode_stat(
+                hw_ver=(1, 2), serial=4242, sw_ver=(1, 3, 7), uptime_s=int(t) + 600,
+                voltage_v=round(7.4 - t / 36000, 1), temp_c=max(0, round(20 - height / 2000)),
+                signal_dbm=round(self._rssi), noise_dbm=-120,
+                cntr_rx_ok=int(t * self.rate) & 0xFFFF, cntr_tx=int(t) & 0xFFFF)),
+            (ngham.EXT_POSITION, ngham.ngh_ext_encode_position(
+                round((69.29 + t / 36000) * 1e7), round((16.02 + t / 18000) * 1e7), round(height),
+                sog_ms=rng.choice((0, 100)), cog_deg=round(rng.uniform(0, 360), 1), hdop=1.2)),
+            (ngham.EXT_TIME_OF_HOUR, ngham.encode_time_of_hour(toh_us)),
+        ]
+
+    def generate(self, n):
+        """n clean frames as GeneratedFrame"""
+        for i in range(n):
+            t = i / self.rate
+            toh_us = (self.start_ms * 1000 + int(t * 1_000_000)) % 3_600_000_000
+            rssi_dbm, noise_dbm, errors = self._link()
+            if self.tx_every and i % self.tx_every == self.tx_every - 1:
+                kind = "tx"
+                payload = ngham.encode_ngham_spp_packet(0x01, ngham.encode_ngham_spp_packet_tx(
+                    ngham.encode_ngham_spp_packet_rx_sensor_data(self.callsign, ("PING", i))))
+            elif self.beacon_every and i % self.beacon_every == 0:
+                kind = "beacon"
+                payload = ngham.encode_ngham_spp_packet(0x00, ngham.encode_ngham_spp_packet_rx(
+                    self.beacon(t, i & 0xFF), toh_us, noise_dbm, rssi_dbm, errors))
+            else:
+                kind = "sensor"
+                payload = ngham.encode_ngham_spp_packet(0x00, ngham.encode_ngham_spp_packet_rx(
+                    self.sensor_line(t), toh_us, noise_dbm, rssi_dbm, errors))
+            yield GeneratedFrame(t, kind, payload)
+
+    def corrupt(self, frame: bytes) -> bytes:
+        """A damaged copy of frame: one flipped bit or cut short"""
+        rng = self._random
+        if rng.random() < 0.5:
+            damaged = bytearray(frame)
+            damaged[rng.randrange(1, len(damaged))] ^= 1 << rng.randrange(8)
+            return bytes(damaged)
+        return frame[:rng.randrange(1, len(frame))]
+
+    def stream(self, n, chunk_size=(1, 256), sent=None):
+        """
+            Bytes of n frames with noise and corruption, as read from a serial port
+            Input: sent (optional list) collects the GeneratedFrame that were sent undamaged
+            Output: generator of (seconds since the start, chunk)
+        """
+        rng = self._random
+        pending = bytearray()
+        for generated in self.generate(n):
+            if self.noise and rng.random() < self.noise:
+                noise = bytes(rng.choice(_NOISE_BYTES) for _ in range(rng.randint(1, 64)))
+                self.noise_bytes += len(noise)
+                pending += noise
+            self.frames += 1
+            if self.corruption and rng.random() < self.corruption:
+                self.corrupted += 1
+                pending += self.corrupt(generated.frame)
+            else:
+                if sent is not None:
+                    sent.append(generated)
+                pending += generated.frame
+
+            while len(pending) >= chunk_size[1]:
+                size = rng.randint(*chunk_size)
+                yield generated.time, bytes(pending[:size])
+                del pending[:size]
+        if pending:
+            yield n / self.rate, bytes(pending)
+
+    def write_capture(self, path, n, start_ns=None) -> int:
+        """Saves the stream of n frames as a capture file, output: number of chunks"""
+        start_ns = time.time_ns() if start_ns is None else start_ns
+        writer = CaptureWriter(path)
+        chunks = 0
+        try:
+            for t, chunk in self.stream(n):
+                writer.write(chunk, start_ns + int(t * 1e9))
+                chunks += 1
+        finally:
+            writer.close()
+        return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes a capture of synthetic NGHam-SPP traffic")
+    parser.add_argument("capture", help="capture file to write, replay it with gs.py --replay")
+    parser.add_argument("--seconds", type=float, default=600, help="length of the flight")
+    parser.add_argument("--rate", type=float, default=1.0, help="frames per second")
+    parser.add_argument("--noise", type=float, default=0.0, help="chance of line noise before a frame")
+    parser.add_argument("--corruption", type=float, default=0.0, help="chance that a frame is damaged")
+    parser.add_argument("--beacon-every", type=int, default=10, help="every n-th frame is a beacon, 0 for none")
+    parser.add_argument("--tx-every", type=int, default=0, help="every n-th frame is a TX echo, 0 for none")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = TrafficGenerator(args.rate, args.noise, args.corruption, args.beacon_every, args.tx_every,
+                                 seed=args.seed)
+    chunks = generator.write_capture(args.capture, int(args.seconds * args.rate))
+    print(f"{args.capture}: {generator.frames} frames ({generator.corrupted} corrupted) in {chunks} chunks, "
+          f"{generator.noise_bytes} bytes of noise")
+
+
+if __name__ == "__main__":
+    main()